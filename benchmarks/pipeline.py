@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks for the non-model parts of the transcription pipeline.
+
+A synthetic TranscribeService stands in for Whisper and generates
+transcripts of any size, so the stages around the model can be timed at
+10k, 100k and 1M segments:
+
+    python -m benchmarks.pipeline --output results.json
+    python -m benchmarks.pipeline --save-baseline
+    python -m benchmarks.pipeline --baseline benchmarks/baseline.json
+
+Each stage is timed as the best of --repeat runs, then run once more under
+tracemalloc for its peak memory. Compared against a baseline, the run
+fails if any stage is more than --tolerance slower or larger.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import Callable, List
+
+import numpy as np
+
+from transcriptly.data_types import Segment, SegmentTable, TranscriptionResult
+from transcriptly.transcribe import Transcribe
+from transcriptly.transcribe_services.transcribe_service import TranscribeService
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+STAGES = (
+    "sort_segments",
+    "remove_duplicates_from_segments",
+    "add_speaker_to_segments",
+    "write_transcription_to_file",
+    "slice_transcript_file",
+)
+WORDS = "the a we should ship that feature next week after review and then test it on staging".split()
+
+
+class SyntheticTranscribe(TranscribeService):
+    """
+    Generates a transcript instead of transcribing audio. Each file path is
+    one speaker's track, and the segments of all num_speakers tracks add up
+    to num_segments. Segments follow each other in start time order like
+    Whisper's, and duplicate_rate of them repeat the segment before, like
+    Whisper's repeated lines.
+    """
+    def __init__(self, num_segments: int, num_speakers: int = 4, duplicate_rate: float = 0.05, seed: int = 0):
+        self.num_segments = num_segments
+        self.num_speakers = num_speakers
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+
+    def cache_params(self) -> dict:
+        return {
+            "service": "synthetic",
+            "num_segments": self.num_segments,
+            "num_speakers": self.num_speakers,
+            "duplicate_rate": self.duplicate_rate,
+            "seed": self.seed,
+        }
+
+    def file_paths(self) -> List[str]:
+        return [f"speaker-{i}.wav" for i in range(self.num_speakers)]
+
+    def transcribe(self, file_path) -> TranscriptionResult:
+        track = self.file_paths().index(file_path)
+        num_segments = self.num_segments // self.num_speakers + (track < self.num_segments % self.num_speakers)
+        rng = random.Random(f"{self.seed}-{track}")
+        segments = []
+        start_time = rng.uniform(0, 2)
+        text = ""
+        for _ in range(num_segments):
+            if not text or rng.random() >= self.duplicate_rate:
+                text = " " + " ".join(rng.choices(WORDS, k=rng.randint(3, 12)))
+            duration = rng.uniform(0.5, 6)
+            segments.append(Segment(text, start_time, start_time + duration))
+            start_time += duration + rng.uniform(0, self.num_speakers * 3)
+        return TranscriptionResult(file_path, segments, "".join(segment.text for segment in segments))
+
+
+def time_stage(fn: Callable, setup: Callable, repeat: int = 3, measure_memory: bool = True) -> dict:
+    """
+    Times fn(*setup()) as the best of repeat runs. setup is called before
+    every run and is not timed, so stages that change their input in place
+    always start from the same input.
+
+    Returns: dict with seconds and peak_bytes (None without measure_memory)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+        del args
+    peak_bytes = None
+    if measure_memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            fn(*args)
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak_bytes}
+
+def run_benchmarks(sizes: List[int] = DEFAULT_SIZES, num_speakers: int = 4, repeat: int = 3, columnar: bool = False, measure_memory: bool = True, slice_max_tokens: int = None, stages: List[str] = STAGES) -> dict:
+    """
+    Times every stage at every transcript size.
+
+    Returns: dict with the run's environment under "meta" and one entry per
+        stage and size under "results"
+    """
+    results = []
+    summarize_error = None
+    try:
+        import summarize
+    except Exception as e:
+        summarize_error = f"summarize could not be imported: {e}"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            service = SyntheticTranscribe(size, num_speakers)
+            transcribe = Transcribe(service_name="synthetic", model_name="synthetic", columnar=columnar)
+            transcribe.transcription_service = service
+            speakers = [Transcribe.get_speaker_from_file_path(path) for path in service.file_paths()]
+
+            def tracks():
+                tracks = [service.transcribe(path).segments for path in service.file_paths()]
+                if columnar:
+                    tracks = [SegmentTable.from_segments(segments) for segments in tracks]
+                return tracks
+
+            def speaker_tracks():
+                return [
+                    Transcribe.add_speaker_to_segments(speaker, segments)
+                    for speaker, segments in zip(speakers, tracks())
+                ]
+
+            def merged():
+                return Transcribe.sort_segments(speaker_tracks())
+
+            transcript_file = os.path.join(tmp_dir, f"transcript-{size}.txt")
+            stage_runs = {
+                "sort_segments": (
+                    lambda collection: list(Transcribe.sort_segments(collection)) if not columnar else Transcribe.sort_segments(collection),
+                    lambda: (speaker_tracks(),)
+                ),
+                "remove_duplicates_from_segments": (
+                    lambda collection: [Transcribe.remove_duplicates_from_segments(segments) for segments in collection],
+                    lambda: (tracks(),)
+                ),
+                "add_speaker_to_segments": (
+                    lambda collection: [Transcribe.add_speaker_to_segments(speaker, segments) for speaker, segments in zip(speakers, collection)],
+                    lambda: (tracks(),)
+                ),
+                "write_transcription_to_file": (
+                    lambda segments: transcribe.write_transcription_to_file(segments, transcript_file),
+                    lambda: (merged(),)
+                ),
+            }
+            if summarize_error is None:
+                stage_runs["slice_transcript_file"] = (
+                    lambda: summarize.slice_transcript_file(transcript_file, max_tokens=slice_max_tokens),
+                    lambda: ()
+                )
+
+            for stage in stages:
+                if stage not in stage_runs:
+                    logging.warning(f"Skipping {stage}: {summarize_error}")
+                    results.append({"stage": stage, "segments": size, "skipped": summarize_error})
+                    continue
+                if stage == "slice_transcript_file" and not os.path.exists(transcript_file):
+                    transcribe.write_transcription_to_file(merged(), transcript_file)
+                fn, setup = stage_runs[stage]
+                measurement = time_stage(fn, setup, repeat, measure_memory)
+                logging.info(f"{stage} at {size} segments: {measurement['seconds']:.4f} seconds")
+                results.append({
+                    "stage": stage,
+                    "segments": size,
+                    **measurement,
+                    "segments_per_second": size / measurement["seconds"] if measurement["seconds"] else None,
+                })
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "columnar": columnar,
+            "num_speakers": num_speakers,
+            "repeat": repeat,
+            "slice_max_tokens": slice_max_tokens,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def compare_to_baseline(run: dict, baseline: dict, tolerance: float = 0.25) -> List[dict]:
+    """
+    Compares a run's results to a baseline's, stage by stage and size by
+    size. Stages missing from either side are left out.
+
+    Returns: List[dict], one comparison per stage and size with the ratios
+        of run to baseline and whether either is over 1 + tolerance
+    """
+    baseline_results = {
+        (result["stage"], result["segments"]): result
+        for result in baseline["results"] if "skipped" not in result
+    }
+    comparisons = []
+    for result in run["results"]:
+        base = baseline_results.get((result["stage"], result["segments"]))
+        if base is None or "skipped" in result:
+            continue
+        time_ratio = result["seconds"] / base["seconds"] if base["seconds"] else None
+        memory_ratio = None
+        if result.get("peak_bytes") and base.get("peak_bytes"):
+            memory_ratio = result["peak_bytes"] / base["peak_bytes"]
+        comparisons.append({
+            "stage": result["stage"],
+            "segments": result["segments"],
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "regressed": any(ratio is not None and ratio > 1 + tolerance for ratio in (time_ratio, memory_ratio)),
+        })
+    return comparisons
+
+def format_results(run: dict, comparisons: List[dict] = None) -> str:
+    compared = {(c["stage"], c["segments"]): c for c in comparisons or []}
+    lines = [f'{"stage":<34}{"segments":>10}{"seconds":>10}{"peak MB":>10}{"vs base":>10}']
+    for result in run["results"]:
+        if "skipped" in result:
+            lines.append(f'{result["stage"]:<34}{result["segments"]:>10}  skipped')
+            continue
+        peak = f'{result["peak_bytes"] / 2**20:.1f}' if result["peak_bytes"] is not None else "-"
+        comparison = compared.get((result["stage"], result["segments"]))
+        ratio = "-"
+        if comparison is not None and comparison["time_ratio"] is not None:
+            ratio = f'{comparison["time_ratio"]:.2f}x' + (" !" if comparison["regressed"] else "")
+        lines.append(f'{result["stage"]:<34}{result["segments"]:>10}{result["seconds"]:>10.4f}{peak:>10}{ratio:>10}')
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the transcription pipeline on synthetic transcripts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Transcript sizes in segments.")
+    parser.add_argument("--speakers", type=int, default=4, help="Number of speaker tracks.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage, the best is kept.")
+    parser.add_argument("--stages", type=str, nargs="+", default=list(STAGES), choices=STAGES, help="Stages to benchmark.")
+    parser.add_argument("--columnar", action="store_true", help="Benchmark SegmentTables instead of lists of Segments.")
+    parser.add_argument("--slice-max-tokens", type=int, help="Slice the transcript by tokens instead of by lines.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run for peak memory.")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", type=str, help="Compare against this baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to the baseline file, {DEFAULT_BASELINE} by default.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Fraction a stage may be slower or larger than the baseline.")
+    args = parser.parse_args(argv)
+
+    run = run_benchmarks(
+        sizes=args.sizes,
+        num_speakers=args.speakers,
+        repeat=args.repeat,
+        columnar=args.columnar,
+        measure_memory=not args.no_memory,
+        slice_max_tokens=args.slice_max_tokens,
+        stages=args.stages
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w") as f:
+            json.dump(run, f, indent=2)
+
+    comparisons = None
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline) as f:
+            comparisons = compare_to_baseline(run, json.load(f), args.tolerance)
+    print(format_results(run, comparisons))
+
+    if comparisons and any(comparison["regressed"] for comparison in comparisons):
+        print(f"Regressed more than {args.tolerance:.0%} against {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Benchmark of the int8 quantized Whisper service against float32 Whisper
+on the CPU.
+
+Both models decode the same window of audio, and the run reports the time
+of each, the memory of each model, and how far the quantized model's
+logits are from the float32 model's:
+
+    python -m benchmarks.quantized --model small
+    python -m benchmarks.quantized --random --output results.json
+
+With --random a randomly initialised model with the given dimensions is
+used instead of downloaded weights, so the benchmark runs offline. Its
+speed is the same as a trained model of the same size; its transcriptions
+are gibberish, but the float32 and int8 gibberish should match.
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from typing import Any, List
+
+import numpy as np
+
+from transcriptly.model_pool import model_size_in_bytes, quantize_dynamic_int8
+from transcriptly.vad import SAMPLE_RATE
+
+# Dimensions of Whisper's models, for random models of the same size
+MODEL_DIMS = {
+    "tiny": {"n_audio_state": 384, "n_audio_head": 6, "n_audio_layer": 4},
+    "base": {"n_audio_state": 512, "n_audio_head": 8, "n_audio_layer": 6},
+    "small": {"n_audio_state": 768, "n_audio_head": 12, "n_audio_layer": 12},
+    "medium": {"n_audio_state": 1024, "n_audio_head": 16, "n_audio_layer": 24},
+}
+
+
+def random_whisper_model(n_state: int = 384, n_head: int = 6, n_layer: int = 4, n_vocab: int = 51865, seed: int = 0) -> Any:
+    """
+    Builds a Whisper model with random weights and the same encoder and
+    decoder size, for tests and benchmarks that can't download a model.
+    """
+    import torch
+
+    from whisper.model import ModelDimensions, Whisper
+
+    torch.manual_seed(seed)
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=n_state, n_audio_head=n_head, n_audio_layer=n_layer,
+        n_vocab=n_vocab, n_text_ctx=448, n_text_state=n_state, n_text_head=n_head, n_text_layer=n_layer
+    )
+    model = Whisper(dims).eval()
+    # Only the encoder's positional embedding is computed, the decoder's is
+    # left uninitialised for the checkpoint to fill in
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+def synthetic_mel(seconds: float = 30.0, seed: int = 0):
+    """
+    Log-Mel spectrogram of a 30 second window holding seconds of noise.
+    """
+    import whisper
+
+    audio = np.random.default_rng(seed).normal(0, 0.1, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(audio))
+
+def compare_logits(reference, quantized, mel, num_tokens: int = 32, seed: int = 0) -> dict:
+    """
+    Runs both models on the same audio and tokens and compares their
+    logits.
+
+    Returns: dict with the relative error of the quantized logits and the
+    fraction of positions where both models pick the same next token
+    """
+    import torch
+
+    tokens = torch.from_numpy(np.random.default_rng(seed).integers(0, reference.dims.n_vocab, (1, num_tokens)))
+    with torch.no_grad():
+        expected = reference.logits(tokens, reference.encoder(mel.unsqueeze(0)))
+        actual = quantized.logits(tokens, quantized.encoder(mel.unsqueeze(0)))
+    return {
+        "relative_error": float((actual - expected).norm() / expected.norm()),
+        "top1_agreement": float((actual.argmax(-1) == expected.argmax(-1)).float().mean()),
+    }
+
+def decode(model, mel, sample_len: int) -> List[int]:
+    """
+    Greedily decodes up to sample_len tokens of English from a window.
+    """
+    import whisper
+
+    options = whisper.DecodingOptions(language="en", without_timestamps=True, sample_len=sample_len, fp16=False)
+    return whisper.decode(model, mel, options).tokens
+
+def time_decode(model, mel, sample_len: int, repeat: int) -> float:
+    decode(model, mel, sample_len)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(model, mel, sample_len)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmark(model: Any, model_label: str, seconds: float = 30.0, sample_len: int = 64, repeat: int = 3) -> dict:
+    """
+    Quantizes a copy of a float32 model and times both decoding the same
+    window, best of repeat runs.
+    """
+    import torch
+
+    quantized = quantize_dynamic_int8(copy.deepcopy(model))
+    mel = synthetic_mel(seconds)
+    results = {}
+    for label, candidate in (("float32", model), ("int8", quantized)):
+        logging.info(f"Timing {label} {model_label}...")
+        results[label] = {
+            "seconds": time_decode(candidate, mel, sample_len, repeat),
+            "model_bytes": model_size_in_bytes(candidate),
+        }
+    reference_tokens = decode(model, mel, sample_len)
+    quantized_tokens = decode(quantized, mel, sample_len)
+    matching = sum(a == b for a, b in zip(reference_tokens, quantized_tokens))
+    return {
+        "meta": {
+            "model": model_label,
+            "audio_seconds": seconds,
+            "sample_len": sample_len,
+            "repeat": repeat,
+            "threads": torch.get_num_threads(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+        "speedup": results["float32"]["seconds"] / results["int8"]["seconds"],
+        "parity": {
+            **compare_logits(model, quantized, mel),
+            "decoded_token_agreement": matching / max(len(reference_tokens), len(quantized_tokens), 1),
+        },
+    }
+
+def print_results(run: dict) -> None:
+    print(f"{run['meta']['model']}, {run['meta']['threads']} threads")
+    for label, result in run["results"].items():
+        print(f"{label:>8}: {result['seconds']:8.3f}s  {result['model_bytes'] / 1024 / 1024:8.1f} MB")
+    parity = run["parity"]
+    print(f"speedup: {run['speedup']:.2f}x")
+    print(f"logit relative error: {parity['relative_error']:.2e}, top-1 agreement: {parity['top1_agreement']:.3f}, decoded tokens agreement: {parity['decoded_token_agreement']:.3f}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark int8 quantized Whisper against float32 Whisper on the CPU")
+    parser.add_argument("--model", type=str, default="tiny", choices=list(MODEL_DIMS), help="Whisper model, or model size with --random.")
+    parser.add_argument("--random", action="store_true", help="Use a randomly initialised model of the same size instead of downloading it.")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Seconds of audio in the decoded window.")
+    parser.add_argument("--sample-len", type=int, default=64, help="Number of tokens decoded from the window.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per model; the fastest is reported.")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("TRANSCRIPTION_THREADS", 0)) or None, help="Torch threads. Defaults to Torch's own default.")
+    parser.add_argument("--output", type=str, help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    import torch
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.random:
+        dims = MODEL_DIMS[args.model]
+        model = random_whisper_model(dims["n_audio_state"], dims["n_audio_head"], dims["n_audio_layer"])
+        model_label = f"random {args.model}"
+    else:
+        import whisper
+
+        model = whisper.load_model(args.model, device="cpu")
+        model_label = args.model
+
+    run = run_benchmark(model, model_label, args.seconds, args.sample_len, args.repeat)
+    print_results(run)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Reads and writes the transcript database served by main.py.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+import models
+from transcriptly.data_types import Segment
+from transcriptly.transcript_writer import read_segments
+
+# Segments inserted per executemany
+INGEST_BATCH_SIZE = 10_000
+# Columns of a segment row as passed to executemany, in table order
+SEGMENT_COLUMNS = ["session_id", "speaker_id", "start_time", "end_time", "text"]
+# Separates the parts of a page cursor
+CURSOR_SEPARATOR = ":"
+
+
+def encode_cursor(row: Row) -> str:
+    """
+    Cursor pointing just past row in the (session, start time, id) order
+    segments are paged in.
+    """
+    return CURSOR_SEPARATOR.join((str(row.session_id), repr(row.start_time), str(row.id)))
+
+def decode_cursor(cursor: str) -> Tuple[int, float, int]:
+    try:
+        session_id, start_time, segment_id = cursor.split(CURSOR_SEPARATOR)
+        return int(session_id), float(start_time), int(segment_id)
+    except ValueError:
+        raise RuntimeError(f"Invalid cursor: {cursor!r}")
+
+def get_speaker_ids(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the ids of the named speakers, adding the ones that aren't in
+    the database yet.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    speaker = models.Speaker
+    speaker_ids = dict(db.execute(select(speaker.name, speaker.id).where(speaker.name.in_(names))).all())
+    missing = names - speaker_ids.keys()
+    if missing:
+        db.execute(insert(speaker.__table__), [{"name": name} for name in sorted(missing)])
+        speaker_ids.update(db.execute(select(speaker.name, speaker.id).where(speaker.name.in_(missing))).all())
+    return speaker_ids
+
+def ingest_segments(db: Session, session_name: str, segments: Iterable[Segment], batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """
+    Stores a merged transcript as the segments of a session, replacing the
+    session's segments if it was ingested before. Segments are inserted
+    batch_size rows per executemany, and committed once at the end. The
+    INSERT is compiled once and the rows go to the database driver as
+    plain tuples, because having SQLAlchemy process every row's parameters
+    takes longer than SQLite takes to store them.
+
+    Input:
+        db: Session
+        session_name: str
+        segments: Iterable[Segment], e.g. Transcribe.sort_segments or
+            transcript_writer.read_segments
+        batch_size: int, rows per executemany
+
+    Returns: int, number of segments stored
+    """
+    session = db.execute(
+        select(models.TranscriptSession).where(models.TranscriptSession.name == session_name)
+    ).scalar_one_or_none()
+    if session is None:
+        session = models.TranscriptSession(name=session_name, max_segment_seconds=0.0)
+        db.add(session)
+        db.flush()
+    else:
+        db.execute(delete(models.TranscriptSegment.__table__).where(models.TranscriptSegment.session_id == session.id))
+
+    connection = db.connection()
+    statement = insert(models.TranscriptSegment.__table__).compile(dialect=connection.dialect, column_keys=SEGMENT_COLUMNS)
+    speaker_ids = {}
+    count = 0
+    max_segment_seconds = 0.0
+
+    def insert_batch(batch: List[Segment]) -> None:
+        new_speakers = {segment.speaker for segment in batch if segment.speaker is not None} - speaker_ids.keys()
+        speaker_ids.update(get_speaker_ids(db, new_speakers))
+        rows = [
+            (session.id, speaker_ids.get(segment.speaker), segment.start_time, segment.end_time, segment.text)
+            for segment in batch
+        ]
+        if not statement.positional:
+            rows = [dict(zip(SEGMENT_COLUMNS, row)) for row in rows]
+        connection.exec_driver_sql(statement.string, rows)
+
+    batch = []
+    for segment in segments:
+        batch.append(segment)
+        max_segment_seconds = max(max_segment_seconds, segment.end_time - segment.start_time)
+        if len(batch) == batch_size:
+            insert_batch(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        insert_batch(batch)
+        count += len(batch)
+
+    session.max_segment_seconds = max_segment_seconds
+    db.commit()
+    return count
+
+def ingest_transcript_file(db: Session, session_name: str, transcript_file: str, batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """
+    Stores a transcript file in any of transcribe.py's output formats, see
+    ingest_segments.
+    """
+    return ingest_segments(db, session_name, read_segments(transcript_file), batch_size)
+
+def sessions_query():
+    session, segment = models.TranscriptSession, models.TranscriptSegment
+    return (
+        select(session.id, session.name, func.count(segment.id).label("segment_count"))
+        .outerjoin(segment, segment.session_id == session.id)
+        .group_by(session.id)
+    )
+
+def get_sessions(db: Session) -> List[Row]:
+    """
+    Returns every session with its number of segments, by name.
+    """
+    return db.execute(sessions_query().order_by(models.TranscriptSession.name)).all()
+
+def get_session(db: Session, session_name: str) -> Optional[Row]:
+    """
+    Returns a session with its number of segments, or None if there is no
+    session by that name.
+    """
+    return db.execute(sessions_query().where(models.TranscriptSession.name == session_name)).first()
+
+def get_segments(db: Session, session: str = None, speaker: str = None, start: float = None, end: float = None, cursor: str = None, limit: int = 100) -> Tuple[List[Row], Optional[str]]:
+    """
+    Returns a page of segments in (session, start time) order, optionally
+    only those of one session or speaker, or overlapping the time range
+    from start to end in seconds.
+
+    Pages are keyset paginated: the cursor holds the position of the last
+    segment of the previous page, and the next page starts right after it
+    in the index, so every page costs the same however deep it is, where
+    an OFFSET would scan and throw away all the rows before it. Segments
+    added or removed between pages don't shift the pages either.
+
+    Returns: (rows with id, session_id, session, speaker, text, start_time
+    and end_time, cursor of the next page or None on the last page)
+    """
+    segment_table, session_table, speaker_table = models.TranscriptSegment, models.TranscriptSession, models.Speaker
+    query = (
+        select(
+            segment_table.id,
+            segment_table.session_id,
+            session_table.name.label("session"),
+            speaker_table.name.label("speaker"),
+            segment_table.text,
+            segment_table.start_time,
+            segment_table.end_time,
+        )
+        .join(session_table, segment_table.session_id == session_table.id)
+        .outerjoin(speaker_table, segment_table.speaker_id == speaker_table.id)
+    )
+
+    if session is not None:
+        session_row = db.execute(
+            select(session_table.id, session_table.max_segment_seconds).where(session_table.name == session)
+        ).first()
+        if session_row is None:
+            return [], None
+        query = query.where(segment_table.session_id == session_row.id)
+        max_segment_seconds = session_row.max_segment_seconds
+    elif start is not None:
+        max_segment_seconds = db.scalar(select(func.max(session_table.max_segment_seconds))) or 0.0
+
+    if speaker is not None:
+        speaker_id = db.scalar(select(speaker_table.id).where(speaker_table.name == speaker))
+        if speaker_id is None:
+            return [], None
+        query = query.where(segment_table.speaker_id == speaker_id)
+
+    if start is not None:
+        # A segment overlapping the range starts at most max_segment_seconds
+        # before it, which keeps the scan of the start time index short
+        query = query.where(segment_table.start_time >= start - max_segment_seconds, segment_table.end_time > start)
+    if end is not None:
+        query = query.where(segment_table.start_time < end)
+
+    if cursor is not None:
+        session_id, start_time, segment_id = decode_cursor(cursor)
+        if session is not None:
+            query = query.where(tuple_(segment_table.start_time, segment_table.id) > tuple_(start_time, segment_id))
+        else:
+            query = query.where(
+                tuple_(segment_table.session_id, segment_table.start_time, segment_table.id) > tuple_(session_id, start_time, segment_id)
+            )
+
+    rows = db.execute(
+        query.order_by(segment_table.session_id, segment_table.start_time, segment_table.id).limit(limit + 1)
+    ).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
@@ -0,0 +1,17 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+SQLALCHEMY_DATABASE_URL = os.environ.get("TRANSCRIPT_DATABASE_URL", "sqlite:///./transcripts.db")
+
+
+def create_database_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    # SQLite connections are used by FastAPI's worker threads, not only the
+    # thread that opened them
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(url, connect_args=connect_args)
+
+
+engine = create_database_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
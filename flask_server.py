@@ -1,32 +1,101 @@
 import datetime
+import os
+import threading
+import uuid
 
-import whisper
-from blinker import Namespace
-from flask import Flask, request
+from functools import partial
+
+from flask import Flask, Response, jsonify, request
+
+from transcriptly.data_types import AudioInput
+from transcriptly.instrumentation import get_tracer, run_traced
+from transcriptly.job_queue import JobQueue
+from transcriptly.transcribe import Transcribe, _transcribe_in_worker
 
-my_signals = Namespace()
-audio_uploaded = my_signals.signal("audio_uploaded")
 app = Flask(__name__)
 
+TRANSCRIPTION_MODEL = os.getenv("FLASK_TRANSCRIPTION_MODEL", "small")
+TRANSCRIPTION_WORKERS = int(os.getenv("FLASK_TRANSCRIPTION_WORKERS", 1))
+MAX_QUEUED_JOBS = int(os.getenv("FLASK_MAX_QUEUED_JOBS", 100))
+
+_job_queue: JobQueue = None
+_job_queue_lock = threading.Lock()
+
 def datetime_stamp():
-    return datetime.datetime.now().strftime("%y%m%d%H%m%S")
+    return datetime.datetime.now().strftime("%y%m%d%H%M%S")
+
+def save_transcription(job, traced_result):
+    # Runs in the server process once a worker finishes the job
+    segments, spans = traced_result
+    get_tracer().extend(spans)
+    transcription_path = f"transcriptions/transcription-{datetime_stamp()}-{job.job_id}.txt"
+    text = "".join(segment.text for segment in segments)
+    with open(transcription_path, "w") as f:
+        f.write(text)
+    print(f"[{datetime_stamp()}] Transcription saved to: {transcription_path}")
+    return {
+        "transcription_path": transcription_path,
+        "text": text,
+        "segments": [
+            {"text": segment.text, "start_time": segment.start_time, "end_time": segment.end_time}
+            for segment in segments
+        ],
+    }
+
+def get_job_queue() -> JobQueue:
+    """
+    Starts the transcription workers on first use. Each worker is a separate
+    process holding a warm Transcribe, so uploads never wait for a model to
+    load and transcription never runs on a request thread. If a worker
+    dies, the queue starts a new pool in place of the broken one.
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            # Workers send their stage timings back with each job; the server
+            # only keeps the running totals
+            tracer = get_tracer()
+            tracer.enabled = True
+            tracer.keep_spans = False
+            transcribe = Transcribe(service_name="whisper", model_name=TRANSCRIPTION_MODEL, workers=TRANSCRIPTION_WORKERS)
+            create_pool = partial(transcribe.create_process_pool, TRANSCRIPTION_WORKERS, warm_up=True)
+            _job_queue = JobQueue(
+                create_pool(),
+                partial(run_traced, _transcribe_in_worker),
+                workers=TRANSCRIPTION_WORKERS,
+                max_queued=MAX_QUEUED_JOBS,
+                on_done=save_transcription,
+                create_executor=create_pool
+            )
+        return _job_queue
 
 @app.route("/upload", methods=["GET", "POST"])
 def upload_file():
     if request.method == "POST":
         f = request.files['file']
-        uploaded_file_path = f'./uploads/uploaded_file-{datetime_stamp()}.txt'
+        # Uploads are queued, so several can arrive within the same second
+        uploaded_file_path = f'./uploads/uploaded_file-{datetime_stamp()}-{uuid.uuid4().hex}.txt'
         f.save(uploaded_file_path)
         print(f"[{datetime_stamp()}] File uploaded to: {uploaded_file_path}")
-        audio_uploaded.send(app, path=uploaded_file_path)
-        return "File uploaded successfully"
-
-@audio_uploaded.connect
-def transcribe(app, path):
-    model = whisper.load_model("small")
-    result = model.transcribe(path)
-    print(f"[{datetime_stamp()}] Transcription Sample -->{result['text'][:100]}")
-    transcription_path = f"transcriptions/transcription-{datetime_stamp()}.txt"
-    with open (transcription_path, "w") as f:
-        f.write(result["text"])
-    print(f"[{datetime_stamp()}] Transcription saved to: {transcription_path}")
\ No newline at end of file
+        try:
+            job = get_job_queue().submit(AudioInput(uploaded_file_path))
+        except RuntimeError as e:
+            os.remove(uploaded_file_path)
+            return jsonify({"error": str(e)}), 503
+        return jsonify({"job_id": job.job_id, "status": job.status}), 202
+    return "Upload a file with POST"
+
+@app.route("/jobs/<job_id>")
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"No job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/metrics")
+def metrics():
+    stats = get_job_queue().stats()
+    if request.args.get("format") == "prometheus":
+        lines = [f"transcriptly_job_queue_{name} {value}" for name, value in stats.items()]
+        return Response("\n".join(lines) + "\n" + get_tracer().to_prometheus(), mimetype="text/plain")
+    return jsonify({**stats, "stages": get_tracer().summary()})
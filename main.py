@@ -1,13 +1,27 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+import crud
 import models
 import schemas
 from database import SessionLocal, engine
+from transcriptly.data_types import Segment
+from transcriptly.interval_index import parse_timestamp
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # create the database tables on startup rather than on import, so that
+    # importing the app doesn't create a database file
+    models.Base.metadata.create_all(bind=engine)
+    yield
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # add middleware to enable CORS
 app.add_middleware(
@@ -18,9 +32,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# create the database tables
-models.Base.metadata.create_all(bind=engine)
-
 
 # dependency to get a database session
 def get_db():
@@ -31,16 +42,76 @@ def get_db():
         db.close()
 
 
-@app.post("/characters", response_model=schemas.Character)
-def create_character(character: schemas.CharacterCreate, db: Session = Depends(get_db)):
-    db_character = models.Character(name=character.name, race=character.race, class_=character.class_)
-    db.add(db_character)
-    db.commit()
-    db.refresh(db_character)
-    return db_character
+def parse_time(value: Optional[str]) -> Optional[float]:
+    # Times can be seconds or timestamps like 1:02:00
+    if value is None:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value!r}")
+
+
+def segment_page(db: Session, session: str, speaker: str, start: str, end: str, cursor: str, limit: int) -> schemas.SegmentPage:
+    try:
+        rows, next_cursor = crud.get_segments(db, session, speaker, parse_time(start), parse_time(end), cursor, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return schemas.SegmentPage(
+        segments=[
+            schemas.Segment(
+                id=row.id,
+                session=row.session,
+                speaker=row.speaker,
+                text=row.text,
+                start_time=row.start_time,
+                end_time=row.end_time,
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@app.post("/sessions/{session_name}/segments", response_model=schemas.Session, status_code=201)
+def create_session_segments(session_name: str, segments: List[schemas.SegmentCreate], db: Session = Depends(get_db)):
+    # Replaces the session's segments if it was ingested before
+    crud.ingest_segments(
+        db,
+        session_name,
+        (Segment(segment.text, segment.start_time, segment.end_time, segment.speaker) for segment in segments),
+    )
+    return crud.get_session(db, session_name)
+
+
+@app.get("/sessions", response_model=List[schemas.Session])
+def read_sessions(db: Session = Depends(get_db)):
+    return crud.get_sessions(db)
+
+
+@app.get("/sessions/{session_name}/segments", response_model=schemas.SegmentPage)
+def read_session_segments(
+    session_name: str,
+    speaker: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    if crud.get_session(db, session_name) is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_name!r} not found")
+    return segment_page(db, session_name, speaker, start, end, cursor, limit)
 
 
-@app.get("/characters", response_model=List[schemas.Character])
-def read_characters(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    characters = db.query(models.Character).offset(skip).limit(limit).all()
-    return characters
+@app.get("/segments", response_model=schemas.SegmentPage)
+def read_segments(
+    session: Optional[str] = None,
+    speaker: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    return segment_page(db, session, speaker, start, end, cursor, limit)
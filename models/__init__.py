@@ -0,0 +1 @@
+from .models import Base, Speaker, TranscriptSegment, TranscriptSession
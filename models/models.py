@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+
+class TranscriptSession(Base):
+    """
+    A recording session, e.g. one meeting, whose tracks were merged into
+    one transcript.
+    """
+    __tablename__ = "sessions"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    # Length of the longest segment, so that time range queries only scan
+    # segments starting at most this long before the range, like
+    # transcriptly.interval_index.IntervalIndex
+    max_segment_seconds = Column(Float, nullable=False, default=0.0)
+
+
+class Speaker(Base):
+    __tablename__ = "speakers"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+
+class TranscriptSegment(Base):
+    __tablename__ = "segments"
+    # Both indexes end in the (start_time, id) order segments are paged in,
+    # so a page is a range scan of one of them
+    __table_args__ = (
+        Index("ix_segments_session_start", "session_id", "start_time", "id"),
+        Index("ix_segments_speaker", "speaker_id", "session_id", "start_time", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("sessions.id"), nullable=False)
+    speaker_id = Column(Integer, ForeignKey("speakers.id"), nullable=True)
+    start_time = Column(Float, nullable=False)
+    end_time = Column(Float, nullable=False)
+    text = Column(Text, nullable=False)
@@ -0,0 +1,33 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class SegmentCreate(BaseModel):
+    text: str
+    start_time: float
+    end_time: float
+    speaker: Optional[str] = None
+
+
+class Segment(BaseModel):
+    id: int
+    session: str
+    speaker: Optional[str] = None
+    text: str
+    start_time: float
+    end_time: float
+
+
+class SegmentPage(BaseModel):
+    segments: List[Segment]
+    # Pass as cursor to get the next page, None on the last page
+    next_cursor: Optional[str] = None
+
+
+class Session(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    segment_count: int
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # write a setup.py file
 
-from distutils.core import setup, find_packages
+from setuptools import setup, find_packages
 
 setup(
     name='transcribe and summarize',
@@ -9,5 +9,11 @@ setup(
     description='Uses OpenAI Whisper and GPT to transcribe and summarize audio files',
     author='Ryan Saul',
     author_email='giantryansaul@gmail.com',
-    packages=find_packages(exclude=('tests', 'docs'))
-)
\ No newline at end of file
+    packages=find_packages(exclude=('tests', 'docs', 'benchmarks')),
+    py_modules=['summarize'],
+    entry_points={
+        'console_scripts': [
+            'transcriptly = transcriptly.cli:main',
+        ],
+    }
+)
@@ -1,12 +1,14 @@
 import os
-import pickle
 import argparse
 import logging
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List
 
-from dotenv import dotenv_values
-import openai
-import tiktoken
+from transcriptly.cache import SummaryCache
+from transcriptly.chunk_planner import StreamingChunker, batch_by_tokens, plan_chunks
+from transcriptly.instrumentation import get_tracer, stage
+from transcriptly.rate_limit import RateLimiter, retry_with_backoff
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -14,75 +16,270 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 model_name = "gpt-3.5-turbo"
-enc = tiktoken.encoding_for_model(model_name)
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Overridden from the config when run as a script
+MAX_LINES_PER_TRANSCRIPT = 100
+# Levels of summaries reduce_summaries makes before giving up on
+# summaries that don't get shorter
+DEFAULT_SUMMARY_MAX_DEPTH = 8
+# Goes between the summaries in a request that combines them
+SUMMARY_SEPARATOR = '\"\"\" \"\"\"'
 
-# Saving the following comments for later in case I need to come back to chunking by tokens
-# max_tokens_per_transcript = args.max_tokens
-# encoded_prompt = enc.encode(slice_prompt)
-# print(f"The amount of tokens for the transcritpion is {len(encoded_prompt)}")
-# sliced_prompt = [encoded_prompt[i:i+max_tokens_per_transcript] for i in range(0, len(encoded_prompt), max_tokens_per_transcript)]
+@lru_cache(maxsize=None)
+def get_encoding():
+    """
+    Loads the model's tokenizer on first use. Loading it can mean a download,
+    so commands that never count tokens don't pay for it.
+    """
+    import tiktoken
 
-def slice_transcript_file(transcription_file):
-    with open(transcription_file, 'r') as f:
-        transcript_lines = f.readlines()
+    return tiktoken.encoding_for_model(model_name)
 
-    sliced_transcript = [transcript_lines[i:i+MAX_LINES_PER_TRANSCRIPT] for i in range(0, len(transcript_lines), MAX_LINES_PER_TRANSCRIPT)]
+def __getattr__(name):
+    # summarize.enc used to be loaded at import time
+    if name == "enc":
+        return get_encoding()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def slice_transcript_file(transcription_file, max_tokens: int = None, overlap_tokens: int = 0, by_speaker_turn: bool = False):
+    """
+    Slices the transcript into lists of lines. Without a token budget the
+    transcript is cut every MAX_LINES_PER_TRANSCRIPT lines. With one, whole
+    lines (or whole speaker turns) are packed into slices that fill
+    max_tokens, optionally repeating overlap_tokens of context between
+    slices.
+    """
+    with stage("slice", source=transcription_file) as span:
+        with open(transcription_file, 'r') as f:
+            transcript_lines = f.readlines()
+
+        if max_tokens:
+            # Encode every line once up front and plan the slices from the counts
+            token_counts = [len(tokens) for tokens in get_encoding().encode_ordinary_batch(transcript_lines)]
+            logging.info(f"Token length of transcript: {sum(token_counts)}")
+            sliced_transcript = plan_chunks(transcript_lines, token_counts, max_tokens, overlap_tokens, by_speaker_turn)
+        else:
+            sliced_transcript = [transcript_lines[i:i+MAX_LINES_PER_TRANSCRIPT] for i in range(0, len(transcript_lines), MAX_LINES_PER_TRANSCRIPT)]
+        span["segments"] = len(transcript_lines)
     logging.info(f"Number of slices from transcript: {len(sliced_transcript)}")
     return sliced_transcript
 
-def summarize_transcript_slice(tslice, slice_system_directive: str, slice_prompt: str):
-    messages = [
+def build_slice_messages(tslice, slice_system_directive: str, slice_prompt: str):
+    return [
                 {"role": "system", "content": slice_system_directive},
                 {"role": "user", "content": f'"""{tslice}""" Prompt: {slice_prompt} '},
             ]
 
-    logging.debug(f'Tokens for slice: {len(enc.encode(str(messages)))}')
+def create_chat_completion(messages) -> str:
+    import openai
 
-    chat_completion = openai.ChatCompletion.create(
-        model=model_name, 
-        messages=messages)
-    
-    summary = chat_completion.choices[0].message.content
-    return summary
+    with stage("openai_call", model=model_name) as span:
+        chat_completion = openai.ChatCompletion.create(
+            model=model_name, 
+            messages=messages)
+        usage = chat_completion.get("usage") or {}
+        span.update(
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            total_tokens=usage.get("total_tokens")
+        )
+    return chat_completion.choices[0].message.content
+
+def create_chat_completion_with_retries(messages, rate_limiter: RateLimiter = None, max_retries: int = 5, summary_cache: SummaryCache = None) -> str:
+    """
+    Waits on the rate limiter before each attempt and retries rate limits,
+    server errors, timeouts and connection errors with exponential backoff
+    and jitter. Errors that would fail the same way again, like a bad API
+    key or an invalid request, are raised straight away. With a summary
+    cache, messages that were already sent to the model are answered from
+    the cache instead.
+    """
+    if summary_cache is not None:
+        summary = summary_cache.get_summary(model_name, messages)
+        if summary is not None:
+            return summary
+        summary = create_chat_completion_with_retries(messages, rate_limiter, max_retries)
+        summary_cache.put_summary(model_name, messages, summary)
+        return summary
+
+    import openai
+
+    tokens = 0
+    if rate_limiter is not None and rate_limiter.limits_tokens:
+        tokens = len(get_encoding().encode(str(messages)))
+
+    def attempt():
+        if rate_limiter is not None:
+            rate_limiter.acquire(tokens)
+        return create_chat_completion(messages)
+
+    retry_on = (
+        openai.error.RateLimitError,
+        openai.error.APIError,
+        openai.error.Timeout,
+        openai.error.ServiceUnavailableError,
+        openai.error.APIConnectionError,
+    )
+    return retry_with_backoff(attempt, max_retries=max_retries, retry_on=retry_on)
+
+def summarize_transcript_slice_with_retries(tslice, slice_system_directive: str, slice_prompt: str, rate_limiter: RateLimiter = None, max_retries: int = 5, summary_cache: SummaryCache = None):
+    messages = build_slice_messages(tslice, slice_system_directive, slice_prompt)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f'Tokens for slice: {len(get_encoding().encode(str(messages)))}')
+    return create_chat_completion_with_retries(messages, rate_limiter, max_retries, summary_cache)
     
-def create_summaries_from_sliced_transcript(sliced_transcript, slice_system_directive: str, slice_prompt: str):
-    summaries = []
-    for i, tslice in enumerate(sliced_transcript):
+def create_summaries_from_sliced_transcript(sliced_transcript, slice_system_directive: str, slice_prompt: str, max_workers: int = 1, rate_limiter: RateLimiter = None, max_retries: int = 5, summary_cache: SummaryCache = None):
+    """
+    Summarizes every slice of the transcript. With more than one worker the
+    slices are sent to OpenAI concurrently from a thread pool. Summaries are
+    returned in slice order either way. With a summary cache only slices
+    that are new or changed since an earlier run are sent to OpenAI.
+    """
+    num_slices = len(sliced_transcript)
+
+    def summarize(indexed_slice):
+        i, tslice = indexed_slice
         iterator = i + 1
-        num_slices = len(sliced_transcript)
         logging.info(f"Creating Summary {iterator} of {num_slices}")
-        while True:
-            try:
-                summary = summarize_transcript_slice(tslice, slice_system_directive, slice_prompt)
-            except:
-                logging.info(f"Ran into error from OpenAI, retrying in 2 seconds")
-                sleep(2)
-                continue
-            break
+        summary = summarize_transcript_slice_with_retries(tslice, slice_system_directive, slice_prompt, rate_limiter, max_retries, summary_cache)
         logging.info(f"Summary {iterator} of {num_slices}: {summary}")
-        summaries.append(summary)
+        return summary
+
+    with stage("summarize_slices", slices=num_slices), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summaries = list(executor.map(summarize, enumerate(sliced_transcript)))
+    if summary_cache is not None:
+        summary_cache.log_stats()
     return summaries
 
-def summarize_all_summaries(summaries, summary_system_directive: str, summary_prompt: str):
-    triple_quote_join = '\"\"\" \"\"\"'.join(summaries)
-    logging.info(f"Token length of summaries: {len(enc.encode(triple_quote_join))}")
+def create_summaries_from_stream(lines: Iterable[str], slice_system_directive: str, slice_prompt: str, max_tokens: int = None, overlap_tokens: int = 0, by_speaker_turn: bool = False, max_workers: int = 1, rate_limiter: RateLimiter = None, max_retries: int = 5, summary_cache: SummaryCache = None) -> List[str]:
+    """
+    Summarizes transcript lines while they are still being produced. Lines
+    are packed into slices of max_tokens as they arrive, see
+    StreamingChunker, and each slice is sent to OpenAI from a thread pool as
+    soon as it is complete, so summarizing overlaps with whatever produces
+    the lines, like a transcription. Without max_tokens a slice is cut every
+    MAX_LINES_PER_TRANSCRIPT lines, as in slice_transcript_file. Summaries
+    are returned in slice order.
+    """
+    if max_tokens:
+        chunker = StreamingChunker(max_tokens, overlap_tokens, by_speaker_turn)
+        encoding = get_encoding()
+        count_tokens = lambda line: len(encoding.encode_ordinary(line))
+    else:
+        chunker = StreamingChunker(MAX_LINES_PER_TRANSCRIPT)
+        count_tokens = lambda line: 1
+    futures = []
+
+    def submit(tslices):
+        for tslice in tslices:
+            logging.info(f"Creating Summary {len(futures) + 1}")
+            futures.append(executor.submit(
+                summarize_transcript_slice_with_retries,
+                tslice, slice_system_directive, slice_prompt, rate_limiter, max_retries, summary_cache
+            ))
 
-    messages = [
+    with stage("summarize_stream") as span, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        line_count = 0
+        for line in lines:
+            submit(chunker.add(line, count_tokens(line)))
+            line_count += 1
+        submit(chunker.flush())
+        summaries = [future.result() for future in futures]
+        span.update(segments=line_count, slices=len(summaries))
+    logging.info(f"Summarized {line_count} lines in {len(summaries)} slices")
+    if summary_cache is not None:
+        summary_cache.log_stats()
+    return summaries
+
+def build_summary_messages(summaries, summary_system_directive: str, summary_prompt: str):
+    triple_quote_join = SUMMARY_SEPARATOR.join(summaries)
+    return [
                 {"role": "system", 
                 "content": summary_system_directive},
                 {"role": "user", "content": f'"""{triple_quote_join}""" Prompt: {summary_prompt} '},
             ]
-    
-    logging.debug(f'Tokens for all summaries: {len(enc.encode(str(messages)))}')
 
-    chat_completion = openai.ChatCompletion.create(
-        model=model_name, 
-        messages=messages)
-    finished_summary = chat_completion.choices[0].message.content
+def summarize_all_summaries(summaries, summary_system_directive: str, summary_prompt: str, rate_limiter: RateLimiter = None, max_retries: int = 5, summary_cache: SummaryCache = None):
+    messages = build_summary_messages(summaries, summary_system_directive, summary_prompt)
+    logging.info(f"Token length of summaries: {len(get_encoding().encode(messages[1]['content']))}")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f'Tokens for all summaries: {len(get_encoding().encode(str(messages)))}')
+
+    finished_summary = create_chat_completion_with_retries(messages, rate_limiter, max_retries, summary_cache)
     logging.info(f"Finished summary:\n{finished_summary}")
     return finished_summary
 
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Splits text into consecutive pieces of at most max_tokens tokens.
+    """
+    encoding = get_encoding()
+    tokens = encoding.encode_ordinary(text)
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+def reduce_summaries(summaries, summary_system_directive: str, summary_prompt: str, max_tokens: int, fan_in: int = None, max_depth: int = DEFAULT_SUMMARY_MAX_DEPTH, max_workers: int = 1, rate_limiter: RateLimiter = None, max_retries: int = 5, summary_cache: SummaryCache = None):
+    """
+    Tree-reduces the slice summaries into one finished summary. Summaries are
+    grouped into batches of at most fan_in summaries whose request, with
+    the directive and prompt, fits in max_tokens tokens. Every batch is
+    summarized (in parallel with more than one worker), and this repeats
+    until the summaries fit in a single batch, which gets the final
+    summary. If the summaries still don't fit after max_depth levels, the
+    model isn't making them shorter, so the reduction stops there and the
+    summaries left are returned joined together.
+
+    A summary too long to share a request is summarized on its own, and
+    one too long for a request at all is split into pieces first, so no
+    request goes over max_tokens.
+    """
+    encoding = get_encoding()
+    # Every summary is counted with a separator and the budget with one
+    # spare, since a batch of n summaries holds n - 1 separators
+    separator_tokens = len(encoding.encode(SUMMARY_SEPARATOR))
+    overhead_tokens = sum(
+        len(encoding.encode(message["content"]))
+        for message in build_summary_messages([""], summary_system_directive, summary_prompt)
+    )
+    budget = max_tokens - overhead_tokens + separator_tokens
+    # Any two summaries this long fit in one request
+    pair_tokens = budget // 2 - separator_tokens
+    if pair_tokens < 1:
+        raise RuntimeError(f"A summary budget of {max_tokens} tokens leaves no room for summaries next to the directive and prompt ({overhead_tokens} tokens)")
+
+    depth = 0
+    while True:
+        token_counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(summaries)]
+        if any(tokens + separator_tokens > budget for tokens in token_counts):
+            pieces = [
+                split_by_tokens(summary, pair_tokens) if tokens + separator_tokens > budget else [summary]
+                for summary, tokens in zip(summaries, token_counts)
+            ]
+            logging.info(f"Split {sum(len(p) > 1 for p in pieces)} summaries over the budget into pieces of {pair_tokens} tokens")
+            summaries = [piece for summary_pieces in pieces for piece in summary_pieces]
+            token_counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(summaries)]
+        batches = batch_by_tokens([tokens + separator_tokens for tokens in token_counts], budget, fan_in)
+        if len(batches) <= 1:
+            break
+        if depth >= max_depth:
+            logging.warning(f"Reached the maximum summary depth of {max_depth} with {len(summaries)} summaries left, returning them joined")
+            return "\n\n".join(summaries)
+        depth += 1
+        logging.info(f"Summary level {depth}: combining {len(summaries)} summaries in {len(batches)} batches")
+
+        def summarize_batch(batch, summaries=summaries, token_counts=token_counts):
+            # A short summary left on its own is passed up to the next level
+            # as is. A long one is summarized alone to shrink it, as it may
+            # be too long to pair with its neighbours.
+            if len(batch) == 1 and token_counts[batch[0]] <= pair_tokens:
+                return summaries[batch[0]]
+            messages = build_summary_messages([summaries[i] for i in batch], summary_system_directive, summary_prompt)
+            return create_chat_completion_with_retries(messages, rate_limiter, max_retries, summary_cache)
+
+        with stage("reduce", depth=depth, batches=len(batches)), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            summaries = list(executor.map(summarize_batch, batches))
+
+    return summarize_all_summaries(summaries, summary_system_directive, summary_prompt, rate_limiter, max_retries, summary_cache)
+
 def check_str_configs_are_set_correctly(*configs):
     bad_configs = []
     for cfg in configs:
@@ -91,38 +288,79 @@ def check_str_configs_are_set_correctly(*configs):
     if bad_configs:
         raise RuntimeError(f'The following configs were not set correctly: {" ".join(bad_configs)}')
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Summarize transcript with GPT')
+def load_config(config_env_file: str) -> dict:
+    """
+    Reads the summarization settings from a .env file, overridden by
+    environment variables, and checks the prompts are set.
+    """
+    from dotenv import dotenv_values
+
+    config = {
+        **dotenv_values(config_env_file),
+        **os.environ
+    }
+    settings = {
+        "MAX_LINES_PER_TRANSCRIPT": int(config.get("MAX_LINES_PER_TRANSCRIPT", 100)),
+        "MAX_TOKENS_PER_SLICE": int(config.get("MAX_TOKENS_PER_SLICE", 0)) or None,
+        "SLICE_OVERLAP_TOKENS": int(config.get("SLICE_OVERLAP_TOKENS", 0)),
+        "SLICE_BY_SPEAKER_TURN": config.get("SLICE_BY_SPEAKER_TURN", "false").lower() in ("1", "true", "yes"),
+        "SLICE_SYSTEM_DIRECTIVE": config.get("SLICE_SYSTEM_DIRECTIVE"),
+        "SLICE_PROMPT": config.get("SLICE_PROMPT"),
+        "SUMMARY_SYSTEM_DIRECTIVE": config.get("SUMMARY_SYSTEM_DIRECTIVE"),
+        "SUMMARY_PROMPT": config.get("SUMMARY_PROMPT"),
+        "SUMMARY_WORKERS": int(config.get("SUMMARY_WORKERS", 1)),
+        "REQUESTS_PER_MINUTE": int(config.get("REQUESTS_PER_MINUTE", 0)) or None,
+        "TOKENS_PER_MINUTE": int(config.get("TOKENS_PER_MINUTE", 0)) or None,
+        "MAX_RETRIES": int(config.get("MAX_RETRIES", 5)),
+        "SUMMARY_CACHE_DIR": config.get("SUMMARY_CACHE_DIR", "cache/summaries"),
+        "SUMMARY_MAX_TOKENS": int(config.get("SUMMARY_MAX_TOKENS", 0)) or None,
+        "SUMMARY_FAN_IN": int(config.get("SUMMARY_FAN_IN", 0)) or None,
+        "SUMMARY_MAX_DEPTH": int(config.get("SUMMARY_MAX_DEPTH", 0)) or DEFAULT_SUMMARY_MAX_DEPTH,
+    }
+    check_str_configs_are_set_correctly(
+        settings["SLICE_SYSTEM_DIRECTIVE"],
+        settings["SLICE_PROMPT"],
+        settings["SUMMARY_SYSTEM_DIRECTIVE"],
+        settings["SUMMARY_PROMPT"]
+    )
+    return settings
+
+def main(argv: List[str] = None, prog: str = None) -> None:
+    global MAX_LINES_PER_TRANSCRIPT
+
+    parser = argparse.ArgumentParser(prog=prog, description='Summarize transcript with GPT')
     parser.add_argument('-f', '--file', type=str, help='Input file path')
     parser.add_argument('-o', '--output', type=str, default='./output_summary.txt', help='Output file path')
-    parser.add_argument('-c', '--cache', action='store_true', help='Cache summaries')
-    parser.add_argument('-r', '--resume', action='store_true', help='Resume from cache')
+    parser.add_argument('-c', '--cache', action='store_true', help='Cache summaries per slice, so only new or changed slices are summarized again')
+    parser.add_argument('-r', '--resume', action='store_true', help='Resume from cache, same as --cache')
     parser.add_argument('--config', type=str, default='.env', help='Path to .env file')
-    args = parser.parse_args()
+    parser.add_argument('--trace', type=str, help='Write per-stage timings and OpenAI token counts to this JSON file')
+    args = parser.parse_args(argv)
 
     transcription_file = args.file
     output_file = args.output
-    cache_summaries = args.cache
-    resume_from_cache = args.resume
+    cache_summaries = args.cache or args.resume
     config_env_file = args.config
+    if args.trace:
+        get_tracer().enabled = True
 
-    config = {
-        **dotenv_values(config_env_file),
-        **os.environ
-    }
-
-    MAX_LINES_PER_TRANSCRIPT = int(config.get("MAX_LINES_PER_TRANSCRIPT", 100))
-    SLICE_SYSTEM_DIRECTIVE = config.get("SLICE_SYSTEM_DIRECTIVE")
-    SLICE_PROMPT = config.get("SLICE_PROMPT")
-    SUMMARY_SYSTEM_DIRECTIVE = config.get("SUMMARY_SYSTEM_DIRECTIVE")
-    SUMMARY_PROMPT = config.get("SUMMARY_PROMPT")
-
-    check_str_configs_are_set_correctly(
-        SLICE_SYSTEM_DIRECTIVE, 
-        SLICE_PROMPT, 
-        SUMMARY_SYSTEM_DIRECTIVE, 
-        SUMMARY_PROMPT
-    )
+    config = load_config(config_env_file)
+    MAX_LINES_PER_TRANSCRIPT = config["MAX_LINES_PER_TRANSCRIPT"]
+    MAX_TOKENS_PER_SLICE = config["MAX_TOKENS_PER_SLICE"]
+    SLICE_OVERLAP_TOKENS = config["SLICE_OVERLAP_TOKENS"]
+    SLICE_BY_SPEAKER_TURN = config["SLICE_BY_SPEAKER_TURN"]
+    SLICE_SYSTEM_DIRECTIVE = config["SLICE_SYSTEM_DIRECTIVE"]
+    SLICE_PROMPT = config["SLICE_PROMPT"]
+    SUMMARY_SYSTEM_DIRECTIVE = config["SUMMARY_SYSTEM_DIRECTIVE"]
+    SUMMARY_PROMPT = config["SUMMARY_PROMPT"]
+    SUMMARY_WORKERS = config["SUMMARY_WORKERS"]
+    REQUESTS_PER_MINUTE = config["REQUESTS_PER_MINUTE"]
+    TOKENS_PER_MINUTE = config["TOKENS_PER_MINUTE"]
+    MAX_RETRIES = config["MAX_RETRIES"]
+    SUMMARY_CACHE_DIR = config["SUMMARY_CACHE_DIR"]
+    SUMMARY_MAX_TOKENS = config["SUMMARY_MAX_TOKENS"]
+    SUMMARY_FAN_IN = config["SUMMARY_FAN_IN"]
+    SUMMARY_MAX_DEPTH = config["SUMMARY_MAX_DEPTH"]
     
     logging.info(
         (
@@ -133,30 +371,79 @@ if __name__ == "__main__":
             f"\n"
             f"CONFIGURATION:\n\n"
             f"TRANSCRIPTION_FILE: {transcription_file}\n\n"
-            f"MAX_LINES_PER_TRANSCRIPT: {MAX_LINES_PER_TRANSCRIPT}\n\n"
+            f"MAX_LINES_PER_TRANSCRIPT: {MAX_LINES_PER_TRANSCRIPT}\n"
+            f"MAX_TOKENS_PER_SLICE: {MAX_TOKENS_PER_SLICE}\n"
+            f"SLICE_OVERLAP_TOKENS: {SLICE_OVERLAP_TOKENS}\n"
+            f"SLICE_BY_SPEAKER_TURN: {SLICE_BY_SPEAKER_TURN}\n\n"
+            f"SUMMARY_WORKERS: {SUMMARY_WORKERS}\n"
+            f"REQUESTS_PER_MINUTE: {REQUESTS_PER_MINUTE}\n"
+            f"TOKENS_PER_MINUTE: {TOKENS_PER_MINUTE}\n"
+            f"MAX_RETRIES: {MAX_RETRIES}\n\n"
+            f"SUMMARY_MAX_TOKENS: {SUMMARY_MAX_TOKENS}\n"
+            f"SUMMARY_FAN_IN: {SUMMARY_FAN_IN}\n"
+            f"SUMMARY_MAX_DEPTH: {SUMMARY_MAX_DEPTH}\n\n"
             f"SLICE_SYSTEM_DIRECTIVE: {SLICE_SYSTEM_DIRECTIVE}\n"
             f"SLICE_PROMPT: {SLICE_PROMPT}\n"
             f"SUMMARY_SYSTEM_DIRECTIVE: {SUMMARY_SYSTEM_DIRECTIVE}\n"
             f"SUMMARY_PROMPT: {SUMMARY_PROMPT}\n\n"
         ))
         
-    if not resume_from_cache:
-        logging.info(f"Loading transcript from {transcription_file}")
-        if not transcription_file:
-            raise Exception("Please provide a file path to the transcription file in the -f argument")
-        logging.info(f"Slicing transcript")
-        sliced_transcript = slice_transcript_file(transcription_file)
-        summaries = create_summaries_from_sliced_transcript(sliced_transcript, SLICE_SYSTEM_DIRECTIVE, SLICE_PROMPT)
-        with open('cache/summaries.pkl', 'wb') as f:
-            logging.info(f"Caching summaries")
-            pickle.dump(summaries, f)
-    else:
-        with open('cache/summaries.pkl', 'rb') as f:
-            logging.info(f"Loading summaries from cache")
-            summaries = pickle.load(f)
+    rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    summary_cache = None
+    if cache_summaries:
+        logging.info(f"Caching summaries in {SUMMARY_CACHE_DIR}")
+        summary_cache = SummaryCache(SUMMARY_CACHE_DIR)
+
+    logging.info(f"Loading transcript from {transcription_file}")
+    if not transcription_file:
+        raise Exception("Please provide a file path to the transcription file in the -f argument")
+    logging.info(f"Slicing transcript")
+    sliced_transcript = slice_transcript_file(
+        transcription_file,
+        max_tokens=MAX_TOKENS_PER_SLICE,
+        overlap_tokens=SLICE_OVERLAP_TOKENS,
+        by_speaker_turn=SLICE_BY_SPEAKER_TURN
+    )
+    summaries = create_summaries_from_sliced_transcript(
+        sliced_transcript, 
+        SLICE_SYSTEM_DIRECTIVE, 
+        SLICE_PROMPT,
+        max_workers=SUMMARY_WORKERS,
+        rate_limiter=rate_limiter,
+        max_retries=MAX_RETRIES,
+        summary_cache=summary_cache
+    )
 
-    finished_summary = summarize_all_summaries(summaries, SUMMARY_SYSTEM_DIRECTIVE, SUMMARY_PROMPT)
+    if SUMMARY_MAX_TOKENS:
+        finished_summary = reduce_summaries(
+            summaries,
+            SUMMARY_SYSTEM_DIRECTIVE,
+            SUMMARY_PROMPT,
+            SUMMARY_MAX_TOKENS,
+            fan_in=SUMMARY_FAN_IN,
+            max_depth=SUMMARY_MAX_DEPTH,
+            max_workers=SUMMARY_WORKERS,
+            rate_limiter=rate_limiter,
+            max_retries=MAX_RETRIES,
+            summary_cache=summary_cache
+        )
+    else:
+        finished_summary = summarize_all_summaries(
+            summaries,
+            SUMMARY_SYSTEM_DIRECTIVE,
+            SUMMARY_PROMPT,
+            rate_limiter=rate_limiter,
+            max_retries=MAX_RETRIES,
+            summary_cache=summary_cache
+        )
 
     with open(output_file, 'w') as f:
         logging.info(f"Writing summary to {output_file}")
-        f.write(finished_summary)
\ No newline at end of file
+        f.write(finished_summary)
+
+    if args.trace:
+        get_tracer().write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
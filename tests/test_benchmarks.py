@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, main
+
+from benchmarks.pipeline import STAGES, SyntheticTranscribe, compare_to_baseline, main as benchmark_main, run_benchmarks
+
+PIPELINE_STAGES = [stage for stage in STAGES if stage != "slice_transcript_file"]
+
+class TestBenchmarks(TestCase):
+    def test_synthetic_transcribe(self):
+        service = SyntheticTranscribe(1001, num_speakers=4, duplicate_rate=0.5)
+        tracks = [service.transcribe(path).segments for path in service.file_paths()]
+        self.assertEqual(sum(len(segments) for segments in tracks), 1001)
+        for segments in tracks:
+            start_times = [segment.start_time for segment in segments]
+            self.assertEqual(start_times, sorted(start_times))
+            self.assertTrue(any(a.text == b.text for a, b in zip(segments, segments[1:])))
+        # The same settings always generate the same transcript
+        self.assertEqual(SyntheticTranscribe(1001).transcribe("speaker-2.wav"), SyntheticTranscribe(1001).transcribe("speaker-2.wav"))
+
+    def test_run_benchmarks(self):
+        for columnar in (False, True):
+            run = run_benchmarks(sizes=[200, 400], repeat=1, columnar=columnar, stages=PIPELINE_STAGES)
+            self.assertEqual(run["meta"]["columnar"], columnar)
+            self.assertEqual(
+                [(result["stage"], result["segments"]) for result in run["results"]],
+                [(stage, size) for size in (200, 400) for stage in PIPELINE_STAGES]
+            )
+            for result in run["results"]:
+                self.assertGreaterEqual(result["seconds"], 0)
+                self.assertIsNotNone(result["peak_bytes"])
+
+    def test_compare_to_baseline(self):
+        baseline = {"results": [
+            {"stage": "sort_segments", "segments": 10, "seconds": 1.0, "peak_bytes": 100},
+            {"stage": "add_speaker_to_segments", "segments": 10, "seconds": 1.0, "peak_bytes": 100},
+            {"stage": "slice_transcript_file", "segments": 10, "skipped": "no tokenizer"},
+        ]}
+        run = {"results": [
+            {"stage": "sort_segments", "segments": 10, "seconds": 1.1, "peak_bytes": 100},
+            {"stage": "add_speaker_to_segments", "segments": 10, "seconds": 0.5, "peak_bytes": 200},
+            {"stage": "slice_transcript_file", "segments": 10, "seconds": 1.0, "peak_bytes": 100},
+            {"stage": "sort_segments", "segments": 20, "seconds": 1.0, "peak_bytes": 100},
+        ]}
+        comparisons = compare_to_baseline(run, baseline, tolerance=0.25)
+        self.assertEqual(
+            [(c["stage"], c["segments"], c["regressed"]) for c in comparisons],
+            [("sort_segments", 10, False), ("add_speaker_to_segments", 10, True)]
+        )
+
+    def test_main_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            baseline_path = os.path.join(tmp_dir, "baseline.json")
+            args = ["--sizes", "100", "--repeat", "1", "--no-memory", "--stages", "sort_segments", "--baseline", baseline_path]
+            self.assertEqual(benchmark_main(args + ["--save-baseline"]), 0)
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            self.assertEqual(benchmark_main(args + ["--tolerance", "1000000"]), 0)
+            baseline["results"][0]["seconds"] = 1e-12
+            with open(baseline_path, "w") as f:
+                json.dump(baseline, f)
+            self.assertEqual(benchmark_main(args), 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import numpy as np
+
+from transcriptly.cache import AudioCache, DiskCache, TranscriptionCache, hash_file
+from transcriptly.data_types import Segment, TranscriptionResult
+from transcriptly.transcribe_services.whisper_service import WhisperTranscribe
+
+WHISPER_PARAMS = {
+    "service": "whisper",
+    "model_name": "tiny",
+    "no_speech_threshold": 0.275,
+    "logprob_threshold": None,
+    "condition_on_previous_text": False,
+}
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get_and_put(self):
+        cache = DiskCache(self.cache_dir)
+        self.assertIsNone(cache.get("abc"))
+        cache.put("abc", {"value": 1})
+        self.assertEqual(cache.get("abc"), {"value": 1})
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_evicts_least_recently_used(self):
+        # Test that entries are evicted oldest-first once the cache is over its size cap
+        cache = DiskCache(self.cache_dir)
+        cache.put("first", "x" * 100)
+        cache.put("second", "x" * 100)
+        entry_size = os.path.getsize(cache.path_for("first"))
+        os.utime(cache.path_for("first"), (1, 1))
+        os.utime(cache.path_for("second"), (2, 2))
+        cache.get("first")
+        cache.max_bytes = entry_size * 2
+        cache.put("third", "x" * 100)
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+    def test_discards_unreadable_entry(self):
+        cache = DiskCache(self.cache_dir)
+        with open(cache.path_for("broken"), "wb") as f:
+            f.write(b"not a pickle")
+        self.assertIsNone(cache.get("broken"))
+        self.assertFalse(os.path.exists(cache.path_for("broken")))
+
+class TestTranscriptionCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = TranscriptionCache(os.path.join(self.tmp_dir.name, "cache"))
+        self.audio_path = os.path.join(self.tmp_dir.name, "audio.wav")
+        with open(self.audio_path, "wb") as f:
+            f.write(b"audio bytes")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        result = TranscriptionResult(self.audio_path, [Segment("Hello", 0, 1)], "Hello")
+        self.cache.put_result(self.audio_path, WHISPER_PARAMS, result)
+        cached = self.cache.get_result(self.audio_path, WHISPER_PARAMS)
+        self.assertEqual(cached, result)
+
+    def test_key_depends_on_audio_and_params(self):
+        key = TranscriptionCache.key_for(self.audio_path, WHISPER_PARAMS)
+        self.assertNotEqual(key, TranscriptionCache.key_for(self.audio_path, {**WHISPER_PARAMS, "model_name": "small"}))
+        self.assertNotEqual(key, TranscriptionCache.key_for(self.audio_path, {**WHISPER_PARAMS, "no_speech_threshold": 0.5}))
+        with open(self.audio_path, "wb") as f:
+            f.write(b"other audio bytes")
+        self.assertNotEqual(key, TranscriptionCache.key_for(self.audio_path, WHISPER_PARAMS))
+
+    def test_key_ignores_file_path(self):
+        # Test that the same audio at a different path is a cache hit
+        copy_path = os.path.join(self.tmp_dir.name, "copy.wav")
+        with open(copy_path, "wb") as f:
+            f.write(b"audio bytes")
+        result = TranscriptionResult(self.audio_path, [Segment("Hello", 0, 1)], "Hello")
+        self.cache.put_result(self.audio_path, WHISPER_PARAMS, result)
+        cached = self.cache.get_result(copy_path, WHISPER_PARAMS)
+        self.assertEqual(cached.audio_file_path, copy_path)
+        self.assertEqual(cached.segments, result.segments)
+
+class TestHashFile(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = os.path.join(self.tmp_dir.name, "audio.wav")
+        with open(self.audio_path, "wb") as f:
+            f.write(b"audio bytes")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_is_read_once_for_every_cache(self):
+        with patch("transcriptly.cache.open", wraps=open, create=True) as mock_open:
+            file_hash = hash_file(self.audio_path)
+            AudioCache.key_for(self.audio_path)
+            TranscriptionCache.key_for(self.audio_path, WHISPER_PARAMS)
+            self.assertEqual(hash_file(self.audio_path), file_hash)
+        self.assertEqual(mock_open.call_count, 1)
+
+    def test_changed_file_is_hashed_again(self):
+        file_hash = hash_file(self.audio_path)
+        with open(self.audio_path, "wb") as f:
+            f.write(b"other audio bytes")
+        self.assertNotEqual(hash_file(self.audio_path), file_hash)
+        # Same size, only the modification time tells them apart
+        with open(self.audio_path, "wb") as f:
+            f.write(b"audio bytes")
+        os.utime(self.audio_path, ns=(0, 1_000_000_000))
+        self.assertEqual(hash_file(self.audio_path), file_hash)
+
+class TestAudioCache(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "audio_cache")
+        self.audio_path = os.path.join(self.tmp_dir.name, "audio.wav")
+        with open(self.audio_path, "wb") as f:
+            f.write(b"audio bytes")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip_is_memory_mapped(self):
+        cache = AudioCache(self.cache_dir)
+        audio = np.linspace(-1, 1, 16000, dtype=np.float32)
+        self.assertIsNone(cache.get_audio(self.audio_path))
+        cache.put_audio(self.audio_path, audio)
+        cached = cache.get_audio(self.audio_path)
+        self.assertIsInstance(cached, np.memmap)
+        self.assertEqual(cached.dtype, np.float32)
+        np.testing.assert_array_equal(cached, audio)
+        # Writes to the mapped array never reach the cache file
+        cached[0] = 5
+        np.testing.assert_array_equal(cache.get_audio(self.audio_path), audio)
+
+    def test_discards_unreadable_entry(self):
+        cache = AudioCache(self.cache_dir)
+        path = cache.path_for(AudioCache.key_for(self.audio_path))
+        with open(path, "wb") as f:
+            f.write(b"not an array")
+        self.assertIsNone(cache.get_audio(self.audio_path))
+        self.assertFalse(os.path.exists(path))
+
+    @patch("transcriptly.transcribe_services.whisper_service.get_model")
+    @patch("whisper.audio.load_audio")
+    def test_whisper_transcribe_decodes_once(self, mock_load_audio, mock_get_model):
+        # Test that a repeat run passes the cached samples to the model instead of the file path
+        audio = np.zeros(16000, dtype=np.float32)
+        mock_load_audio.return_value = audio
+        model = mock_get_model.return_value
+        model.transcribe.return_value = {"segments": [], "text": ""}
+        service = WhisperTranscribe("tiny", audio_cache_dir=self.cache_dir)
+        service.transcribe(self.audio_path)
+        service.transcribe(self.audio_path)
+        mock_load_audio.assert_called_once_with(self.audio_path)
+        self.assertEqual(model.transcribe.call_count, 2)
+        self.assertIsInstance(model.transcribe.call_args.args[0], np.memmap)
+
+if __name__ == '__main__':
+    main()
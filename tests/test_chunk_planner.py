@@ -0,0 +1,112 @@
+from unittest import TestCase, main
+import random
+
+from transcriptly.chunk_planner import StreamingChunker, batch_by_tokens, group_speaker_turns, plan_chunks, speaker_of_line
+
+
+def transcript_line(start_time, speaker, text):
+    return f'[{start_time:9.2f}]{speaker:>16}: {text}\n'
+
+class TestChunkPlanner(TestCase):
+    def test_speaker_of_line(self):
+        self.assertEqual(speaker_of_line(transcript_line(12.5, "John", "Hello there")), "John")
+        self.assertIsNone(speaker_of_line("not a transcript line"))
+
+    def test_group_speaker_turns(self):
+        lines = [
+            transcript_line(0, "John", "one"),
+            transcript_line(1, "John", "two"),
+            transcript_line(2, "Jane", "three"),
+            transcript_line(3, "John", "four"),
+        ]
+        self.assertEqual(group_speaker_turns(lines), [[0, 1], [2], [3]])
+
+    def test_packs_lines_into_budget(self):
+        lines = ["a", "b", "c", "d", "e"]
+        chunks = plan_chunks(lines, [3, 3, 3, 3, 3], max_tokens=7)
+        self.assertEqual(chunks, [["a", "b"], ["c", "d"], ["e"]])
+
+    def test_fills_budget_with_uneven_lines(self):
+        # Test that short lines are packed together instead of cut at a fixed count
+        lines = ["long", "s1", "s2", "s3", "s4", "long2"]
+        chunks = plan_chunks(lines, [8, 1, 1, 1, 1, 9], max_tokens=10)
+        self.assertEqual(chunks, [["long", "s1", "s2"], ["s3", "s4"], ["long2"]])
+
+    def test_line_over_budget_gets_own_slice(self):
+        chunks = plan_chunks(["a", "huge", "b"], [1, 20, 1], max_tokens=5)
+        self.assertEqual(chunks, [["a"], ["huge"], ["b"]])
+
+    def test_overlap_repeats_trailing_lines(self):
+        lines = ["a", "b", "c", "d", "e"]
+        chunks = plan_chunks(lines, [2, 2, 2, 2, 2], max_tokens=6, overlap_tokens=2)
+        self.assertEqual(chunks, [["a", "b", "c"], ["c", "d", "e"]])
+
+    def test_overlap_never_stalls(self):
+        # Test that a line too big to share a slice with the overlap still makes progress
+        lines = ["a", "b", "big", "c"]
+        chunks = plan_chunks(lines, [2, 2, 6, 2], max_tokens=6, overlap_tokens=4)
+        self.assertEqual(chunks, [["a", "b"], ["big"], ["c"]])
+
+    def test_by_speaker_turn_keeps_turns_together(self):
+        lines = [
+            transcript_line(0, "John", "one"),
+            transcript_line(1, "Jane", "two"),
+            transcript_line(2, "Jane", "three"),
+            transcript_line(3, "John", "four"),
+        ]
+        chunks = plan_chunks(lines, [2, 2, 2, 2], max_tokens=5, by_speaker_turn=True)
+        self.assertEqual(chunks, [[lines[0]], lines[1:3], [lines[3]]])
+
+    def test_by_speaker_turn_splits_turn_over_budget(self):
+        lines = [transcript_line(i, "John", str(i)) for i in range(4)]
+        chunks = plan_chunks(lines, [2, 2, 2, 2], max_tokens=4, by_speaker_turn=True)
+        self.assertEqual(chunks, [lines[0:2], lines[2:4]])
+
+    def test_invalid_budget(self):
+        with self.assertRaises(RuntimeError):
+            plan_chunks(["a"], [1], max_tokens=0)
+        with self.assertRaises(RuntimeError):
+            plan_chunks(["a"], [1], max_tokens=5, overlap_tokens=5)
+
+    def test_streaming_chunker_emits_slices_as_they_fill(self):
+        chunker = StreamingChunker(max_tokens=7)
+        self.assertEqual(chunker.add("a", 3), [])
+        self.assertEqual(chunker.add("b", 3), [])
+        self.assertEqual(chunker.add("c", 3), [["a", "b"]])
+        self.assertEqual(chunker.flush(), [["c"]])
+        self.assertEqual(chunker.flush(), [])
+
+    def test_streaming_chunker_matches_plan_chunks(self):
+        rng = random.Random(7)
+        speakers = ["John", "Jane", "Bob"]
+        for _ in range(200):
+            count = rng.randint(0, 30)
+            lines = [transcript_line(i, rng.choice(speakers), f"line {i}") for i in range(count)]
+            token_counts = [rng.randint(1, 12) for _ in range(count)]
+            max_tokens = rng.randint(1, 30)
+            overlap_tokens = rng.randint(0, max_tokens - 1)
+            by_speaker_turn = rng.random() < 0.5
+            chunker = StreamingChunker(max_tokens, overlap_tokens, by_speaker_turn)
+            chunks = []
+            for line, tokens in zip(lines, token_counts):
+                chunks.extend(chunker.add(line, tokens))
+            chunks.extend(chunker.flush())
+            self.assertEqual(chunks, plan_chunks(lines, token_counts, max_tokens, overlap_tokens, by_speaker_turn))
+
+    def test_batch_by_tokens(self):
+        self.assertEqual(batch_by_tokens([3, 3, 3, 3, 3], max_tokens=7), [[0, 1], [2, 3], [4]])
+
+    def test_batch_by_tokens_fan_in(self):
+        self.assertEqual(batch_by_tokens([1] * 7, max_tokens=100, max_items=3), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_batch_by_tokens_never_exceeds_budget(self):
+        # Test that items over the budget get batches of their own instead of being paired
+        self.assertEqual(batch_by_tokens([10, 10, 10], max_tokens=5), [[0], [1], [2]])
+        self.assertEqual(batch_by_tokens([2, 10, 2, 2], max_tokens=5), [[0], [1], [2, 3]])
+
+    def test_batch_by_tokens_invalid_fan_in(self):
+        with self.assertRaises(RuntimeError):
+            batch_by_tokens([1, 1], max_tokens=5, max_items=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, main
+
+from transcriptly import cli
+from transcriptly.data_types import AudioInput, Segment
+from transcriptly.job_manifest import JobManifest
+from transcriptly.transcript_writer import JSONL, read_segments, write_segments
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "whisper", "tiktoken", "openai")
+# Seconds a cold start of the command may take, raise it on slow machines
+STARTUP_BUDGET = float(os.environ.get("TRANSCRIPTLY_STARTUP_BUDGET", 1.5))
+
+def run_cold(argv):
+    """
+    Runs the transcriptly command in a fresh interpreter and returns how
+    long it took and which heavy modules it imported.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "from transcriptly import cli\n"
+        "try:\n"
+        f"    cli.main({argv!r})\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print('\\n' + __import__('json').dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+class TestCli(TestCase):
+    def test_help_commands_start_fast_without_heavy_imports(self):
+        for argv in (["--help"], ["transcribe", "--help"], ["merge", "--help"], ["summarize", "--help"], ["search", "--help"]):
+            elapsed, heavy_modules = run_cold(argv)
+            self.assertEqual(heavy_modules, [], argv)
+            self.assertLess(elapsed, STARTUP_BUDGET, argv)
+
+    def test_unknown_command(self):
+        with self.assertRaises(SystemExit):
+            cli.main(["translate"])
+
+    def test_merge_transcripts(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            john, jane = os.path.join(tmp_dir, "John.jsonl"), os.path.join(tmp_dir, "Jane.jsonl")
+            write_segments([Segment(" one", 1, 2), Segment(" three", 3, 4)], john, JSONL)
+            write_segments([Segment(" two", 2, 3, "Jane Doe")], jane, JSONL)
+            output = os.path.join(tmp_dir, "merged.jsonl")
+            cli.main(["merge", john, jane, "--output", output, "--format", JSONL, "--speakers-from-file-names"])
+            self.assertEqual(
+                [(s.text, s.speaker) for s in read_segments(output)],
+                [(" one", "John"), (" two", "Jane Doe"), (" three", "John")]
+            )
+
+    def test_merge_job(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            job_dir = os.path.join(tmp_dir, "job")
+            john, jane = AudioInput("john.wav", "John"), AudioInput("jane.wav", "Jane")
+            manifest = JobManifest.create(job_dir, [john, jane])
+            manifest.mark_done(john, [Segment(" hi", 1, 2, "John")])
+            output = os.path.join(tmp_dir, "merged.txt")
+            # Only the finished track is merged
+            cli.main(["merge", "--job-dir", job_dir, "--output", output])
+            self.assertEqual([s.text for s in read_segments(output)], [" hi"])
+
+if __name__ == '__main__':
+    main()
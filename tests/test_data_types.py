@@ -0,0 +1,52 @@
+from unittest import TestCase, main
+from transcriptly.data_types import Segment, SegmentTable
+
+class TestSegmentTable(TestCase):
+    def test_round_trip(self):
+        segments = [
+            Segment("Hello", 0, 1, "John"),
+            Segment(" wörld", 1, 2.5, "Jane"),
+            Segment("", 2.5, 3),
+            Segment("again", 3, 4, "John"),
+        ]
+        table = SegmentTable.from_segments(segments)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.speakers, ["John", "Jane"])
+        self.assertEqual(table.speaker_ids.tolist(), [0, 1, -1, 0])
+        self.assertEqual(table.to_segments(), segments)
+        self.assertEqual(table[1], segments[1])
+        self.assertEqual(table[-1], segments[-1])
+
+    def test_empty(self):
+        table = SegmentTable.from_segments([])
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.to_segments(), [])
+        self.assertEqual(len(SegmentTable.merge([table, SegmentTable.empty()])), 0)
+
+    def test_sort_is_stable(self):
+        table = SegmentTable.from_segments([
+            Segment("b", 2, 3), Segment("a1", 1, 2), Segment("a2", 1, 2),
+        ])
+        self.assertEqual([s.text for s in table.sort()], ["a1", "a2", "b"])
+
+    def test_merge(self):
+        john = SegmentTable.from_segments([Segment("one", 1, 2), Segment("three", 3, 4)]).with_speaker("John")
+        jane = SegmentTable.from_segments([Segment("two", 2, 3), Segment("four", 4, 5)]).with_speaker("Jane")
+        merged = SegmentTable.merge([john, jane])
+        self.assertEqual([s.text for s in merged], ["one", "two", "three", "four"])
+        self.assertEqual([s.speaker for s in merged], ["John", "Jane", "John", "Jane"])
+        self.assertEqual(merged.speakers, ["John", "Jane"])
+
+    def test_concat_merges_speaker_tables(self):
+        first = SegmentTable.from_segments([Segment("a", 0, 1, "John"), Segment("b", 1, 2)])
+        second = SegmentTable.from_segments([Segment("c", 2, 3, "Jane"), Segment("d", 3, 4, "John")])
+        table = SegmentTable.concat([first, second])
+        self.assertEqual([s.speaker for s in table], ["John", None, "Jane", "John"])
+        self.assertEqual(table.speakers, ["John", "Jane"])
+
+    def test_with_speaker(self):
+        table = SegmentTable.from_segments([Segment("a", 0, 1, "John"), Segment("b", 1, 2)])
+        self.assertEqual([s.speaker for s in table.with_speaker("Jane")], ["Jane", "Jane"])
+
+if __name__ == '__main__':
+    main()
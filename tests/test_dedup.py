@@ -0,0 +1,110 @@
+from unittest import TestCase, main
+
+import numpy as np
+
+from transcriptly.data_types import Segment, SegmentTable
+from transcriptly.dedup import find_cross_track_bleed, find_repeats, normalize_text, remove_repeated_segments, remove_repeated_segments_stream
+from transcriptly.transcribe import Transcribe
+
+def segments_from(texts):
+    return [Segment(text, i, i + 1) for i, text in enumerate(texts)]
+
+class TestDedup(TestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text(" Thank  you!"), "thank you")
+        self.assertEqual(normalize_text("Thank you."), "thank you")
+
+    def test_adjacent_repeats(self):
+        # The default window only looks at the segment right before
+        texts = ["Hello", " hello.", "world", "Hello", "world", "world"]
+        self.assertEqual(find_repeats(texts).tolist(), [False, True, False, False, False, True])
+
+    def test_window(self):
+        texts = ["one", "two", "one", "three", "four", "one"]
+        self.assertEqual(find_repeats(texts, window=2).tolist(), [False, False, True, False, False, False])
+        self.assertEqual(find_repeats(texts, window=4).tolist(), [False, False, True, False, False, True])
+
+    def test_similarity_catches_repetition_loop(self):
+        loop = [
+            " I think we should go.",
+            " I think we should go now.",
+            " I think we should go now!",
+            " So I think we should go now.",
+            " I think that we should go now.",
+        ]
+        texts = ["Let's start."] + loop + ["Agreed, see you tomorrow."]
+        self.assertEqual(find_repeats(texts, window=4).sum(), 1)
+        self.assertEqual(
+            find_repeats(texts, window=4, similarity=0.7).tolist(),
+            [False, False, True, True, True, True, False]
+        )
+
+    def test_empty(self):
+        self.assertEqual(find_repeats([], window=3).tolist(), [])
+        self.assertEqual(remove_repeated_segments([], window=3, similarity=0.5), ([], 0))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(RuntimeError):
+            find_repeats(["a"], window=0)
+        with self.assertRaises(RuntimeError):
+            find_repeats(["a"], similarity=1.5)
+        with self.assertRaises(RuntimeError):
+            Transcribe(service_name="whisper", model_name="tiny", dedup_window=0)
+
+    def test_remove_repeated_segments_builds_new_list(self):
+        segments = segments_from(["a", "a", "b", "b", "b", "c"])
+        kept, removed = remove_repeated_segments(segments)
+        self.assertEqual([s.text for s in kept], ["a", "b", "c"])
+        self.assertEqual(removed, 3)
+        self.assertEqual(len(segments), 6)
+
+    def test_remove_repeated_segments_stream_matches_batch(self):
+        texts = ["Hi.", "hi", "loop one two", "loop one two three", "bye", "Hi.", "loop one two"]
+        segments = [Segment(text, i, i + 1) for i, text in enumerate(texts)]
+        for window, similarity in [(1, None), (3, None), (3, 0.7)]:
+            kept, _ = remove_repeated_segments(segments, window, similarity)
+            self.assertEqual(list(remove_repeated_segments_stream(iter(segments), window, similarity)), kept)
+
+    def test_remove_repeated_segments_table(self):
+        table = SegmentTable.from_segments(segments_from(["a", "A.", "b", "a"]))
+        kept, removed = remove_repeated_segments(table, window=3)
+        self.assertIsInstance(kept, SegmentTable)
+        self.assertEqual(kept.texts(), ["a", "b"])
+        self.assertEqual(kept.start_times.tolist(), [0, 2])
+        self.assertEqual(removed, 2)
+
+    def test_long_loop_is_linear(self):
+        # 200k segments of a stuck loop are handled in one pass
+        segments = segments_from(["Thank you."] * 200_000)
+        kept, removed = remove_repeated_segments(segments, window=8)
+        self.assertEqual(len(kept), 1)
+        self.assertEqual(removed, 199_999)
+
+    def test_cross_track_bleed_drops_quieter_copy(self):
+        segments = [
+            Segment(" Let's ship it.", 10, 12),
+            Segment(" Sounds good.", 13, 14),
+            Segment(" let's ship it", 10.2, 12.1),
+            Segment(" Sounds good.", 40, 41),
+        ]
+        tracks = [0, 0, 1, 1]
+        # Track 1 heard "let's ship it" louder than track 0
+        loudness = np.array([-40.0, -10.0, -12.0, -11.0])
+        self.assertEqual(find_cross_track_bleed(segments, tracks, loudness).tolist(), [True, False, False, False])
+        # Without loudness the earlier segment is kept
+        self.assertEqual(find_cross_track_bleed(segments, tracks).tolist(), [False, False, True, False])
+
+    def test_cross_track_bleed_ignores_same_track(self):
+        segments = [Segment("yes", 1, 2), Segment("yes", 1.5, 2.5)]
+        self.assertEqual(find_cross_track_bleed(segments, [0, 0]).tolist(), [False, False])
+
+    def test_cross_track_bleed_similarity(self):
+        segments = [Segment(" we should ship it on friday", 5, 8), Segment(" so we should ship it on friday", 5.1, 8)]
+        self.assertEqual(find_cross_track_bleed(segments, ["John", "Jane"]).tolist(), [False, False])
+        bleed = find_cross_track_bleed(segments, ["John", "Jane"], np.array([-10.0, -30.0]), similarity=0.8)
+        self.assertEqual(bleed.tolist(), [False, True])
+        with self.assertRaises(RuntimeError):
+            find_cross_track_bleed(segments, ["John", "Jane"], similarity=0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import flask_server
+from transcriptly.data_types import Segment
+from transcriptly.job_manifest import DONE
+from transcriptly.job_queue import JobQueue
+
+def fake_transcribe(audio_input):
+    # Stands in for run_traced(_transcribe_in_worker, ...) in a pool worker
+    return [Segment("hello", 0, 1), Segment(" world", 1, 2)], []
+
+class TestFlaskServer(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        os.makedirs(os.path.join(tmp_dir.name, "uploads"))
+        os.makedirs(os.path.join(tmp_dir.name, "transcriptions"))
+        cwd = os.getcwd()
+        os.chdir(tmp_dir.name)
+        self.addCleanup(os.chdir, cwd)
+        self.client = flask_server.app.test_client()
+
+    def use_job_queue(self, fn=fake_transcribe, max_queued=10):
+        job_queue = JobQueue(ThreadPoolExecutor(1), fn, workers=1, max_queued=max_queued, on_done=flask_server.save_transcription)
+        self.addCleanup(job_queue.shutdown)
+        patcher = patch.object(flask_server, "_job_queue", job_queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return job_queue
+
+    def upload(self):
+        return self.client.post("/upload", data={"file": (io.BytesIO(b"audio"), "audio.wav")})
+
+    def wait_for_job(self, job_id, status):
+        for _ in range(500):
+            response = self.client.get(f"/jobs/{job_id}")
+            if response.get_json()["status"] == status:
+                return response.get_json()
+            threading.Event().wait(0.01)
+        self.fail(f"Job never reached {status}")
+
+    def test_upload_returns_job(self):
+        self.use_job_queue()
+        response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["job_id"]
+        job = self.wait_for_job(job_id, DONE)
+        self.assertEqual(job["result"]["text"], "hello world")
+        with open(job["result"]["transcription_path"]) as f:
+            self.assertEqual(f.read(), "hello world")
+        self.assertEqual(len(os.listdir("uploads")), 1)
+
+    def test_uploads_in_the_same_second_keep_their_files(self):
+        self.use_job_queue()
+        with patch.object(flask_server, "datetime_stamp", return_value="240101120000"):
+            job_ids = [self.upload().get_json()["job_id"] for _ in range(3)]
+        for job_id in job_ids:
+            self.wait_for_job(job_id, DONE)
+        self.assertEqual(len(os.listdir("uploads")), 3)
+        self.assertEqual(len(os.listdir("transcriptions")), 3)
+
+    def test_upload_to_full_queue(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+        def blocking_transcribe(audio_input):
+            started.release()
+            release.wait(5)
+            return fake_transcribe(audio_input)
+        self.use_job_queue(blocking_transcribe, max_queued=1)
+        self.addCleanup(release.set)
+        self.assertEqual(self.upload().status_code, 202)
+        started.acquire(timeout=5)
+        self.assertEqual(self.upload().status_code, 202)
+        response = self.upload()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("full", response.get_json()["error"])
+        # The rejected upload's file is not kept
+        self.assertEqual(len(os.listdir("uploads")), 2)
+
+    def test_unknown_job(self):
+        self.use_job_queue()
+        response = self.client.get("/jobs/missing")
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_json(self):
+        self.use_job_queue()
+        self.wait_for_job(self.upload().get_json()["job_id"], DONE)
+        metrics = self.client.get("/metrics").get_json()
+        self.assertEqual(metrics["jobs_submitted"], 1)
+        self.assertEqual(metrics["jobs_done"], 1)
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertIn("stages", metrics)
+
+    def test_metrics_prometheus(self):
+        self.use_job_queue()
+        response = self.client.get("/metrics?format=prometheus")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn("transcriptly_job_queue_queue_depth 0", lines)
+        self.assertIn("transcriptly_job_queue_workers 1", lines)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import urllib.request
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import numpy as np
+
+from transcriptly.data_types import AudioInput, Segment, TranscriptionResult
+from transcriptly.instrumentation import Tracer, get_tracer, run_traced, serve_metrics
+from transcriptly.transcribe import Transcribe
+from transcriptly.transcribe_services.whisper_service import WhisperTranscribe
+from transcriptly.vad import SAMPLE_RATE
+
+class FakeClock:
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+class TestTracer(TestCase):
+    def test_stage_records_wall_and_cpu_time(self):
+        tracer = Tracer(enabled=True, clock=FakeClock(2.0), cpu_clock=FakeClock(0.5))
+        with tracer.stage("inference", audio_seconds=10.0) as span:
+            span["segments"] = 3
+        [span] = tracer.spans
+        self.assertEqual(span["stage"], "inference")
+        self.assertEqual((span["wall_seconds"], span["cpu_seconds"]), (2.0, 0.5))
+        self.assertEqual(span["segments"], 3)
+        self.assertEqual(tracer.summary()["inference"]["real_time_factor"], 5.0)
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        with tracer.stage("inference") as span:
+            span["segments"] = 3
+        self.assertEqual(tracer.spans, [])
+        self.assertEqual(tracer.summary(), {})
+
+    def test_summary_totals(self):
+        tracer = Tracer(enabled=True, keep_spans=False, clock=FakeClock(1.0), cpu_clock=FakeClock(1.0))
+        for tokens in (10, 20):
+            with tracer.stage("openai_call", prompt_tokens=tokens, completion_tokens=None):
+                pass
+        self.assertEqual(tracer.spans, [])
+        totals = tracer.summary()["openai_call"]
+        self.assertEqual((totals["count"], totals["wall_seconds"], totals["prompt_tokens"]), (2, 2.0, 30))
+        self.assertNotIn("completion_tokens", totals)
+        self.assertNotIn("real_time_factor", totals)
+
+    def test_run_traced_returns_worker_spans(self):
+        tracer = get_tracer()
+        self.addCleanup(setattr, tracer, "enabled", tracer.enabled)
+        self.addCleanup(tracer.clear)
+        tracer.enabled = True
+
+        def work(x):
+            with tracer.stage("worker_stage"):
+                return x * 2
+
+        result, spans = run_traced(work, 21)
+        self.assertEqual(result, 42)
+        self.assertEqual([span["stage"] for span in spans], ["worker_stage"])
+        self.assertEqual(tracer.spans, [])
+        parent = Tracer(enabled=True)
+        parent.extend(spans)
+        self.assertEqual(parent.summary()["worker_stage"]["count"], 1)
+
+    def test_write_trace_and_prometheus(self):
+        tracer = Tracer(enabled=True, clock=FakeClock(1.0), cpu_clock=FakeClock(1.0))
+        with tracer.stage("inference", audio_seconds=4.0):
+            pass
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trace_file = os.path.join(tmp_dir, "trace.json")
+            tracer.write_trace(trace_file)
+            with open(trace_file) as f:
+                trace = json.load(f)
+        self.assertEqual(len(trace["spans"]), 1)
+        self.assertEqual(trace["stages"]["inference"]["real_time_factor"], 4.0)
+
+        text = tracer.to_prometheus()
+        self.assertIn("# TYPE transcriptly_stage_wall_seconds_total counter", text)
+        self.assertIn('transcriptly_stage_audio_seconds_total{stage="inference"} 4.0', text)
+        self.assertIn('transcriptly_stage_real_time_factor{stage="inference"} 4.0', text)
+
+        server = serve_metrics(0, tracer)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            self.assertEqual(response.read().decode("utf-8"), text)
+
+class TestPipelineInstrumentation(TestCase):
+    def setUp(self):
+        tracer = get_tracer()
+        self.addCleanup(setattr, tracer, "enabled", tracer.enabled)
+        self.addCleanup(tracer.clear)
+        tracer.clear()
+        tracer.enabled = True
+
+    @patch("transcriptly.transcribe_services.whisper_service.get_model")
+    @patch("whisper.audio.load_audio")
+    def test_whisper_stages(self, mock_load_audio, mock_get_model):
+        mock_load_audio.return_value = np.zeros(30 * SAMPLE_RATE, dtype=np.float32)
+        mock_get_model.return_value.transcribe.return_value = {
+            "segments": [{"text": "Hello", "start": 0.0, "end": 1.0}],
+            "text": "Hello",
+        }
+        WhisperTranscribe("tiny").transcribe("test.wav")
+        stages = get_tracer().summary()
+        self.assertEqual(stages["audio_decode"]["audio_seconds"], 30)
+        self.assertEqual(stages["inference"]["audio_seconds"], 30)
+        self.assertEqual(stages["inference"]["segments"], 1)
+        self.assertIn("real_time_factor", stages["inference"])
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_stages(self, mock):
+        mock.return_value.transcribe.return_value = TranscriptionResult(
+            segments=[Segment("Hello", 0, 1), Segment("Hello", 1, 2)]
+        )
+        transcribe = Transcribe(service_name="whisper", model_name="tiny", remove_duplicates=True)
+        segments = transcribe.transcribe_single_audio_file(AudioInput("test.wav", speaker="John"))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            transcribe.write_transcription_to_file(Transcribe.sort_segments([segments]), os.path.join(tmp_dir, "out.txt"))
+        stages = get_tracer().summary()
+        self.assertEqual(stages["dedup"]["segments"], 2)
+        self.assertEqual(stages["write"]["segments"], 1)
+
+if __name__ == '__main__':
+    main()
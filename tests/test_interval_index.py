@@ -0,0 +1,57 @@
+from unittest import TestCase, main
+
+from transcriptly.data_types import Segment
+from transcriptly.interval_index import IntervalIndex, parse_timestamp
+
+class TestIntervalIndex(TestCase):
+    def setUp(self):
+        # Out of order, with a long segment spanning several short ones
+        self.segments = [
+            Segment("c", 10, 12),
+            Segment("a", 0, 2),
+            Segment("long", 1, 25),
+            Segment("b", 5, 6),
+            Segment("d", 30, 31),
+        ]
+        self.index = IntervalIndex(self.segments)
+
+    def test_segments_are_sorted(self):
+        self.assertEqual([s.text for s in self.index.segments], ["a", "long", "b", "c", "d"])
+        self.assertEqual(self.index.order.tolist(), [1, 2, 3, 0, 4])
+        self.assertEqual(self.index.max_duration, 24)
+
+    def test_starting_between(self):
+        self.assertEqual([s.text for s in self.index.starting_between(1, 10)], ["long", "b"])
+        self.assertEqual(self.index.starting_between(12, 30), [])
+
+    def test_overlapping(self):
+        self.assertEqual([s.text for s in self.index.overlapping(11, 20)], ["long", "c"])
+        # Touching ends don't overlap
+        self.assertEqual([s.text for s in self.index.overlapping(25, 30)], [])
+        self.assertEqual([s.text for s in self.index.overlapping(0, 100)], ["a", "long", "b", "c", "d"])
+
+    def test_at(self):
+        self.assertEqual([s.text for s in self.index.at(5)], ["long", "b"])
+        self.assertEqual([s.text for s in self.index.at(30)], ["d"])
+        self.assertEqual(self.index.at(28), [])
+
+    def test_matches_scan(self):
+        segments = [Segment(str(i), (i * 7) % 50, (i * 7) % 50 + (i % 5)) for i in range(200)]
+        index = IntervalIndex(segments)
+        for start, end in [(0, 3), (10.5, 11), (20, 40), (49, 60)]:
+            expected = sorted(i for i, s in enumerate(segments) if s.start_time < end and s.end_time > start)
+            found = sorted(index.order[index.overlapping_indexes(start, end)].tolist())
+            self.assertEqual(found, expected)
+
+    def test_empty(self):
+        index = IntervalIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.overlapping(0, 10), [])
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("1:02:00"), 3720)
+        self.assertEqual(parse_timestamp("62:00"), 3720)
+        self.assertEqual(parse_timestamp("3.5"), 3.5)
+
+if __name__ == '__main__':
+    main()
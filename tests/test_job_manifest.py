@@ -0,0 +1,66 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from transcriptly.data_types import AudioInput, Segment
+from transcriptly.job_manifest import JobManifest, DONE, PENDING, RUNNING
+
+class TestJobManifest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.job_dir = os.path.join(self.tmp_dir.name, "job")
+        self.audio_inputs = [
+            AudioInput("john.wav", speaker="John"),
+            AudioInput("jane.wav", speaker="Jane"),
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_create_marks_all_pending(self):
+        manifest = JobManifest.create(self.job_dir, self.audio_inputs)
+        self.assertEqual(manifest.pending(self.audio_inputs), self.audio_inputs)
+        self.assertTrue(os.path.isfile(manifest.manifest_path))
+
+    def test_mark_done_persists_segments(self):
+        manifest = JobManifest.create(self.job_dir, self.audio_inputs)
+        manifest.mark_running(self.audio_inputs[0])
+        self.assertEqual(manifest.status(self.audio_inputs[0]), RUNNING)
+        segments = [Segment("Hello", 0, 1, "John")]
+        manifest.mark_done(self.audio_inputs[0], segments)
+
+        resumed = JobManifest.load(self.job_dir, self.audio_inputs)
+        self.assertEqual(resumed.status(self.audio_inputs[0]), DONE)
+        self.assertEqual(resumed.load_segments(self.audio_inputs[0]), segments)
+        self.assertEqual(resumed.pending(self.audio_inputs), [self.audio_inputs[1]])
+
+    def test_load_resets_running_tracks(self):
+        # Test that a track that was running when the job stopped is pending on resume
+        manifest = JobManifest.create(self.job_dir, self.audio_inputs)
+        manifest.mark_running(self.audio_inputs[1])
+        resumed = JobManifest.load(self.job_dir, self.audio_inputs)
+        self.assertEqual(resumed.status(self.audio_inputs[1]), PENDING)
+
+    def test_load_resets_done_track_with_missing_segments(self):
+        manifest = JobManifest.create(self.job_dir, self.audio_inputs)
+        manifest.mark_done(self.audio_inputs[0], [Segment("Hello", 0, 1, "John")])
+        track = manifest.tracks[JobManifest.track_id(self.audio_inputs[0])]
+        os.remove(os.path.join(self.job_dir, track["segments_file"]))
+        resumed = JobManifest.load(self.job_dir, self.audio_inputs)
+        self.assertEqual(resumed.status(self.audio_inputs[0]), PENDING)
+
+    def test_load_adds_new_inputs(self):
+        JobManifest.create(self.job_dir, self.audio_inputs[:1])
+        resumed = JobManifest.load(self.job_dir, self.audio_inputs)
+        self.assertEqual(resumed.status(self.audio_inputs[1]), PENDING)
+
+    def test_load_without_manifest_starts_new_job(self):
+        manifest = JobManifest.load(self.job_dir, self.audio_inputs)
+        self.assertEqual(manifest.pending(self.audio_inputs), self.audio_inputs)
+
+    def test_load_segments_of_unfinished_track_raises(self):
+        manifest = JobManifest.create(self.job_dir, self.audio_inputs)
+        with self.assertRaises(RuntimeError):
+            manifest.load_segments(self.audio_inputs[0])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import TestCase, main
+
+from transcriptly.job_manifest import DONE, PENDING, RUNNING
+from transcriptly.job_queue import FAILED, JobQueue
+
+class TestJobQueue(TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def blocking_fn(self, payload):
+        self.started.release()
+        self.release.wait(5)
+        if payload == "bad":
+            raise ValueError("bad audio")
+        return payload.upper()
+
+    def create_queue(self, workers=1, **kwargs):
+        job_queue = JobQueue(ThreadPoolExecutor(workers), self.blocking_fn, workers=workers, **kwargs)
+        self.addCleanup(job_queue.shutdown)
+        self.addCleanup(self.release.set)
+        return job_queue
+
+    def wait_for(self, job_queue, job, status):
+        for _ in range(500):
+            if job_queue.get(job.job_id).status == status:
+                return
+            threading.Event().wait(0.01)
+        self.fail(f"Job never reached {status}")
+
+    def test_submit_returns_before_job_runs(self):
+        job_queue = self.create_queue()
+        job = job_queue.submit("hello")
+        self.assertIn(job.status, (PENDING, RUNNING))
+        self.release.set()
+        self.wait_for(job_queue, job, DONE)
+        self.assertEqual(job_queue.get(job.job_id).result, "HELLO")
+
+    def test_queue_depth_and_busy_workers(self):
+        job_queue = self.create_queue(workers=2)
+        jobs = [job_queue.submit(str(i)) for i in range(5)]
+        self.started.acquire(timeout=5)
+        self.started.acquire(timeout=5)
+        stats = job_queue.stats()
+        self.assertEqual(stats["busy_workers"], 2)
+        self.assertEqual(stats["utilisation"], 1.0)
+        self.assertEqual(stats["queue_depth"], 3)
+        self.release.set()
+        for job in jobs:
+            self.wait_for(job_queue, job, DONE)
+        stats = job_queue.stats()
+        self.assertEqual((stats["busy_workers"], stats["queue_depth"], stats["jobs_done"]), (0, 0, 5))
+
+    def test_failed_job(self):
+        job_queue = self.create_queue()
+        job = job_queue.submit("bad")
+        self.release.set()
+        self.wait_for(job_queue, job, FAILED)
+        self.assertEqual(job_queue.get(job.job_id).error, "bad audio")
+        self.assertEqual(job_queue.stats()["jobs_failed"], 1)
+
+    def test_full_queue_runtime_error(self):
+        job_queue = self.create_queue(max_queued=1)
+        job_queue.submit("running")
+        self.started.acquire(timeout=5)
+        job_queue.submit("waiting")
+        with self.assertRaises(RuntimeError):
+            job_queue.submit("rejected")
+        self.assertEqual(job_queue.stats()["jobs_rejected"], 1)
+
+    def test_on_done_result(self):
+        job_queue = self.create_queue(on_done=lambda job, result: {"text": result})
+        job = job_queue.submit("hi")
+        self.release.set()
+        self.wait_for(job_queue, job, DONE)
+        self.assertEqual(job_queue.get(job.job_id).to_dict()["result"], {"text": "HI"})
+
+    def test_finished_jobs_are_forgotten(self):
+        job_queue = self.create_queue(max_finished=1)
+        self.release.set()
+        first = job_queue.submit("one")
+        self.wait_for(job_queue, first, DONE)
+        second = job_queue.submit("two")
+        self.wait_for(job_queue, second, DONE)
+        self.assertIsNone(job_queue.get(first.job_id))
+
+    def test_broken_executor_is_replaced(self):
+        # Test that a pool broken by a crashed worker is swapped for a new one
+        def fn(payload):
+            if payload == "crash":
+                raise BrokenProcessPool("worker died")
+            return payload.upper()
+        executor = ThreadPoolExecutor(1)
+        job_queue = JobQueue(executor, fn, workers=1, create_executor=lambda: ThreadPoolExecutor(1))
+        self.addCleanup(job_queue.shutdown)
+        crashed = job_queue.submit("crash")
+        self.wait_for(job_queue, crashed, FAILED)
+        self.assertIsNot(job_queue.executor, executor)
+        job = job_queue.submit("after")
+        self.wait_for(job_queue, job, DONE)
+        self.assertEqual(job_queue.get(job.job_id).result, "AFTER")
+
+    def test_executor_broken_before_submit_is_replaced(self):
+        class BrokenPool:
+            def submit(self, fn, *args):
+                raise BrokenProcessPool("worker died")
+            def shutdown(self, wait=True):
+                pass
+        job_queue = JobQueue(BrokenPool(), str.upper, workers=1, create_executor=lambda: ThreadPoolExecutor(1))
+        self.addCleanup(job_queue.shutdown)
+        job = job_queue.submit("hello")
+        self.wait_for(job_queue, job, DONE)
+        self.assertEqual(job_queue.get(job.job_id).result, "HELLO")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+from transcriptly.model_pool import ModelPool
+
+
+class FakeModel:
+    def __init__(self, name, device, size):
+        self.name = name
+        self.device = device
+        self.size = size
+
+def fake_loader(sizes):
+    def loader(model_name, device):
+        return FakeModel(model_name, device, sizes[model_name])
+    return loader
+
+class TestModelPool(TestCase):
+    def setUp(self):
+        sizes = {"tiny": 100, "small": 300, "medium": 700}
+        self.pool = ModelPool(
+            max_bytes=1000,
+            loader=fake_loader(sizes),
+            size_of=lambda model: model.size
+        )
+
+    def test_get_reuses_loaded_model(self):
+        # Test that a second request for the same model is served from the pool
+        first = self.pool.get("tiny", "cpu")
+        second = self.pool.get("tiny", "cpu")
+        self.assertIs(first, second)
+        self.assertEqual(self.pool.hits, 1)
+        self.assertEqual(self.pool.misses, 1)
+
+    def test_get_keys_by_device(self):
+        # Test that the same model on two devices is loaded twice
+        cpu_model = self.pool.get("tiny", "cpu")
+        cuda_model = self.pool.get("tiny", "cuda")
+        self.assertIsNot(cpu_model, cuda_model)
+        self.assertEqual(self.pool.misses, 2)
+        self.assertEqual(len(self.pool), 2)
+
+    def test_evicts_least_recently_used(self):
+        # Test that the least recently used model is evicted to stay under the cap
+        self.pool.get("tiny", "cpu")
+        self.pool.get("small", "cpu")
+        self.pool.get("tiny", "cpu")
+        self.pool.get("medium", "cpu")
+        self.assertNotIn(("small", "cpu"), self.pool)
+        self.assertIn(("tiny", "cpu"), self.pool)
+        self.assertIn(("medium", "cpu"), self.pool)
+        self.assertEqual(self.pool.total_bytes, 800)
+        self.assertEqual(self.pool.evictions, 1)
+
+    def test_keeps_model_larger_than_cap(self):
+        # Test that the requested model stays loaded even if it exceeds the cap on its own
+        self.pool.max_bytes = 50
+        self.pool.get("tiny", "cpu")
+        self.pool.get("small", "cpu")
+        self.assertEqual(len(self.pool), 1)
+        self.assertIn(("small", "cpu"), self.pool)
+
+    def test_stats(self):
+        self.pool.get("tiny", "cpu")
+        self.pool.get("tiny", "cpu")
+        self.assertEqual(self.pool.stats(), {
+            "models": 1,
+            "total_bytes": 100,
+            "hits": 1,
+            "misses": 1,
+            "evictions": 0,
+        })
+
+    @patch("transcriptly.model_pool.default_device")
+    def test_get_resolves_default_device(self, mock):
+        # Test that a model requested without a device shares the entry for the default device
+        mock.return_value = "cpu"
+        self.pool.get("tiny")
+        self.pool.get("tiny", "cpu")
+        self.assertEqual(self.pool.hits, 1)
+
+if __name__ == '__main__':
+    main()
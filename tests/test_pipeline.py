@@ -0,0 +1,70 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import numpy as np
+
+import summarize
+from transcriptly.data_types import AudioInput, Segment, TranscriptionResult
+from transcriptly.pipeline import stream_transcript_lines
+from transcriptly.transcribe import Transcribe
+from transcriptly.transcribe_services.transcribe_service import TranscribeService
+from transcriptly.transcript_writer import TranscriptWriter, format_text_line
+from transcriptly.vad import SAMPLE_RATE
+
+
+class TestPipeline(TestCase):
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_merges_tracks_and_writes_segments(self, mock):
+        # Test that the tracks' streams are merged in start time order and written as they go
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe_stream.side_effect = lambda file_path, *args: iter({
+            "john.wav": [Segment("one", 0, 1), Segment("three", 4, 5)],
+            "jane.wav": [Segment("two", 2, 3)],
+        }[file_path])
+        transcribe = Transcribe(service_name="whisper", model_name="tiny")
+        audio_inputs = [AudioInput("john.wav", "John"), AudioInput("jane.wav", "Jane")]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, "transcript.txt")
+            with TranscriptWriter(output_file) as writer:
+                lines = list(stream_transcript_lines(transcribe, audio_inputs, writer))
+            with open(output_file) as f:
+                self.assertEqual(f.read(), "".join(lines))
+        self.assertEqual(lines, [
+            format_text_line(Segment("one", 0, 1, "John")),
+            format_text_line(Segment("two", 2, 3, "Jane")),
+            format_text_line(Segment("three", 4, 5, "John")),
+        ])
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_summarizes_while_transcribing(self, mock):
+        # Test that slices are summarized before the last window is transcribed
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe_stream.side_effect = lambda *args: TranscribeService.transcribe_stream(whisper_instance, *args)
+        whisper_instance.load_audio.return_value = np.zeros(100 * SAMPLE_RATE, dtype=np.float32)
+        whisper_instance.transcribe_audio.side_effect = lambda audio: TranscriptionResult(
+            segments=[Segment("a", 2, 4), Segment("b", 6, 8)]
+        )
+        summarized_after_windows = []
+        def summarize_slice(tslice, *args):
+            summarized_after_windows.append(whisper_instance.transcribe_audio.call_count)
+            return f"{len(tslice)} lines"
+
+        transcribe = Transcribe(service_name="whisper", model_name="tiny", window_seconds=20, window_overlap=0)
+        with patch.object(summarize, "MAX_LINES_PER_TRANSCRIPT", 2), \
+                patch.object(summarize, "summarize_transcript_slice_with_retries", side_effect=summarize_slice):
+            summaries = summarize.create_summaries_from_stream(
+                stream_transcript_lines(transcribe, [AudioInput("test.wav")]), "directive", "prompt"
+            )
+        self.assertEqual(summaries, ["2 lines"] * 5)
+        self.assertEqual(whisper_instance.transcribe_audio.call_count, 5)
+        self.assertLess(summarized_after_windows[0], 5)
+
+    def test_no_audio_inputs(self):
+        transcribe = Transcribe(service_name="whisper", model_name="tiny")
+        with self.assertRaises(RuntimeError):
+            list(stream_transcript_lines(transcribe, []))
+
+if __name__ == '__main__':
+    main()
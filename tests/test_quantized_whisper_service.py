@@ -0,0 +1,75 @@
+import copy
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import torch
+
+from benchmarks.quantized import compare_logits, decode, random_whisper_model, run_benchmark, synthetic_mel
+from transcriptly.model_pool import ModelPool, model_size_in_bytes
+from transcriptly.transcribe import Transcribe
+from transcriptly.transcribe_services.quantized_whisper_service import QuantizedWhisperTranscribe
+from transcriptly.transcribe_services.whisper_service import WhisperTranscribe
+
+
+class TestQuantizedWhisperTranscribe(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = random_whisper_model(n_state=64, n_head=2, n_layer=2)
+        cls.mel = synthetic_mel(5)
+
+    def setUp(self):
+        # Both services load the random model from a pool of their own
+        self.pool = ModelPool()
+        for module in ("whisper_service", "quantized_whisper_service"):
+            patcher = patch(f"transcriptly.transcribe_services.{module}.get_model", self.pool.get)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("whisper.load_model", side_effect=lambda model_name, device: copy.deepcopy(self.model))
+        self.load_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parity_with_whisper_transcribe(self):
+        # Test that the int8 model decodes the same tokens as the float32 model
+        reference = WhisperTranscribe("tiny", device="cpu").whisper_model
+        quantized = QuantizedWhisperTranscribe("tiny").whisper_model
+        self.assertIsInstance(quantized.decoder.blocks[0].attn.query, torch.ao.nn.quantized.dynamic.Linear)
+        parity = compare_logits(reference, quantized, self.mel)
+        self.assertLess(parity["relative_error"], 0.01)
+        self.assertGreaterEqual(parity["top1_agreement"], 0.95)
+        self.assertEqual(decode(quantized, self.mel, 16), decode(reference, self.mel, 16))
+        self.assertLess(model_size_in_bytes(quantized), model_size_in_bytes(reference))
+
+    def test_model_is_shared_through_the_pool(self):
+        # Test that the quantized model is loaded once, under its own pool key
+        WhisperTranscribe("tiny", device="cpu").warm_up()
+        service = QuantizedWhisperTranscribe("tiny")
+        self.assertIs(service.whisper_model, service.whisper_model)
+        self.assertIn(("tiny-int8", "cpu"), self.pool)
+        self.assertEqual(len(self.pool), 2)
+        self.assertEqual(self.load_model.call_count, 2)
+
+    def test_cache_params_and_options(self):
+        service = QuantizedWhisperTranscribe("tiny")
+        self.assertEqual(service.cache_params()["service"], "whisper-int8")
+        self.assertNotEqual(service.cache_params(), WhisperTranscribe("tiny").cache_params())
+        self.assertIs(service.transcribe_options()["fp16"], False)
+
+    @patch("torch.set_num_threads")
+    @patch("transcriptly.transcribe.os.cpu_count", return_value=8)
+    def test_selected_by_service_name(self, mock_cpu_count, mock_set_num_threads):
+        # Test that whisper-int8 loads the quantized service with the cores split between workers
+        transcribe = Transcribe(service_name="whisper-int8", model_name="tiny")
+        self.assertIsInstance(transcribe.transcription_service, QuantizedWhisperTranscribe)
+        mock_set_num_threads.assert_called_once_with(8)
+        pooled = Transcribe(service_name="whisper-int8", model_name="tiny", workers=3)
+        self.assertEqual(pooled.worker_kwargs()["threads"], 2)
+        self.assertEqual(Transcribe(service_name="whisper-int8", model_name="tiny", threads=1).threads, 1)
+
+    def test_benchmark(self):
+        run = run_benchmark(self.model, "random", seconds=5, sample_len=8, repeat=1)
+        self.assertEqual(set(run["results"]), {"float32", "int8"})
+        self.assertLess(run["results"]["int8"]["model_bytes"], run["results"]["float32"]["model_bytes"])
+        self.assertEqual(run["parity"]["decoded_token_agreement"], 1.0)
+
+if __name__ == '__main__':
+    main()
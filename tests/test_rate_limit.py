@@ -0,0 +1,89 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+from transcriptly.rate_limit import TokenBucket, RateLimiter, backoff_delay, retry_with_backoff
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestTokenBucket(TestCase):
+    def test_acquire_within_capacity_does_not_wait(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, 1, clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            bucket.acquire()
+        self.assertEqual(clock.sleeps, [])
+
+    def test_acquire_waits_for_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(2, 0.5, clock=clock, sleep=clock.sleep)
+        bucket.acquire(2)
+        bucket.acquire(1)
+        self.assertEqual(clock.sleeps, [2.0])
+
+    def test_acquire_more_than_capacity_is_clamped(self):
+        clock = FakeClock()
+        bucket = TokenBucket(5, 1, clock=clock, sleep=clock.sleep)
+        bucket.acquire(50)
+        self.assertEqual(clock.sleeps, [])
+
+class TestRateLimiter(TestCase):
+    def test_limits_requests_and_tokens(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600, clock=clock, sleep=clock.sleep)
+        self.assertTrue(limiter.limits_tokens)
+        limiter.acquire(600)
+        limiter.acquire(60)
+        # 60 tokens at 10 tokens per second
+        self.assertEqual(clock.sleeps, [6.0])
+
+    def test_no_limits(self):
+        limiter = RateLimiter()
+        self.assertFalse(limiter.limits_tokens)
+        limiter.acquire(10 ** 6)
+
+class TestRetryWithBackoff(TestCase):
+    def test_backoff_delay_is_capped(self):
+        for attempt in range(20):
+            delay = backoff_delay(attempt, base_delay=1, max_delay=30)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30, 2 ** attempt))
+
+    @patch("transcriptly.rate_limit.random.uniform", side_effect=lambda low, high: high)
+    def test_retries_until_success(self, mock):
+        sleeps = []
+        calls = []
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ValueError("flaky")
+            return "done"
+        result = retry_with_backoff(flaky, max_retries=5, sleep=sleeps.append)
+        self.assertEqual(result, "done")
+        self.assertEqual(sleeps, [1, 2])
+
+    def test_raises_after_max_retries(self):
+        sleeps = []
+        def broken():
+            raise ValueError("broken")
+        with self.assertRaises(ValueError):
+            retry_with_backoff(broken, max_retries=3, sleep=sleeps.append)
+        self.assertEqual(len(sleeps), 3)
+
+    def test_does_not_retry_other_errors(self):
+        def broken():
+            raise KeyError("broken")
+        with self.assertRaises(KeyError):
+            retry_with_backoff(broken, retry_on=(ValueError,), sleep=lambda seconds: None)
+
+if __name__ == '__main__':
+    main()
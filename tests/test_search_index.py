@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from transcriptly.data_types import Segment
+from transcriptly.search_index import TranscriptIndex, find_transcripts, format_milliseconds, tokenize
+from transcriptly.transcript_writer import BINARY, JSONL, TEXT, write_segments
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.transcripts_dir = os.path.join(self.tmp_dir.name, "transcripts")
+        self.index_dir = os.path.join(self.tmp_dir.name, "index")
+        os.makedirs(self.transcripts_dir)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, segments, output_format=TEXT):
+        path = os.path.join(self.transcripts_dir, name)
+        write_segments(segments, path, output_format)
+        return path
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize(" Let’s ship it, OK?"), ["let's", "ship", "it", "ok"])
+
+    def test_search_across_formats(self):
+        standup = self.write("standup.txt", [
+            Segment(" Let's ship the release on Friday.", 1.5, 4, "John"),
+            Segment(" The release notes aren't done.", 65.25, 70, "Jane"),
+        ])
+        retro = self.write("retro.jsonl", [Segment(" Friday deploys are risky.", 3.2, 5.1, "Jane")], JSONL)
+        planning = self.write("planning.bin", [Segment(" We ship on Friday, release or not.", 7.0, 9.0)], BINARY)
+        index = TranscriptIndex(self.index_dir)
+        self.assertEqual(index.update([standup, retro, planning]), {"indexed": 3, "unchanged": 0, "removed": 0, "skipped": 0})
+
+        hits = index.search("release friday")
+        self.assertEqual(len(hits), 4)
+        # Segments with both words rank above segments with one
+        self.assertEqual({(os.path.basename(hit.session), hit.start_ms) for hit in hits[:2]}, {("standup.txt", 1500), ("planning.bin", 7000)})
+        hit = next(hit for hit in hits if hit.session == retro)
+        self.assertEqual((hit.speaker, hit.start_ms, hit.end_ms), ("Jane", 3200, 5100))
+        self.assertEqual(TranscriptIndex.read_text(hit), " Friday deploys are risky.")
+        self.assertIsNone(next(hit for hit in hits if hit.session == planning).speaker)
+
+        self.assertEqual([hit.start_ms for hit in index.search("release", speaker="Jane")], [65250])
+        self.assertEqual(index.search("release", speaker="Nobody"), [])
+        self.assertEqual(index.search("kubernetes"), [])
+        self.assertEqual(len(index.search("friday", limit=1)), 1)
+
+    def test_incremental_update(self):
+        standup = self.write("standup.txt", [Segment(" Ship it.", 1, 2, "John")])
+        retro = self.write("retro.txt", [Segment(" Ship nothing.", 1, 2, "Jane")])
+        index = TranscriptIndex(self.index_dir)
+        index.update([standup, retro])
+
+        # Reopened from disk, unchanged and touched files are not indexed again
+        os.utime(retro, ns=(time.time_ns(), time.time_ns() + 10**9))
+        index = TranscriptIndex(self.index_dir)
+        with patch.object(TranscriptIndex, "_index_transcripts") as mock:
+            self.assertEqual(index.update([standup, retro]), {"indexed": 0, "unchanged": 2, "removed": 0, "skipped": 0})
+            mock.assert_not_called()
+
+        # A changed file replaces its old postings, a deleted one is dropped
+        self.write("standup.txt", [Segment(" Hold the release.", 3, 4, "John")])
+        os.remove(retro)
+        self.assertEqual(index.update([standup]), {"indexed": 1, "unchanged": 0, "removed": 1, "skipped": 0})
+        self.assertEqual(index.search("ship"), [])
+        self.assertEqual([hit.start_ms for hit in index.search("release")], [3000])
+        # The first part no longer has live sessions and was removed
+        self.assertEqual(len(index.parts), 1)
+        self.assertEqual(len(TranscriptIndex(self.index_dir).search("release")), 1)
+
+    def test_unreadable_files_are_skipped(self):
+        # Test that a file that isn't a transcript doesn't stop the others being indexed
+        standup = self.write("standup.txt", [Segment(" Ship it.", 1, 2, "John")])
+        notes = os.path.join(self.transcripts_dir, "notes.txt")
+        with open(notes, "w") as f:
+            f.write("Plain text saved by the upload server\n")
+        index = TranscriptIndex(self.index_dir)
+        self.assertEqual(index.update([notes, standup]), {"indexed": 1, "unchanged": 0, "removed": 0, "skipped": 1})
+        self.assertEqual([hit.session for hit in index.search("ship")], [standup])
+
+        # A transcript that stops being readable is dropped from the index
+        with open(standup, "w") as f:
+            f.write("Not a transcript any more\n")
+        self.assertEqual(index.update([notes, standup]), {"indexed": 0, "unchanged": 0, "removed": 0, "skipped": 2})
+        self.assertEqual(index.search("ship"), [])
+        self.assertEqual(TranscriptIndex(self.index_dir).search("ship"), [])
+
+    def test_segments_with_line_breaks(self):
+        standup = self.write("standup.txt", [Segment(" Ship it.\nOn Friday.", 1, 2, "John"), Segment(" Agreed.", 3, 4, "Jane")])
+        index = TranscriptIndex(self.index_dir)
+        index.update([standup])
+        hit = index.search("friday")[0]
+        self.assertEqual(TranscriptIndex.read_text(hit), " Ship it.\nOn Friday.")
+        self.assertEqual(index.search("agreed")[0].speaker, "Jane")
+
+    def test_merge(self):
+        index = TranscriptIndex(self.index_dir)
+        paths = []
+        for i in range(4):
+            paths.append(self.write(f"session-{i}.txt", [Segment(f" Topic {i} and the budget.", i, i + 1, f"Speaker {i % 2}")]))
+            index.update(paths)
+        self.write("session-0.txt", [Segment(" Nothing about money.", 0, 1, "Speaker 0")])
+        index.update(paths)
+        before = [(hit.session, hit.speaker, hit.start_ms) for hit in index.search("budget topic")]
+        self.assertGreater(len(index.parts), 1)
+
+        index.merge()
+        self.assertEqual(len(index.parts), 1)
+        self.assertEqual([(hit.session, hit.speaker, hit.start_ms) for hit in index.search("budget topic")], before)
+        self.assertEqual(len(before), 3)
+        self.assertEqual(TranscriptIndex.read_text(index.search("money")[0]), " Nothing about money.")
+
+    def test_find_transcripts(self):
+        text = self.write("a.txt", [Segment(" a", 0, 1)])
+        binary = self.write("b.out", [Segment(" b", 0, 1)], BINARY)
+        with open(os.path.join(self.transcripts_dir, "notes.md"), "w") as f:
+            f.write("not a transcript")
+        self.assertEqual(sorted(find_transcripts([self.transcripts_dir])), sorted([text, binary]))
+
+    def test_format_milliseconds(self):
+        self.assertEqual(format_milliseconds(3723004), "1:02:03.004")
+
+if __name__ == '__main__':
+    main()
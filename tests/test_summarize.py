@@ -0,0 +1,288 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import openai
+
+import summarize
+from transcriptly.cache import SummaryCache
+from transcriptly.instrumentation import get_tracer
+from transcriptly.rate_limit import RateLimiter
+
+class FakeEncoding:
+    """
+    Stands in for the tiktoken encoding, which is downloaded on first use,
+    so the tests run offline. Every word is a token.
+    """
+    def encode(self, text):
+        return text.split()
+
+    encode_ordinary = encode
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class StubChatCompletionHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the OpenAI chat completions endpoint. Echoes the
+    user message back as the summary, or answers `reply` when it is set,
+    after failing the first `failures` requests with a server error.
+    """
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.messages.append(body["messages"])
+            fail = server.requests <= server.failures
+        if fail:
+            status, error_type = server.failure
+            self.send_json(status, {"error": {"message": "stub failure", "type": error_type}})
+            return
+        content = body["messages"][1]["content"]
+        # Answer later slices faster so that responses come back out of order
+        time.sleep(server.delays.get(content, 0))
+        self.send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": server.reply or f"summary of {content}"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServerTestCase(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatCompletionHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.failures = 0
+        self.server.failure = (500, "server_error")
+        self.server.delays = {}
+        self.server.messages = []
+        self.server.reply = None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_base, self.api_key = openai.api_base, openai.api_key
+        openai.api_base = f"http://127.0.0.1:{self.server.server_port}/v1"
+        openai.api_key = "stub-key"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        openai.api_base, openai.api_key = self.api_base, self.api_key
+
+class TestCreateSummaries(StubServerTestCase):
+    def user_content(self, tslice):
+        return summarize.build_slice_messages(tslice, "directive", "prompt")[1]["content"]
+
+    def test_concurrent_summaries_keep_slice_order(self):
+        sliced_transcript = [f"slice {i}" for i in range(8)]
+        self.server.delays = {self.user_content(tslice): 0.05 * (8 - i) for i, tslice in enumerate(sliced_transcript)}
+        summaries = summarize.create_summaries_from_sliced_transcript(
+            sliced_transcript, "directive", "prompt", max_workers=4
+        )
+        self.assertEqual(summaries, [f"summary of {self.user_content(tslice)}" for tslice in sliced_transcript])
+        self.assertEqual(self.server.requests, 8)
+
+    def test_stream_summaries_match_sliced_transcript(self):
+        lines = [f"line {i}\n" for i in range(7)]
+        with patch.object(summarize, "MAX_LINES_PER_TRANSCRIPT", 3):
+            summaries = summarize.create_summaries_from_stream(iter(lines), "directive", "prompt", max_workers=2)
+        sliced_transcript = [lines[0:3], lines[3:6], lines[6:7]]
+        self.assertEqual(summaries, [f"summary of {self.user_content(tslice)}" for tslice in sliced_transcript])
+
+    def test_traces_openai_token_counts(self):
+        tracer = get_tracer()
+        self.addCleanup(setattr, tracer, "enabled", tracer.enabled)
+        self.addCleanup(tracer.clear)
+        tracer.enabled = True
+        summarize.create_summaries_from_sliced_transcript(["slice 0", "slice 1"], "directive", "prompt")
+        stages = tracer.summary()
+        self.assertEqual(stages["openai_call"]["count"], 2)
+        self.assertEqual(stages["openai_call"]["total_tokens"], 4)
+        self.assertEqual(stages["summarize_slices"]["count"], 1)
+
+    @patch("transcriptly.rate_limit.random.uniform", return_value=0)
+    def test_retries_server_errors(self, mock):
+        self.server.failures = 2
+        summaries = summarize.create_summaries_from_sliced_transcript(
+            ["slice 0"], "directive", "prompt", max_retries=3
+        )
+        self.assertEqual(summaries, [f"summary of {self.user_content('slice 0')}"])
+        self.assertEqual(self.server.requests, 3)
+
+    @patch("transcriptly.rate_limit.random.uniform", return_value=0)
+    def test_gives_up_after_max_retries(self, mock):
+        self.server.failures = 10
+        with self.assertRaises(openai.error.OpenAIError):
+            summarize.create_summaries_from_sliced_transcript(
+                ["slice 0"], "directive", "prompt", max_retries=2
+            )
+        self.assertEqual(self.server.requests, 3)
+
+    @patch("transcriptly.rate_limit.random.uniform", return_value=0)
+    def test_does_not_retry_client_errors(self, mock):
+        for status, error_type, error in [
+            (400, "invalid_request_error", openai.error.InvalidRequestError),
+            (401, "invalid_api_key", openai.error.AuthenticationError),
+        ]:
+            self.server.requests = 0
+            self.server.failures = 10
+            self.server.failure = (status, error_type)
+            with self.assertRaises(error):
+                summarize.create_summaries_from_sliced_transcript(["slice 0"], "directive", "prompt", max_retries=3)
+            self.assertEqual(self.server.requests, 1)
+
+    def test_rate_limiter_is_applied_per_request(self):
+        sliced_transcript = [f"slice {i}" for i in range(3)]
+        rate_limiter = RateLimiter(requests_per_minute=60)
+        with patch.object(rate_limiter, "acquire", wraps=rate_limiter.acquire) as acquire:
+            summarize.create_summaries_from_sliced_transcript(
+                sliced_transcript, "directive", "prompt", max_workers=3, rate_limiter=rate_limiter
+            )
+        self.assertEqual(acquire.call_count, 3)
+
+class TestSummaryCache(StubServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.summary_cache = SummaryCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmp_dir.cleanup()
+
+    def test_only_changed_slices_are_summarized(self):
+        sliced_transcript = [f"slice {i}" for i in range(4)]
+        first = summarize.create_summaries_from_sliced_transcript(
+            sliced_transcript, "directive", "prompt", summary_cache=self.summary_cache
+        )
+        self.assertEqual(self.server.requests, 4)
+
+        sliced_transcript[2] = "slice 2 changed"
+        sliced_transcript.append("slice 4")
+        second = summarize.create_summaries_from_sliced_transcript(
+            sliced_transcript, "directive", "prompt", summary_cache=self.summary_cache
+        )
+        self.assertEqual(self.server.requests, 6)
+        self.assertEqual(second[:2], first[:2])
+        self.assertEqual(second[3], first[3])
+        self.assertEqual(self.summary_cache.hits, 3)
+        self.assertEqual(self.summary_cache.misses, 6)
+
+    def test_directive_change_misses(self):
+        summarize.create_summaries_from_sliced_transcript(
+            ["slice 0"], "directive", "prompt", summary_cache=self.summary_cache
+        )
+        summarize.create_summaries_from_sliced_transcript(
+            ["slice 0"], "other directive", "prompt", summary_cache=self.summary_cache
+        )
+        self.assertEqual(self.server.requests, 2)
+
+@patch.object(summarize, "get_encoding", return_value=FakeEncoding())
+class TestReduceSummaries(StubServerTestCase):
+    def test_reduces_in_levels(self, mock):
+        # 8 summaries with a fan-in of 2 take 4 + 2 batch calls and the final call
+        summaries = [f"summary {i}" for i in range(8)]
+        finished_summary = summarize.reduce_summaries(
+            summaries, "directive", "prompt", max_tokens=10000, fan_in=2, max_workers=4
+        )
+        self.assertEqual(self.server.requests, 7)
+        for i in range(8):
+            self.assertIn(f"summary {i}", finished_summary)
+        self.assertLess(finished_summary.index("summary 0"), finished_summary.index("summary 7"))
+
+    def test_max_depth(self, mock):
+        # Test that the summaries left at the maximum depth are joined without a final call
+        summaries = [f"summary {i}" for i in range(8)]
+        finished_summary = summarize.reduce_summaries(
+            summaries, "directive", "prompt", max_tokens=10000, fan_in=2, max_depth=1
+        )
+        self.assertEqual(self.server.requests, 4)
+        self.assertEqual(len(finished_summary.split("\n\n")), 4)
+        self.assertLess(finished_summary.index("summary 0"), finished_summary.index("summary 7"))
+
+    def test_summaries_that_never_shrink_stop_at_default_depth(self, mock):
+        # Every summary of a long summary is just as long, so no level makes progress
+        self.server.reply = "word " * 8
+        summarize.reduce_summaries(["word " * 8] * 2, "directive", "prompt", max_tokens=16)
+        self.assertEqual(self.server.requests, 2 * summarize.DEFAULT_SUMMARY_MAX_DEPTH)
+
+    def test_summaries_within_budget_take_one_call(self, mock):
+        summaries = [f"summary {i}" for i in range(8)]
+        summarize.reduce_summaries(summaries, "directive", "prompt", max_tokens=10000)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_requests_fit_budget_with_directive_and_prompt(self, mock):
+        # The directive and prompt take 4 tokens of every request, and each
+        # summary after the first a 2 token separator
+        self.server.reply = "short"
+        summaries = ["summary 0", "word " * 30, "summary 2", "summary 3 " + "word " * 7]
+        finished_summary = summarize.reduce_summaries(summaries, "directive", "prompt", max_tokens=16)
+        self.assertEqual(finished_summary, "short")
+        for messages in self.server.messages:
+            self.assertLessEqual(sum(len(FakeEncoding().encode(message["content"])) for message in messages), 16)
+        # The long summary is split into pieces that pair up
+        self.assertIn("word word word word word", self.server.messages[0][1]["content"] + self.server.messages[1][1]["content"])
+
+    def test_budget_too_small_for_directive_and_prompt(self, mock):
+        with self.assertRaises(RuntimeError):
+            summarize.reduce_summaries(["summary 0", "summary 1"], "a long directive", "prompt", max_tokens=6)
+        self.assertEqual(self.server.requests, 0)
+
+    def test_final_summary_is_retried_and_cached(self, mock):
+        self.server.failures = 1
+        with tempfile.TemporaryDirectory() as cache_dir, patch("transcriptly.rate_limit.random.uniform", return_value=0):
+            summary_cache = SummaryCache(cache_dir)
+            summaries = ["summary 0", "summary 1"]
+            first = summarize.reduce_summaries(summaries, "directive", "prompt", max_tokens=10000, summary_cache=summary_cache)
+            second = summarize.reduce_summaries(summaries, "directive", "prompt", max_tokens=10000, summary_cache=summary_cache)
+        self.assertEqual(first, second)
+        self.assertEqual(self.server.requests, 2)
+
+class TestSliceTranscriptFile(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.transcript_path = os.path.join(self.tmp_dir.name, "transcript.txt")
+        with open(self.transcript_path, "w") as f:
+            for i in range(50):
+                speaker = "John" if i % 3 else "Jane"
+                f.write(f'[{i:9.2f}]{speaker:>16}: {"word " * (i % 7 + 1)}\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @patch.object(summarize, "get_encoding", return_value=FakeEncoding())
+    def test_slices_fit_token_budget(self, mock):
+        sliced_transcript = summarize.slice_transcript_file(self.transcript_path, max_tokens=20)
+        self.assertEqual([line for tslice in sliced_transcript for line in tslice], open(self.transcript_path).readlines())
+        self.assertGreater(len(sliced_transcript), 1)
+        for tslice in sliced_transcript:
+            self.assertLessEqual(sum(len(FakeEncoding().encode(line)) for line in tslice), 20)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,35 @@
+import os
+import tempfile
+from concurrent.futures import Future
 from unittest import TestCase, main
 from unittest.mock import patch
+
+import numpy as np
+
 from transcriptly.transcribe import Transcribe
-from transcriptly.data_types import AudioInput, Segment, TranscriptionResult
+from transcriptly.data_types import AudioInput, Segment, SegmentTable, TranscriptionResult
+from transcriptly.job_manifest import PENDING, JobManifest
+from transcriptly.transcribe_services.transcribe_service import TranscribeService
+from transcriptly.vad import SAMPLE_RATE
+
+class InProcessExecutor:
+    """
+    Stands in for the ProcessPoolExecutor of Transcribe.create_process_pool,
+    running the worker initializer and every job in this process so that the
+    patched transcription service is visible to the "workers".
+    """
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        initializer(*initargs)
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        return False
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
 
 class TestTranscript(TestCase):
     def test_init(self):
@@ -23,6 +51,23 @@ class TestTranscript(TestCase):
         )
         self.assertEqual(transcribe.remove_duplicates, True)
 
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_init_workers_does_not_load_model(self, mock):
+        # Test that the parent process leaves model loading to the pool workers
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny",
+            workers=4
+        )
+        self.assertEqual(transcribe.workers, 4)
+        self.assertIsNone(transcribe.transcription_service)
+        mock.assert_not_called()
+
+    def test_init_workers_runtime_error(self):
+        # Test that a RuntimeError is raised for an invalid worker count
+        with self.assertRaises(RuntimeError):
+            Transcribe(service_name="whisper", model_name="tiny", workers=0)
+
     def test_init_model_name_runtime_error(self):
         # Test that a RuntimeError is raised when model_name is not specified
         with self.assertRaises(RuntimeError):
@@ -107,6 +152,113 @@ class TestTranscript(TestCase):
         self.assertEqual(transcription_result[0].speaker, "John")
         self.assertEqual(transcription_result[1].speaker, "John")
     
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_single_audio_file_uses_cache(self, mock):
+        # Test that a second transcription of the same audio is served from the cache
+        whisper_instance = mock.return_value
+        whisper_instance.cache_params.return_value = {"service": "whisper", "model_name": "tiny"}
+        whisper_instance.transcribe.side_effect = lambda file_path: TranscriptionResult(
+            segments=[Segment("Hello", 0, 1)]
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            audio_path = os.path.join(tmp_dir, "test.wav")
+            with open(audio_path, "wb") as f:
+                f.write(b"audio")
+            transcribe = Transcribe(
+                service_name="whisper",
+                model_name="tiny",
+                cache_dir=os.path.join(tmp_dir, "cache")
+            )
+            first = transcribe.transcribe_single_audio_file(AudioInput(audio_path, speaker="John"))
+            second = transcribe.transcribe_single_audio_file(AudioInput(audio_path, speaker="John"))
+            whisper_instance.transcribe.assert_called_once_with(audio_path)
+            self.assertEqual(first, second)
+
+            bypass = Transcribe(
+                service_name="whisper",
+                model_name="tiny",
+                cache_dir=os.path.join(tmp_dir, "cache"),
+                use_cache=False
+            )
+            self.assertIsNone(bypass.transcription_cache)
+            bypass.transcribe_single_audio_file(AudioInput(audio_path))
+            self.assertEqual(whisper_instance.transcribe.call_count, 2)
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_multiple_audio_files_resumes_from_manifest(self, mock):
+        # Test that tracks already finished in the job manifest are not transcribed again
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe.side_effect = lambda file_path: TranscriptionResult(
+            segments={
+                "john.wav": [Segment("one", 1, 2), Segment("three", 3, 4)],
+                "jane.wav": [Segment("two", 2, 3), Segment("four", 4, 5)],
+            }[file_path]
+        )
+        audio_inputs = [
+            AudioInput("john.wav", speaker="John"),
+            AudioInput("jane.wav", speaker="Jane"),
+        ]
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny"
+        )
+        with tempfile.TemporaryDirectory() as job_dir:
+            manifest = JobManifest.create(job_dir, audio_inputs)
+            manifest.mark_done(audio_inputs[0], [Segment("one", 1, 2, "John"), Segment("three", 3, 4, "John")])
+
+            resumed = JobManifest.load(job_dir, audio_inputs)
+            segments = list(transcribe.transcribe_multiple_audio_files_into_one(audio_inputs, resumed))
+            whisper_instance.transcribe.assert_called_once_with("jane.wav")
+            self.assertEqual([s.text for s in segments], ["one", "two", "three", "four"])
+            self.assertEqual([s.speaker for s in segments], ["John", "Jane", "John", "Jane"])
+            self.assertEqual(resumed.pending(audio_inputs), [])
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_multiple_audio_files_columnar(self, mock):
+        # Test that columnar mode dedups, tags and merges SegmentTables
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe.side_effect = lambda file_path: TranscriptionResult(
+            segments={
+                "john.wav": [Segment("one", 1, 2), Segment("one", 1.5, 2), Segment("three", 3, 4)],
+                "jane.wav": [Segment("two", 2, 3), Segment("four", 4, 5)],
+            }[file_path]
+        )
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny",
+            remove_duplicates=True,
+            columnar=True
+        )
+        segments = transcribe.transcribe_multiple_audio_files_into_one([
+            AudioInput("john.wav", speaker="John"),
+            AudioInput("jane.wav", speaker="Jane"),
+        ])
+        self.assertIsInstance(segments, SegmentTable)
+        self.assertEqual([s.text for s in segments], ["one", "two", "three", "four"])
+        self.assertEqual([s.speaker for s in segments], ["John", "Jane", "John", "Jane"])
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_multiple_audio_files_removes_bleed(self, mock):
+        # Test that a segment heard on both mics is kept in the louder track
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe.side_effect = lambda file_path: TranscriptionResult(
+            segments={
+                "john.wav": [Segment(" Let's ship it.", 1, 2), Segment(" Agreed.", 3, 4)],
+                "jane.wav": [Segment(" Let's ship it.", 1.1, 2), Segment(" Okay.", 5, 6)],
+            }[file_path]
+        )
+        loud, quiet = np.full(7 * SAMPLE_RATE, 0.5, dtype=np.float32), np.full(7 * SAMPLE_RATE, 0.01, dtype=np.float32)
+        whisper_instance.load_audio.side_effect = lambda file_path: {"john.wav": loud, "jane.wav": quiet}[file_path]
+        for columnar in (False, True):
+            transcribe = Transcribe(service_name="whisper", model_name="tiny", remove_bleed=True, columnar=columnar)
+            segments = transcribe.transcribe_multiple_audio_files_into_one([
+                AudioInput("john.wav", speaker="John"),
+                AudioInput("jane.wav", speaker="Jane"),
+            ])
+            self.assertEqual([(s.text, s.speaker) for s in segments], [
+                (" Let's ship it.", "John"), (" Agreed.", "John"), (" Okay.", "Jane")
+            ])
+
     @patch("os.path.basename")
     def test_get_speaker_from_file_path(self, mock):
         # Test that get_speaker_from_file_path returns the correct speaker
@@ -137,7 +289,7 @@ class TestTranscript(TestCase):
             [Segment("three", 3, 2), Segment("five", 5, 3), Segment("six", 6, 1)],
             [Segment("one", 1, 2), Segment("two", 2, 3), Segment("four", 4, 1)],
         ]
-        sorted_segments = Transcribe.sort_segments(segment_collection)
+        sorted_segments = list(Transcribe.sort_segments(segment_collection))
         self.assertEqual(sorted_segments[0].text, "one")
         self.assertEqual(sorted_segments[1].text, "two")
         self.assertEqual(sorted_segments[2].text, "three")
@@ -145,5 +297,239 @@ class TestTranscript(TestCase):
         self.assertEqual(sorted_segments[4].text, "five")
         self.assertEqual(sorted_segments[5].text, "six")
 
+    def test_sort_segments_is_lazy(self):
+        # Test that sort_segments merges without consuming the inputs up front
+        def track(*start_times):
+            for start_time in start_times:
+                yield Segment(str(start_time), start_time, start_time + 1)
+        merged = Transcribe.sort_segments([track(0, 2, 4), track(1, 3)])
+        self.assertNotIsInstance(merged, list)
+        self.assertEqual([s.start_time for s in merged], [0, 1, 2, 3, 4])
+
+    def test_sort_segments_ties_keep_track_order(self):
+        # Test that segments starting at the same time keep the track order
+        segment_collection = [
+            [Segment("first", 1, 2)],
+            [Segment("second", 1, 2)],
+        ]
+        sorted_segments = list(Transcribe.sort_segments(segment_collection))
+        self.assertEqual([s.text for s in sorted_segments], ["first", "second"])
+
+    @patch("transcriptly.transcribe.ProcessPoolExecutor")
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_multiple_audio_files_in_pool(self, mock, mock_executor):
+        mock_executor.side_effect = InProcessExecutor
+
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe.side_effect = lambda file_path: TranscriptionResult(
+            segments={
+                "john.wav": [Segment("one", 1, 2), Segment("three", 3, 4)],
+                "jane.wav": [Segment("two", 2, 3), Segment("four", 4, 5)],
+            }[file_path]
+        )
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny",
+            workers=2
+        )
+        segments = list(transcribe.transcribe_multiple_audio_files_into_one([
+            AudioInput("john.wav", speaker="John"),
+            AudioInput("jane.wav", speaker="Jane"),
+        ]))
+        self.assertEqual(mock_executor.call_args.kwargs["max_workers"], 2)
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual([s.text for s in segments], ["one", "two", "three", "four"])
+        self.assertEqual([s.speaker for s in segments], ["John", "Jane", "John", "Jane"])
+
+    @patch("transcriptly.transcribe.ProcessPoolExecutor")
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_multiple_audio_files_in_pool_in_windows(self, mock, mock_executor):
+        # Test that pool workers transcribe their files in the configured windows
+        mock_executor.side_effect = InProcessExecutor
+
+        whisper_instance = mock.return_value
+        whisper_instance.load_audio.return_value = np.zeros(50 * SAMPLE_RATE, dtype=np.float32)
+        whisper_instance.transcribe_audio.side_effect = lambda audio: TranscriptionResult(
+            segments=[Segment(f"{len(audio)} samples", 12, 14)]
+        )
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny",
+            workers=2,
+            window_seconds=30,
+            window_overlap=10
+        )
+        segments = list(transcribe.transcribe_multiple_audio_files_into_one([
+            AudioInput("john.wav", speaker="John"),
+            AudioInput("jane.wav", speaker="Jane"),
+        ]))
+        whisper_instance.transcribe.assert_not_called()
+        window_lengths = [len(call.args[0]) for call in whisper_instance.transcribe_audio.call_args_list]
+        self.assertEqual(window_lengths, [30 * SAMPLE_RATE] * 4)
+        self.assertEqual([(s.speaker, s.start_time) for s in segments], [("John", 12), ("Jane", 12), ("John", 32), ("Jane", 32)])
+
+    @patch("transcriptly.transcribe.ProcessPoolExecutor")
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_pool_marks_tracks_running_when_workers_start_them(self, mock, mock_executor):
+        # Test that queued tracks stay pending in the manifest until a worker picks them up
+        mock_executor.side_effect = InProcessExecutor
+
+        audio_inputs = [AudioInput("john.wav", speaker="John"), AudioInput("jane.wav", speaker="Jane")]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest = JobManifest.create(os.path.join(tmp_dir, "job"), audio_inputs)
+            statuses = []
+            whisper_instance = mock.return_value
+            def transcribe(file_path):
+                statuses.append([manifest.status(ainput) for ainput in audio_inputs])
+                return TranscriptionResult(segments=[Segment(file_path, 1, 2)])
+            whisper_instance.transcribe.side_effect = transcribe
+            transcribe = Transcribe(service_name="whisper", model_name="tiny", workers=2)
+            with patch.object(manifest, "mark_running", wraps=manifest.mark_running) as mark_running:
+                list(transcribe.transcribe_multiple_audio_files_into_one(audio_inputs, manifest))
+            self.assertEqual(statuses, [[PENDING, PENDING], [PENDING, PENDING]])
+            self.assertEqual([call.args[0] for call in mark_running.call_args_list], audio_inputs)
+            self.assertTrue(all(manifest.is_done(ainput) for ainput in audio_inputs))
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_single_audio_file_in_windows(self, mock):
+        # Test that long audio is transcribed window by window onto one timeline
+        whisper_instance = mock.return_value
+        whisper_instance.load_audio.return_value = np.zeros(50 * SAMPLE_RATE, dtype=np.float32)
+        window_results = iter([
+            TranscriptionResult(segments=[Segment("one", 0, 10), Segment("two", 24, 28)]),
+            TranscriptionResult(segments=[Segment("two", 4, 8), Segment("three", 12, 20)]),
+        ])
+        whisper_instance.transcribe_audio.side_effect = lambda audio: next(window_results)
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny"
+        )
+        segments = transcribe.transcribe_single_audio_file(
+            AudioInput("test.wav", speaker="John"),
+            window_seconds=30,
+            window_overlap=10
+        )
+        whisper_instance.transcribe.assert_not_called()
+        window_lengths = [len(call.args[0]) for call in whisper_instance.transcribe_audio.call_args_list]
+        self.assertEqual(window_lengths, [30 * SAMPLE_RATE, 30 * SAMPLE_RATE])
+        self.assertEqual([s.text for s in segments], ["one", "two", "three"])
+        self.assertEqual([s.start_time for s in segments], [0, 24, 32])
+        self.assertEqual({s.speaker for s in segments}, {"John"})
+
+    @patch("transcriptly.transcribe.ProcessPoolExecutor")
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_single_audio_file_in_windows_in_pool(self, mock, mock_executor):
+        # Test that the windows of one file are spread across the worker pool
+        mock_executor.side_effect = InProcessExecutor
+
+        whisper_instance = mock.return_value
+        whisper_instance.load_audio.return_value = np.zeros(100 * SAMPLE_RATE, dtype=np.float32)
+        whisper_instance.transcribe_audio.side_effect = lambda audio: TranscriptionResult(
+            segments=[Segment(f"{len(audio)} samples", 10, 12)]
+        )
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny",
+            workers=8,
+            window_seconds=40,
+            window_overlap=5
+        )
+        segments = transcribe.transcribe_single_audio_file(AudioInput("test.wav"))
+        self.assertEqual(mock_executor.call_args.kwargs["max_workers"], 3)
+        self.assertEqual([s.start_time for s in segments], [10, 45, 80])
+        self.assertEqual(segments[-1].text, f"{30 * SAMPLE_RATE} samples")
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_stream_yields_each_window_when_done(self, mock):
+        # Test that segments come out window by window, before the rest of the audio is transcribed
+        whisper_instance = mock.return_value
+        whisper_instance.transcribe_stream.side_effect = lambda *args: TranscribeService.transcribe_stream(whisper_instance, *args)
+        whisper_instance.load_audio.return_value = np.zeros(50 * SAMPLE_RATE, dtype=np.float32)
+        window_results = iter([
+            TranscriptionResult(segments=[Segment("one", 0, 10), Segment("two", 24, 28)]),
+            TranscriptionResult(segments=[Segment("two", 4, 8), Segment("three", 12, 20)]),
+        ])
+        whisper_instance.transcribe_audio.side_effect = lambda audio: next(window_results)
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny",
+            window_seconds=30,
+            window_overlap=10
+        )
+        stream = transcribe.transcribe_stream(AudioInput("test.wav", speaker="John"))
+        first = next(stream)
+        self.assertEqual((first.text, first.speaker), ("one", "John"))
+        self.assertEqual(whisper_instance.transcribe_audio.call_count, 1)
+        segments = [first] + list(stream)
+        self.assertEqual([s.text for s in segments], ["one", "two", "three"])
+        self.assertEqual([s.start_time for s in segments], [0, 24, 32])
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_transcribe_stream_shares_cache_with_windowed_transcription(self, mock):
+        # Test that a finished stream is cached under the same key as a windowed transcription
+        whisper_instance = mock.return_value
+        whisper_instance.cache_params.return_value = {"service": "whisper", "model_name": "tiny"}
+        whisper_instance.transcribe_stream.side_effect = lambda *args: TranscribeService.transcribe_stream(whisper_instance, *args)
+        whisper_instance.load_audio.return_value = np.zeros(50 * SAMPLE_RATE, dtype=np.float32)
+        whisper_instance.transcribe_audio.side_effect = lambda audio: TranscriptionResult(
+            segments=[Segment("Hello", 2, 4), Segment("Hello", 5, 6)]
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            audio_path = os.path.join(tmp_dir, "test.wav")
+            with open(audio_path, "wb") as f:
+                f.write(b"audio")
+            transcribe = Transcribe(
+                service_name="whisper",
+                model_name="tiny",
+                remove_duplicates=True,
+                window_seconds=30,
+                window_overlap=10,
+                cache_dir=os.path.join(tmp_dir, "cache")
+            )
+            streamed = list(transcribe.transcribe_stream(AudioInput(audio_path)))
+            self.assertEqual(whisper_instance.transcribe_audio.call_count, 2)
+            self.assertEqual(list(transcribe.transcribe_stream(AudioInput(audio_path))), streamed)
+            self.assertEqual(transcribe.transcribe_single_audio_file(AudioInput(audio_path)), streamed)
+            self.assertEqual(whisper_instance.transcribe_audio.call_count, 2)
+            self.assertEqual([s.start_time for s in streamed], [2])
+
+    def test_audio_inputs_from_path(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ["John.wav", "Jane.mp3", "notes.txt"]:
+                open(os.path.join(tmp_dir, name), "w").close()
+            inputs_file = os.path.join(tmp_dir, "inputs.json")
+            with open(inputs_file, "w") as f:
+                f.write('[{"file_path": "a.wav", "speaker": "Bob"}]')
+            self.assertEqual(
+                sorted(Transcribe.audio_inputs_from_path(tmp_dir), key=lambda audio_input: audio_input.speaker),
+                [AudioInput(os.path.join(tmp_dir, "Jane.mp3"), "Jane"), AudioInput(os.path.join(tmp_dir, "John.wav"), "John")]
+            )
+            self.assertEqual(Transcribe.audio_inputs_from_path(inputs_file), [AudioInput("a.wav", "Bob")])
+            audio_path = os.path.join(tmp_dir, "John.wav")
+            self.assertEqual(Transcribe.audio_inputs_from_path(audio_path, "Jim"), [AudioInput(audio_path, "Jim")])
+            with self.assertRaises(RuntimeError):
+                Transcribe.audio_inputs_from_path(os.path.join(tmp_dir, "missing.wav"))
+
+    @patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+    def test_write_transcription_to_file(self, mock):
+        # Test that a merged segment stream is written in the fixed-width text format
+        transcribe = Transcribe(
+            service_name="whisper",
+            model_name="tiny"
+        )
+        segment_collection = [
+            [Segment("one", 1, 2, "John"), Segment("three", 3, 4, "John")],
+            [Segment("two", 2, 3, "Jane")],
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = os.path.join(tmp_dir, "transcript.txt")
+            transcribe.write_transcription_to_file(Transcribe.sort_segments(segment_collection), output_file)
+            with open(output_file) as f:
+                self.assertEqual(f.read(), (
+                    "[     1.00]            John: one\n"
+                    "[     2.00]            Jane: two\n"
+                    "[     3.00]            John: three\n"
+                ))
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
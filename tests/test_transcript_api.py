@@ -0,0 +1,148 @@
+import os
+import tempfile
+from unittest import TestCase, main
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+from database import create_database_engine
+from main import app, get_db
+from transcriptly.data_types import Segment
+from transcriptly.transcript_writer import JSONL, write_segments
+
+
+def meeting_segments():
+    return [
+        Segment("Hello everyone.", 0.0, 2.0, "John"),
+        Segment("Hi John.", 2.5, 3.0, "Jane"),
+        Segment("Let's start with the roadmap.", 3.0, 25.0, "John"),
+        Segment("Sounds good.", 26.0, 27.0, "Jane"),
+        Segment("First item.", 30.0, 32.0, "John"),
+        Segment("Go ahead.", 31.0, 32.0, None),
+        Segment("Thanks.", 40.0, 41.0, "John"),
+    ]
+
+class DatabaseTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.engine = create_database_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'transcripts.db')}")
+        self.addCleanup(self.engine.dispose)
+        models.Base.metadata.create_all(bind=self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.db = self.SessionLocal()
+        self.addCleanup(self.db.close)
+
+class TestTranscriptStore(DatabaseTestCase):
+    def test_ingest_segments_in_batches(self):
+        self.assertEqual(crud.ingest_segments(self.db, "standup", meeting_segments(), batch_size=3), 7)
+        crud.ingest_segments(self.db, "retro", [Segment("Bye.", 1.0, 2.0, "Bob"), Segment("Bye John.", 1.5, 2.0, "John")])
+        self.assertEqual([(session.name, session.segment_count) for session in crud.get_sessions(self.db)], [("retro", 2), ("standup", 7)])
+        speakers = self.db.execute(text("SELECT name FROM speakers ORDER BY name")).scalars().all()
+        self.assertEqual(speakers, ["Bob", "Jane", "John"])
+        rows, _ = crud.get_segments(self.db, session="standup")
+        self.assertEqual([(row.text, row.speaker) for row in rows], [(s.text, s.speaker) for s in meeting_segments()])
+
+    def test_ingest_replaces_session(self):
+        crud.ingest_segments(self.db, "standup", meeting_segments())
+        crud.ingest_segments(self.db, "standup", meeting_segments()[:2])
+        self.assertEqual(crud.get_session(self.db, "standup").segment_count, 2)
+        self.assertIsNone(crud.get_session(self.db, "missing"))
+
+    def test_ingest_transcript_file(self):
+        transcript_file = os.path.join(self.tmp_dir.name, "standup.jsonl")
+        write_segments(meeting_segments(), transcript_file, JSONL)
+        self.assertEqual(crud.ingest_transcript_file(self.db, "standup", transcript_file), 7)
+
+    def test_keyset_pages_cover_every_segment_once(self):
+        crud.ingest_segments(self.db, "standup", meeting_segments())
+        crud.ingest_segments(self.db, "retro", meeting_segments()[:4])
+        seen, cursor = [], None
+        while True:
+            rows, cursor = crud.get_segments(self.db, cursor=cursor, limit=3)
+            seen.extend((row.session, row.start_time) for row in rows)
+            if cursor is None:
+                break
+            # Segments added to a session before the cursor don't shift the following pages
+            crud.ingest_segments(self.db, "retro", meeting_segments()[:4])
+        self.assertEqual(seen, [("standup", s.start_time) for s in meeting_segments()] + [("retro", s.start_time) for s in meeting_segments()[:4]])
+
+    def test_filters(self):
+        crud.ingest_segments(self.db, "standup", meeting_segments())
+        rows, _ = crud.get_segments(self.db, session="standup", speaker="Jane")
+        self.assertEqual([row.text for row in rows], ["Hi John.", "Sounds good."])
+        # The roadmap segment starts before the range but is still being said in it
+        rows, _ = crud.get_segments(self.db, session="standup", start=20.0, end=31.0)
+        self.assertEqual([row.text for row in rows], ["Let's start with the roadmap.", "Sounds good.", "First item."])
+        rows, _ = crud.get_segments(self.db, start=20.0, end=31.0, speaker="John")
+        self.assertEqual([row.text for row in rows], ["Let's start with the roadmap.", "First item."])
+        self.assertEqual(crud.get_segments(self.db, speaker="Nobody"), ([], None))
+
+    def test_pages_use_the_indexes(self):
+        plans = {}
+        for name, query in [
+            ("session", "SELECT id FROM segments WHERE session_id = 1 AND (start_time, id) > (3.0, 3) ORDER BY session_id, start_time, id LIMIT 3"),
+            ("speaker", "SELECT id FROM segments WHERE speaker_id = 1 AND (session_id, start_time, id) > (1, 3.0, 3) ORDER BY session_id, start_time, id LIMIT 3"),
+        ]:
+            plans[name] = " ".join(row[-1] for row in self.db.execute(text(f"EXPLAIN QUERY PLAN {query}")))
+        self.assertIn("ix_segments_session_start", plans["session"])
+        self.assertIn("ix_segments_speaker", plans["speaker"])
+        self.assertNotIn("TEMP B-TREE", " ".join(plans.values()))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(RuntimeError):
+            crud.get_segments(self.db, cursor="not a cursor")
+
+class TestTranscriptApi(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        def override_get_db():
+            db = self.SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+        app.dependency_overrides[get_db] = override_get_db
+        self.addCleanup(app.dependency_overrides.clear)
+        self.client = TestClient(app)
+
+    def post_segments(self, session_name, segments):
+        return self.client.post(f"/sessions/{session_name}/segments", json=[
+            {"text": s.text, "start_time": s.start_time, "end_time": s.end_time, "speaker": s.speaker} for s in segments
+        ])
+
+    def test_ingest_and_list_sessions(self):
+        response = self.post_segments("standup", meeting_segments())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["segment_count"], 7)
+        self.assertEqual([session["name"] for session in self.client.get("/sessions").json()], ["standup"])
+
+    def test_session_segments_are_paged(self):
+        self.post_segments("standup", meeting_segments())
+        texts, params = [], {"limit": 2}
+        while True:
+            page = self.client.get("/sessions/standup/segments", params=params).json()
+            texts.extend(segment["text"] for segment in page["segments"])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(texts, [s.text for s in meeting_segments()])
+
+    def test_segments_by_speaker_and_time(self):
+        self.post_segments("standup", meeting_segments())
+        page = self.client.get("/segments", params={"speaker": "John", "start": "0:20", "end": "0:45"}).json()
+        self.assertEqual([segment["text"] for segment in page["segments"]], ["Let's start with the roadmap.", "First item.", "Thanks."])
+        self.assertEqual(page["segments"][0]["session"], "standup")
+
+    def test_errors(self):
+        self.post_segments("standup", meeting_segments())
+        self.assertEqual(self.client.get("/sessions/missing/segments").status_code, 404)
+        self.assertEqual(self.client.get("/segments", params={"cursor": "bad"}).status_code, 400)
+        self.assertEqual(self.client.get("/segments", params={"start": "noon"}).status_code, 400)
+        self.assertEqual(self.client.get("/segments", params={"limit": 0}).status_code, 422)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from transcriptly.data_types import Segment
+from transcriptly.transcript_writer import TranscriptWriter, parse_text_line, read_binary_segments, read_jsonl_segments, read_segment_at, read_segments_with_offsets, write_segments
+
+SEGMENTS = [
+    Segment("Hello", 0, 1.5, "John"),
+    Segment(" wörld, \"quoted\"\nnewline", 1.5, 2.25, "Jane"),
+    Segment("No speaker", 3, 4),
+]
+
+class TestTranscriptWriter(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_text_format(self):
+        count = write_segments(SEGMENTS[:1], self.path("out.txt"))
+        self.assertEqual(count, 1)
+        with open(self.path("out.txt")) as f:
+            self.assertEqual(f.read(), "[     0.00]            John: Hello\n")
+
+    def test_text_format_without_speaker(self):
+        write_segments(SEGMENTS[2:], self.path("out.txt"))
+        with open(self.path("out.txt")) as f:
+            self.assertEqual(f.read(), "[     3.00]                : No speaker\n")
+
+    def test_jsonl_round_trip(self):
+        write_segments(SEGMENTS, self.path("out.jsonl"), "jsonl")
+        self.assertEqual(list(read_jsonl_segments(self.path("out.jsonl"))), SEGMENTS)
+
+    def test_binary_round_trip(self):
+        write_segments(SEGMENTS, self.path("out.bin"), "binary")
+        self.assertEqual(list(read_binary_segments(self.path("out.bin"))), SEGMENTS)
+
+    def test_binary_truncated(self):
+        write_segments(SEGMENTS, self.path("out.bin"), "binary")
+        with open(self.path("out.bin"), "rb+") as f:
+            f.truncate(os.path.getsize(self.path("out.bin")) - 3)
+        with self.assertRaises(RuntimeError):
+            list(read_binary_segments(self.path("out.bin")))
+
+    def test_streams_in_batches(self):
+        # Test that segments are written in batches while the iterator is consumed
+        def segments():
+            for i in range(10):
+                yield Segment(str(i), i, i + 1, "John")
+        with TranscriptWriter(self.path("out.jsonl"), "jsonl", batch_size=4) as writer:
+            writer.write_all(segments())
+            self.assertEqual(writer.segments_written, 8)
+        self.assertEqual(writer.segments_written, 10)
+        self.assertEqual(len(list(read_jsonl_segments(self.path("out.jsonl")))), 10)
+
+    def test_read_segments_with_offsets(self):
+        for output_format, file_name in (("jsonl", "out.jsonl"), ("binary", "out.bin")):
+            write_segments(SEGMENTS, self.path(file_name), output_format)
+            read = list(read_segments_with_offsets(self.path(file_name)))
+            self.assertEqual([segment for _, segment in read], SEGMENTS)
+            self.assertEqual(read_segment_at(self.path(file_name), read[1][0]), SEGMENTS[1])
+
+    def test_read_text_segments(self):
+        # Text transcripts have no end times
+        segments = [Segment(" Hello: there", 1.25, 2, "John"), Segment(" Bye.", 3, 4)]
+        write_segments(segments, self.path("out.txt"))
+        read = list(read_segments_with_offsets(self.path("out.txt")))
+        self.assertEqual([segment for _, segment in read], [Segment(" Hello: there", 1.25, 1.25, "John"), Segment(" Bye.", 3, 3)])
+        self.assertEqual(read_segment_at(self.path("out.txt"), read[1][0]).text, " Bye.")
+        with self.assertRaises(RuntimeError):
+            parse_text_line("not a transcript line")
+
+    def test_text_segments_with_line_breaks(self):
+        # Test that every segment stays on one line of a text transcript
+        segments = [Segment(" one\ntwo\r\nthree", 1, 1, "John"), Segment(" C:\\new \\n", 2, 2), Segment(" last", 3, 3)]
+        write_segments(segments, self.path("out.txt"))
+        with open(self.path("out.txt")) as f:
+            self.assertEqual(len(f.readlines()), 3)
+        read = list(read_segments_with_offsets(self.path("out.txt")))
+        self.assertEqual([segment for _, segment in read], segments)
+        self.assertEqual(read_segment_at(self.path("out.txt"), read[2][0]).text, " last")
+
+    def test_invalid_format(self):
+        with self.assertRaises(RuntimeError):
+            TranscriptWriter(self.path("out.csv"), "csv")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import numpy as np
+
+from transcriptly.transcribe_services.whisper_service import WhisperTranscribe
+from transcriptly.data_types import Segment
+from transcriptly.vad import SAMPLE_RATE, TimeMap, detect_speech_spans, segment_loudness, trim_silence
+
+
+def synthetic_track(layout):
+    """
+    Builds audio from (seconds, is_speech) pairs, with a tone for speech and
+    faint noise for silence.
+    """
+    rng = np.random.default_rng(0)
+    parts = []
+    for seconds, is_speech in layout:
+        samples = int(seconds * SAMPLE_RATE)
+        if is_speech:
+            t = np.arange(samples) / SAMPLE_RATE
+            parts.append(0.5 * np.sin(2 * np.pi * 220 * t))
+        else:
+            parts.append(0.0005 * rng.standard_normal(samples))
+    return np.concatenate(parts).astype(np.float32)
+
+class TestVad(TestCase):
+    def test_detects_speech_spans(self):
+        audio = synthetic_track([(10, False), (2, True), (20, False), (3, True), (5, False)])
+        spans = detect_speech_spans(audio, padding=0)
+        self.assertEqual(len(spans), 2)
+        self.assertAlmostEqual(spans[0][0] / SAMPLE_RATE, 10, delta=0.05)
+        self.assertAlmostEqual(spans[0][1] / SAMPLE_RATE, 12, delta=0.05)
+        self.assertAlmostEqual(spans[1][0] / SAMPLE_RATE, 32, delta=0.05)
+        self.assertAlmostEqual(spans[1][1] / SAMPLE_RATE, 35, delta=0.05)
+
+    def test_short_pauses_are_kept(self):
+        audio = synthetic_track([(1, True), (0.5, False), (1, True)])
+        spans = detect_speech_spans(audio, min_silence=2.0)
+        self.assertEqual(len(spans), 1)
+
+    def test_silent_track(self):
+        audio = synthetic_track([(5, False)])
+        trimmed, time_map = trim_silence(audio)
+        self.assertEqual(len(trimmed), 0)
+        self.assertEqual(time_map.total_duration, 5)
+
+    def test_segment_loudness(self):
+        audio = synthetic_track([(2, True), (2, False)])
+        loudness = segment_loudness(audio, [Segment("speech", 0, 2), Segment("silence", 2, 4), Segment("past the end", 5, 6)])
+        # A 0.5 amplitude sine is about -9 dB, the noise about -66 dB
+        self.assertAlmostEqual(loudness[0], -9.03, places=1)
+        self.assertLess(loudness[1], -60)
+        self.assertEqual(loudness[2], -np.inf)
+
+    def test_trim_silence_maps_back_to_original_time(self):
+        audio = synthetic_track([(10, False), (2, True), (20, False), (3, True), (5, False)])
+        trimmed, time_map = trim_silence(audio, padding=0)
+        self.assertAlmostEqual(len(trimmed) / SAMPLE_RATE, 5, delta=0.1)
+        self.assertAlmostEqual(time_map.to_original(0.5), 10.5, delta=0.05)
+        self.assertAlmostEqual(time_map.to_original(3), 33, delta=0.05)
+
+    def test_time_map_cut_boundaries(self):
+        # Two one-second spans at 5s and 10s in the original audio
+        time_map = TimeMap([(5 * SAMPLE_RATE, 6 * SAMPLE_RATE), (10 * SAMPLE_RATE, 11 * SAMPLE_RATE)])
+        self.assertEqual(time_map.to_original(1.0), 10.0)
+        self.assertEqual(time_map.to_original(1.0, is_end=True), 6.0)
+        self.assertEqual(time_map.to_original(1.5, is_end=True), 10.5)
+
+    @patch("transcriptly.transcribe_services.whisper_service.get_model")
+    def test_whisper_transcribe_with_vad(self, mock_get_model):
+        # Test that segments of the trimmed audio come back on the original timeline
+        audio = synthetic_track([(10, False), (2, True), (20, False), (3, True)])
+        model = mock_get_model.return_value
+        model.transcribe.return_value = {
+            "text": "one two",
+            "segments": [
+                {"text": "one", "start": 0.0, "end": 2.0},
+                {"text": "two", "start": 2.6, "end": 5.0},
+            ],
+        }
+        service = WhisperTranscribe("tiny", vad=True)
+        with patch.object(service, "load_audio", return_value=audio):
+            result = service.transcribe("test.wav")
+        trimmed_audio = model.transcribe.call_args.args[0]
+        self.assertLess(len(trimmed_audio), len(audio) / 2)
+        self.assertAlmostEqual(result.segments[0].start_time, 9.75, delta=0.05)
+        self.assertAlmostEqual(result.segments[1].start_time, 31.85, delta=0.1)
+        self.assertIn("vad", service.cache_params())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import os
+import tempfile
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from transcriptly.data_types import Segment, TranscriptionResult
+from transcriptly.transcribe import Transcribe
+from transcriptly.watch_folder import FolderWatcher, main as watch_main
+
+class TestWatchFolder(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.watch_dir = os.path.join(self.tmp_dir.name, "drop")
+        self.output_dir = os.path.join(self.tmp_dir.name, "out")
+        os.makedirs(self.watch_dir)
+        patcher = patch("transcriptly.transcribe_services.whisper_service.WhisperTranscribe")
+        self.whisper = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.transcribed = []
+
+        def transcribe(file_path):
+            self.transcribed.append(os.path.basename(file_path))
+            with open(file_path) as f:
+                return TranscriptionResult(segments=[Segment(f" {f.read()}", 1 + len(self.transcribed), 2 + len(self.transcribed))])
+        self.whisper.transcribe.side_effect = transcribe
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def drop(self, relative_path, content, age=3600):
+        path = os.path.join(self.watch_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def watcher(self, **kwargs):
+        transcribe = Transcribe(service_name="whisper", model_name="tiny")
+        kwargs.setdefault("settle_seconds", 0)
+        return FolderWatcher(transcribe, self.watch_dir, self.output_dir, os.path.join(self.tmp_dir.name, "state"), **kwargs)
+
+    def read_output(self, name):
+        with open(os.path.join(self.output_dir, name)) as f:
+            return f.read()
+
+    def test_session_directories(self):
+        self.drop("standup/John.wav", "hello")
+        self.drop("standup/Jane.wav", "hi")
+        self.drop("standup/notes.md", "not audio")
+        watcher = self.watcher()
+        self.assertEqual(watcher.poll(), [os.path.join(self.output_dir, "standup.txt")])
+        self.assertEqual(sorted(self.transcribed), ["Jane.wav", "John.wav"])
+        self.assertIn("Jane:  hi", self.read_output("standup.txt"))
+
+        # Nothing new, nothing transcribed, even after a restart
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(self.watcher().poll(), [])
+
+        # A new track transcribes only that track, and the session is rewritten
+        self.drop("standup/Bob.wav", "late")
+        self.transcribed = []
+        self.watcher().poll()
+        self.assertEqual(self.transcribed, ["Bob.wav"])
+        self.assertIn("Bob:  late", self.read_output("standup.txt"))
+        self.assertIn("John:  hello", self.read_output("standup.txt"))
+
+    def test_touched_file_is_not_transcribed_again(self):
+        path = self.drop("retro/John.wav", "hello")
+        watcher = self.watcher()
+        watcher.poll()
+        os.utime(path, (time.time() - 60, time.time() - 60))
+        self.assertEqual(watcher.poll(), [])
+        # Changed contents are transcribed again
+        self.drop("retro/John.wav", "goodbye")
+        self.assertEqual(len(watcher.poll()), 1)
+        self.assertEqual(self.transcribed, ["John.wav", "John.wav"])
+        self.assertIn("goodbye", self.read_output("retro.txt"))
+
+    def test_waits_for_files_to_settle(self):
+        self.drop("standup/John.wav", "hello", age=0)
+        watcher = self.watcher(settle_seconds=30)
+        self.assertEqual(watcher.poll(), [])
+        clock = time.time() + 60
+        watcher.clock = lambda: clock
+        # Settled for long enough and unchanged since the last scan
+        self.assertEqual(len(watcher.poll()), 1)
+
+    def test_settled_files_are_transcribed_on_the_first_poll(self):
+        # Test that a cron run with --once transcribes files that are old enough
+        self.drop("standup/John.wav", "hello")
+        self.drop("retro/Jane.wav", "hi", age=0)
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        self.whisper.cache_params.return_value = {"service": "whisper", "model_name": "tiny"}
+        with patch.dict(os.environ, {
+            "TRANSCRIPTION_CACHE_DIR": os.path.join(cache_dir, "transcriptions"),
+            "TRANSCRIPTION_AUDIO_CACHE_DIR": os.path.join(cache_dir, "audio"),
+        }):
+            watch_main([self.watch_dir, "--once", "--output-dir", self.output_dir, "--settle-seconds", "30"])
+        self.assertIn("John:  hello", self.read_output("standup.txt"))
+        # A file that is still too new is left for a later run
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "retro.txt")))
+        self.assertEqual(self.transcribed, ["John.wav"])
+
+    def test_loose_files_grouped_by_arrival(self):
+        self.drop("John.wav", "morning", age=10 * 3600)
+        self.drop("Jane.wav", "morning too", age=10 * 3600 - 60)
+        self.drop("Bob.wav", "evening", age=3600)
+        written = self.watcher(session_gap=600).poll()
+        self.assertEqual(len(written), 2)
+        line_counts = sorted(len(open(path).read().splitlines()) for path in written)
+        self.assertEqual(line_counts, [1, 2])
+
+    def test_failed_track_is_retried_with_backoff(self):
+        self.drop("standup/John.wav", "hello")
+        transcribe = self.whisper.transcribe.side_effect
+        self.whisper.transcribe.side_effect = RuntimeError("bad audio")
+        clock = time.time()
+        watcher = self.watcher(retry_seconds=60, clock=lambda: clock)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(self.whisper.transcribe.call_count, 1)
+
+        # The second failure waits twice as long
+        clock += 60
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(self.whisper.transcribe.call_count, 2)
+        clock += 60
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(self.whisper.transcribe.call_count, 2)
+
+        clock += 60
+        self.whisper.transcribe.side_effect = transcribe
+        self.assertEqual(len(watcher.poll()), 1)
+        self.assertIn("John:  hello", self.read_output("standup.txt"))
+        self.assertEqual(watcher.poll(), [])
+
+    def test_retried_loose_track_is_merged_with_its_session(self):
+        self.drop("John.wav", "morning", age=2 * 3600)
+        self.drop("Jane.wav", "morning too", age=2 * 3600 - 60)
+        transcribe = self.whisper.transcribe.side_effect
+        def fail_john(file_path):
+            if file_path.endswith("John.wav"):
+                raise RuntimeError("bad audio")
+            return transcribe(file_path)
+        self.whisper.transcribe.side_effect = fail_john
+        clock = time.time()
+        watcher = self.watcher(clock=lambda: clock)
+        self.assertEqual(watcher.poll(), [])
+
+        self.whisper.transcribe.side_effect = transcribe
+        clock += 3600
+        written = watcher.poll()
+        self.assertEqual(len(written), 1)
+        self.assertEqual(self.transcribed, ["Jane.wav", "John.wav"])
+        with open(written[0]) as f:
+            transcript = f.read()
+        self.assertIn("John:  morning", transcript)
+        self.assertIn("Jane:  morning too", transcript)
+        # The session keeps the name it was first given
+        self.assertEqual({record["session"] for record in watcher.manifest.files.values()}, {os.path.splitext(os.path.basename(written[0]))[0]})
+        self.assertEqual(watcher.poll(), [])
+
+    def test_failed_track_is_retried_once_changed(self):
+        self.drop("standup/John.wav", "hello")
+        transcribe = self.whisper.transcribe.side_effect
+        self.whisper.transcribe.side_effect = RuntimeError("bad audio")
+        watcher = self.watcher()
+        self.assertEqual(watcher.poll(), [])
+        self.whisper.transcribe.side_effect = transcribe
+        self.drop("standup/John.wav", "hello again")
+        self.assertEqual(len(watcher.poll()), 1)
+
+    def test_broken_pool_is_replaced(self):
+        class Pool:
+            def __init__(self, error=None):
+                self.error = error
+            def submit(self, fn, *args):
+                future = Future()
+                if self.error is not None:
+                    future.set_exception(self.error)
+                else:
+                    future.set_result(([Segment(" hello", 1, 2, "John")], []))
+                return future
+            def shutdown(self, wait=True):
+                pass
+        class BrokenPool(Pool):
+            def submit(self, fn, *args):
+                raise BrokenProcessPool("worker died")
+
+        self.drop("standup/John.wav", "hello")
+        clock = time.time()
+        watcher = self.watcher(clock=lambda: clock)
+        watcher.transcribe.workers = 2
+        pools = [Pool(BrokenProcessPool("worker died")), BrokenPool(), Pool()]
+        with patch.object(watcher.transcribe, "create_process_pool", side_effect=pools) as mock:
+            # A pool that breaks under a track fails the track and is dropped
+            self.assertEqual(watcher.poll(), [])
+            self.assertIsNone(watcher._executor)
+            # A pool that is broken before the poll is replaced straight away
+            clock += 3600
+            self.assertEqual(len(watcher.poll()), 1)
+            self.assertEqual(mock.call_count, 3)
+        self.assertIn("John:  hello", self.read_output("standup.txt"))
+
+    def test_run_survives_failed_polls(self):
+        watcher = self.watcher()
+        with patch.object(watcher, "poll", side_effect=[FileNotFoundError("gone"), [], KeyboardInterrupt]) as mock_poll, \
+                patch("transcriptly.watch_folder.time.sleep") as mock_sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                watcher.run(interval=5)
+        self.assertEqual(mock_poll.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_filter_audio_video_files(self):
+        self.drop("a.wav", "")
+        self.drop("b.MP4", "")
+        self.drop("c.txt", "")
+        os.makedirs(os.path.join(self.watch_dir, "d.wav"))
+        files = Transcribe.filter_audio_video_files(self.watch_dir)
+        self.assertEqual(sorted(os.path.basename(path) for path in files), ["a.wav", "b.MP4"])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+from unittest import TestCase, main
+
+from transcriptly.data_types import Segment
+from transcriptly.windowing import plan_windows, reconcile_window_stream, reconcile_windows
+
+class TestWindowing(TestCase):
+    def test_plan_windows(self):
+        self.assertEqual(plan_windows(25, 10, 2), [(0, 10), (8, 18), (16, 25)])
+
+    def test_plan_windows_short_audio(self):
+        # Audio shorter than one window is a single window
+        self.assertEqual(plan_windows(5, 10, 2), [(0, 5)])
+        self.assertEqual(plan_windows(0, 10, 2), [])
+
+    def test_plan_windows_no_trailing_overlap_only_window(self):
+        # A window that would only repeat the previous window's overlap is not planned
+        self.assertEqual(plan_windows(18, 10, 2), [(0, 10), (8, 18)])
+
+    def test_plan_windows_runtime_error(self):
+        with self.assertRaises(RuntimeError):
+            plan_windows(100, 10, 10)
+
+    def test_reconcile_windows_splits_overlap_at_midpoint(self):
+        # Windows 0-30 and 20-50 overlap from 20 to 30, cut at 25
+        windows = [(0.0, 30.0), (20.0, 50.0)]
+        window_segments = [
+            [Segment("one", 0, 10), Segment("two", 12, 24), Segment("three", 26, 30)],
+            [Segment("three", 6, 10), Segment("four", 12, 20)],
+        ]
+        segments = reconcile_windows(windows, window_segments)
+        self.assertEqual([s.text for s in segments], ["one", "two", "three", "four"])
+        self.assertEqual([(s.start_time, s.end_time) for s in segments], [(0, 10), (12, 24), (26, 30), (32, 40)])
+
+    def test_reconcile_windows_drops_repeat_across_cut(self):
+        # The same speech starting on either side of the cut is only kept once
+        windows = [(0.0, 30.0), (20.0, 50.0)]
+        window_segments = [
+            [Segment("Hello there.", 24, 27)],
+            [Segment(" Hello there.", 5.5, 7), Segment("bye", 15, 16)],
+        ]
+        segments = reconcile_windows(windows, window_segments)
+        self.assertEqual([s.text for s in segments], ["Hello there.", "bye"])
+        self.assertEqual(segments[1].start_time, 35)
+
+    def test_reconcile_window_stream_is_lazy(self):
+        # Each window is reconciled as soon as its segments arrive
+        windows = [(0.0, 30.0), (20.0, 50.0)]
+        transcribed = []
+        def window_segments():
+            transcribed.append(0)
+            yield [Segment("one", 0, 10), Segment("two", 26, 30)]
+            transcribed.append(1)
+            yield [Segment("two", 6, 10), Segment("three", 12, 20)]
+        stream = reconcile_window_stream(windows, window_segments())
+        self.assertEqual([s.text for s in next(stream)], ["one"])
+        self.assertEqual(transcribed, [0])
+        self.assertEqual([(s.text, s.start_time) for s in next(stream)], [("two", 26), ("three", 32)])
+        self.assertEqual(list(stream), [])
+
+if __name__ == '__main__':
+    main()
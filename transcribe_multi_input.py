@@ -4,7 +4,7 @@ import argparse
 import datetime
 import logging
 
-import whisper
+from transcriptly.model_pool import get_model
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -19,7 +19,7 @@ def get_speaker(path):
     return name
 
 def transcribe(path, transcription_model_type="tiny"):
-    whisper_model = whisper.load_model(transcription_model_type)
+    whisper_model = get_model(transcription_model_type)
     logging.info(f"Transcribing {path} with \"{transcription_model_type}\" whisper model...")
     result = whisper_model.transcribe(
         path, verbose=False,
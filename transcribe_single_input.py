@@ -2,44 +2,32 @@ import os
 import glob
 import argparse
 import datetime
-import pickle
 
-import whisper
+from transcriptly.data_types import AudioInput
+from transcriptly.transcribe import Transcribe
 
-transcription_model = whisper.load_model("small")
-
-def transcribe(path):
+def transcribe(path, transcription_model_type="small", use_cache=True):
     print(f"Transcribing {path}...")
-    result = transcription_model.transcribe(
-        path, verbose=False,
-        no_speech_threshold=0.275, 
-        logprob_threshold=None, 
-        condition_on_previous_text=False
+    transcriber = Transcribe(
+        service_name="whisper",
+        model_name=transcription_model_type,
+        cache_dir="cache/transcriptions",
+        audio_cache_dir="cache/audio",
+        use_cache=use_cache
     )
-    return result
+    return transcriber.transcribe_single_audio_file(AudioInput(path))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("path", help="Path to the file to process")
-    parser.add_argument('-r', '--resume', action='store_true', help='Resume from cache')
+    parser.add_argument('--no-cache', action='store_true', help="Don't read or write cached transcriptions or decoded audio")
     args = parser.parse_args()
     file_path = args.path
-    resume_from_cached = args.resume
-
-    if not resume_from_cached:
-        print(f'Transcribing file: {file_path}')
-
-        transcript_segments = []
-
-        result = transcribe(file_path)
-        print(f'Sample text: {result["text"][:100]}')
 
-        with open('cache/result.pkl', 'wb') as f:
-            pickle.dump(result, f)
+    print(f'Transcribing file: {file_path}')
 
-    else:
-        with open('cache/result.pkl', 'rb') as f:
-            result = pickle.load(f)
+    segments = transcribe(file_path, use_cache=not args.no_cache)
+    print(f'Sample text: {"".join(segment.text for segment in segments)[:100]}')
 
     now = datetime.datetime.now()
     date_string = now.strftime("%Y%m%d%H%M%S")
@@ -47,6 +35,6 @@ if __name__ == "__main__":
 
     print(f'Writing transcript to {transcript_file_name}')
     with open(transcript_file_name, 'w') as f:
-        for segment in result["segments"]:
-            f.write(f'[{segment["text"]}\n')
+        for segment in segments:
+            f.write(f'[{segment.text}\n')
 
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+
+from collections import OrderedDict
+from typing import Any, Tuple
+
+import numpy as np
+
+from transcriptly.data_types import TranscriptionResult
+
+
+# Number of file digests hash_file remembers
+FILE_HASH_MEMO_SIZE = 4096
+
+_file_hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_file_hashes_lock = threading.Lock()
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's contents. Digests are
+    remembered by path, modification time and size, so a file that the
+    audio cache, the transcription cache and the ingest manifest all look
+    up is only read once in a process while it stays unchanged.
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(memo_key)
+        if digest is not None:
+            _file_hashes.move_to_end(memo_key)
+            return digest
+
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    digest = file_hash.hexdigest()
+
+    # Don't remember a digest of a file that changed while it was read
+    stat = os.stat(file_path)
+    if memo_key == (memo_key[0], stat.st_mtime_ns, stat.st_size):
+        with _file_hashes_lock:
+            _file_hashes[memo_key] = digest
+            while len(_file_hashes) > FILE_HASH_MEMO_SIZE:
+                _file_hashes.popitem(last=False)
+    return digest
+
+def hash_key(*parts: Any) -> str:
+    """
+    Returns a SHA-256 hex digest of JSON-serializable key parts.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed cache in a directory. Entries are files named by their
+    key, pickled unless a subclass overrides read_entry and write_entry. When
+    max_bytes is set the least recently used entries, by file
+    modification time, are removed after each write to keep the directory
+    under the cap.
+    """
+    cache_dir: str
+    max_bytes: int = None
+    hits: int = 0
+    misses: int = 0
+    suffix: str = ".pkl"
+    # Errors raised when reading an entry that was corrupted on disk
+    unreadable_errors: tuple = (pickle.UnpicklingError, EOFError)
+
+    def __init__(self, cache_dir: str, max_bytes: int = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Guards the counters when the cache is shared between threads
+        self._stats_lock = threading.Lock()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def read_entry(self, path: str) -> Any:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def write_entry(self, f, value: Any) -> None:
+        pickle.dump(value, f)
+
+    def get(self, key: str) -> Any:
+        """
+        Returns the cached value for key, or None on a miss.
+        """
+        path = self.path_for(key)
+        try:
+            value = self.read_entry(path)
+        except FileNotFoundError:
+            self._count_miss()
+            return None
+        except self.unreadable_errors:
+            logging.warning(f"Discarding unreadable cache entry {path}")
+            os.remove(path)
+            self._count_miss()
+            return None
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+        with self._stats_lock:
+            self.hits += 1
+        return value
+
+    def _count_miss(self) -> None:
+        with self._stats_lock:
+            self.misses += 1
+
+    def put(self, key: str, value: Any) -> None:
+        # Write to a temporary file first so a crash never leaves a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self.write_entry(f, value)
+            os.replace(tmp_path, self.path_for(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            # Another writer sharing the cache may have evicted it already
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            logging.info(f"Evicted {path} from cache")
+
+
+class TranscriptionCache(DiskCache):
+    """
+    Cache of TranscriptionResults keyed by a hash of the audio file contents
+    and the transcription service's parameters.
+    """
+    @staticmethod
+    def key_for(file_path: str, params: dict) -> str:
+        return hash_key(hash_file(file_path), params)
+
+    def get_result(self, file_path: str, params: dict) -> TranscriptionResult:
+        result = self.get(self.key_for(file_path, params))
+        if result is not None:
+            logging.info(f"Loaded transcription of {file_path} from cache")
+            result.audio_file_path = file_path
+        return result
+
+    def put_result(self, file_path: str, params: dict, result: TranscriptionResult) -> None:
+        self.put(self.key_for(file_path, params), result)
+
+
+class AudioCache(DiskCache):
+    """
+    Cache of decoded audio, stored as float32 16 kHz mono PCM in .npy files
+    keyed by a hash of the audio file contents. Cached audio is memory-mapped
+    rather than read, so a repeat run neither decodes the file again nor
+    copies the samples into memory up front.
+    """
+    suffix: str = ".npy"
+    unreadable_errors: tuple = (ValueError, EOFError)
+
+    @staticmethod
+    def key_for(file_path: str) -> str:
+        return hash_key(hash_file(file_path), "pcm_f32le_16000_mono")
+
+    def read_entry(self, path: str) -> np.ndarray:
+        # Copy-on-write so the array is writable, as torch expects, without
+        # ever writing back to the cache
+        return np.load(path, mmap_mode="c")
+
+    def write_entry(self, f, value: np.ndarray) -> None:
+        np.save(f, np.asarray(value, dtype=np.float32))
+
+    def get_audio(self, file_path: str) -> np.ndarray:
+        audio = self.get(self.key_for(file_path))
+        if audio is not None:
+            logging.info(f"Loaded decoded audio of {file_path} from cache")
+        return audio
+
+    def put_audio(self, file_path: str, audio: np.ndarray) -> None:
+        self.put(self.key_for(file_path), audio)
+
+
+class SummaryCache(DiskCache):
+    """
+    Cache of GPT summaries keyed by a hash of the model and the messages
+    sent to it, i.e. the transcript slice, system directive and prompt.
+    """
+    @staticmethod
+    def key_for(model_name: str, messages: list) -> str:
+        return hash_key(model_name, messages)
+
+    def get_summary(self, model_name: str, messages: list) -> str:
+        return self.get(self.key_for(model_name, messages))
+
+    def put_summary(self, model_name: str, messages: list, summary: str) -> None:
+        self.put(self.key_for(model_name, messages), summary)
+
+    def log_stats(self) -> None:
+        logging.info(f"Summary cache: {self.hits} hits, {self.misses} misses")
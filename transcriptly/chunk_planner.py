@@ -0,0 +1,168 @@
+import re
+
+from typing import List, Tuple
+
+# Matches lines written by Transcribe.write_transcription_to_file
+TRANSCRIPT_LINE_PATTERN = re.compile(r"^\[\s*(?P<start_time>[-\d.]+)\]\s*(?P<speaker>.*?): (?P<text>.*)$")
+
+
+def speaker_of_line(line: str) -> str:
+    """
+    Returns the speaker of a transcript line, or None if the line isn't in
+    the transcript format.
+    """
+    match = TRANSCRIPT_LINE_PATTERN.match(line)
+    return match.group("speaker") if match else None
+
+def group_speaker_turns(lines: List[str]) -> List[List[int]]:
+    """
+    Groups consecutive lines by the same speaker into turns. Returns the
+    line indexes of each turn. Lines that aren't in the transcript format
+    stay with the turn before them.
+    """
+    turns: List[List[int]] = []
+    current_speaker = None
+    for i, line in enumerate(lines):
+        speaker = speaker_of_line(line)
+        if turns and (speaker is None or speaker == current_speaker):
+            turns[-1].append(i)
+        else:
+            turns.append([i])
+            current_speaker = speaker
+    return turns
+
+def plan_chunks(lines: List[str], token_counts: List[int], max_tokens: int, overlap_tokens: int = 0, by_speaker_turn: bool = False) -> List[List[str]]:
+    """
+    Packs whole transcript lines into slices that fill a token budget.
+
+    Input:
+        lines: List[str], transcript lines
+        token_counts: List[int], number of tokens in each line
+        max_tokens: int, token budget for each slice
+        overlap_tokens: int, up to this many tokens of trailing lines from
+            the previous slice are repeated at the start of the next one
+        by_speaker_turn: bool, keep a speaker's consecutive lines in the
+            same slice unless the turn alone is over the budget
+
+    Returns: List[List[str]], lines of each slice
+    """
+    chunker = StreamingChunker(max_tokens, overlap_tokens, by_speaker_turn)
+    chunks: List[List[str]] = []
+    for line, tokens in zip(lines, token_counts):
+        chunks.extend(chunker.add(line, tokens))
+    chunks.extend(chunker.flush())
+    return chunks
+
+
+class StreamingChunker:
+    """
+    Packs transcript lines into slices as the lines arrive, the same way
+    plan_chunks does for a whole transcript. add returns the slices that
+    were completed by a line, so each slice can be sent off as soon as the
+    line that doesn't fit in it arrives, and flush returns the last one.
+
+    Units are the pieces that are never split across slices: single lines,
+    or whole speaker turns with by_speaker_turn. A turn is only complete
+    once a line by another speaker arrives, so with by_speaker_turn slices
+    are held back until the turn that ends them is over.
+    """
+    def __init__(self, max_tokens: int, overlap_tokens: int = 0, by_speaker_turn: bool = False):
+        if max_tokens <= 0:
+            raise RuntimeError("Token budget per slice must be positive")
+        if overlap_tokens >= max_tokens:
+            raise RuntimeError("Slice overlap must be smaller than the token budget per slice")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.by_speaker_turn = by_speaker_turn
+        # Units of the current chunk as (lines, tokens)
+        self.chunk: List[Tuple[List[str], int]] = []
+        self.chunk_tokens = 0
+        # Units at the start of the chunk carried over from the previous one
+        self.carried = 0
+        # Lines and token counts of the speaker turn still being added to
+        self.turn: List[Tuple[str, int]] = []
+        self.turn_speaker: str = None
+
+    def add(self, line: str, tokens: int) -> List[List[str]]:
+        """
+        Adds a line with its number of tokens.
+
+        Returns: List[List[str]], lines of each slice the line completed
+        """
+        if not self.by_speaker_turn:
+            return self._add_unit([line], tokens)
+        speaker = speaker_of_line(line)
+        chunks = []
+        if self.turn and speaker is not None and speaker != self.turn_speaker:
+            chunks = self._end_turn()
+        if not self.turn:
+            self.turn_speaker = speaker
+        self.turn.append((line, tokens))
+        return chunks
+
+    def flush(self) -> List[List[str]]:
+        """
+        Returns: List[List[str]], lines of the remaining slices
+        """
+        chunks = self._end_turn()
+        if len(self.chunk) > self.carried:
+            chunks.append([line for lines, _ in self.chunk for line in lines])
+        self.chunk, self.chunk_tokens, self.carried = [], 0, 0
+        return chunks
+
+    def _end_turn(self) -> List[List[str]]:
+        turn, self.turn = self.turn, []
+        if not turn:
+            return []
+        turn_tokens = sum(tokens for _, tokens in turn)
+        if turn_tokens <= self.max_tokens:
+            return self._add_unit([line for line, _ in turn], turn_tokens)
+        chunks = []
+        for line, tokens in turn:
+            chunks.extend(self._add_unit([line], tokens))
+        return chunks
+
+    def _add_unit(self, lines: List[str], tokens: int) -> List[List[str]]:
+        chunks = []
+        if len(self.chunk) > self.carried and self.chunk_tokens + tokens > self.max_tokens:
+            finished = self.chunk
+            chunks.append([line for unit_lines, _ in finished for line in unit_lines])
+            self.chunk, self.chunk_tokens = [], 0
+            if self.overlap_tokens:
+                # Carry trailing units of the finished chunk while they fit
+                # in the overlap and still leave room for this unit
+                for unit in reversed(finished):
+                    previous_tokens = unit[1]
+                    if self.chunk_tokens + previous_tokens > self.overlap_tokens or self.chunk_tokens + previous_tokens + tokens > self.max_tokens:
+                        break
+                    self.chunk.insert(0, unit)
+                    self.chunk_tokens += previous_tokens
+            self.carried = len(self.chunk)
+        self.chunk.append((lines, tokens))
+        self.chunk_tokens += tokens
+        return chunks
+
+def batch_by_tokens(token_counts: List[int], max_tokens: int, max_items: int = None) -> List[List[int]]:
+    """
+    Groups consecutive items into batches of at most max_tokens tokens and
+    max_items items. An item over max_tokens on its own gets a batch to
+    itself, for the caller to split or shrink.
+
+    Returns: List[List[int]], item indexes of each batch
+    """
+    if max_items is not None and max_items < 2:
+        raise RuntimeError("Batches must be able to hold at least two items")
+
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        full = batch_tokens + tokens > max_tokens or (max_items is not None and len(batch) >= max_items)
+        if batch and full:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
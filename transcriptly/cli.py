@@ -0,0 +1,41 @@
+"""
+The transcriptly command. Each subcommand's module is only imported once
+the subcommand is chosen, and those modules import Torch, Whisper,
+tiktoken and OpenAI only when they are about to use them, so --help and
+commands that don't need a model start in a fraction of a second.
+"""
+import argparse
+import importlib
+import sys
+
+from typing import List
+
+# Subcommand: (module with a main(argv, prog) function, help)
+COMMANDS = {
+    "transcribe": ("transcriptly.transcribe", "Transcribe an audio file, or one file per speaker into a single transcript."),
+    "merge": ("transcriptly.merge", "Merge per-speaker transcripts, or the finished tracks of a job, into one transcript."),
+    "summarize": ("summarize", "Summarize a transcript with GPT."),
+    "pipeline": ("transcriptly.pipeline", "Transcribe audio and summarize it while it is being transcribed."),
+    "search": ("transcriptly.search_index", "Index transcripts and search them."),
+    "watch": ("transcriptly.watch_folder", "Transcribe recording sessions as they are dropped into a folder."),
+}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="transcriptly",
+        description="Transcribe and summarize multi-speaker recordings.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<12}{help_text}" for name, (_, help_text) in COMMANDS.items())
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="One of the commands below.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments of the command, see transcriptly <command> --help.")
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(args.args, prog=f"transcriptly {args.command}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Iterator, List
+
+import numpy as np
 
 @dataclass
 class AudioInput:
@@ -17,4 +19,159 @@ class Segment:
 class TranscriptionResult:
     audio_file_path: str = None
     segments: List[Segment] = None
-    text: str = None
\ No newline at end of file
+    text: str = None
+
+class SegmentTable:
+    """
+    Columnar, array-backed storage for a list of segments. Start and end
+    times are NumPy arrays, speakers are interned into a table and stored as
+    an ID column (-1 for no speaker), and all of the text lives in a single
+    string sliced by an offsets array. Sorting, merging, duplicate removal
+    and speaker tagging operate on whole columns at once instead of on one
+    Segment object at a time.
+    """
+    start_times: np.ndarray
+    end_times: np.ndarray
+    speaker_ids: np.ndarray
+    speakers: List[str]
+    text: str
+    text_offsets: np.ndarray
+
+    def __init__(self, start_times, end_times, speaker_ids, speakers: List[str], text: str, text_offsets):
+        self.start_times = np.asarray(start_times, dtype=np.float64)
+        self.end_times = np.asarray(end_times, dtype=np.float64)
+        self.speaker_ids = np.asarray(speaker_ids, dtype=np.int32)
+        self.speakers = speakers
+        self.text = text
+        self.text_offsets = np.asarray(text_offsets, dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> "SegmentTable":
+        return cls([], [], [], [], "", [0])
+
+    @classmethod
+    def from_texts(cls, texts: List[str], start_times, end_times, speaker_ids, speakers: List[str]) -> "SegmentTable":
+        text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=text_offsets[1:])
+        return cls(start_times, end_times, speaker_ids, speakers, "".join(texts), text_offsets)
+
+    @classmethod
+    def from_segments(cls, segments: List[Segment]) -> "SegmentTable":
+        speaker_index = {}
+        speaker_ids = np.empty(len(segments), dtype=np.int32)
+        for i, segment in enumerate(segments):
+            if segment.speaker is None:
+                speaker_ids[i] = -1
+            else:
+                speaker_ids[i] = speaker_index.setdefault(segment.speaker, len(speaker_index))
+        return cls.from_texts(
+            [segment.text for segment in segments],
+            np.fromiter((segment.start_time for segment in segments), dtype=np.float64, count=len(segments)),
+            np.fromiter((segment.end_time for segment in segments), dtype=np.float64, count=len(segments)),
+            speaker_ids,
+            list(speaker_index)
+        )
+
+    def __len__(self) -> int:
+        return len(self.start_times)
+
+    def text_at(self, i: int) -> str:
+        return self.text[self.text_offsets[i]:self.text_offsets[i + 1]]
+
+    def texts(self) -> List[str]:
+        offsets = self.text_offsets.tolist()
+        return [self.text[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+    def speaker_at(self, i: int) -> str:
+        speaker_id = self.speaker_ids[i]
+        return self.speakers[speaker_id] if speaker_id >= 0 else None
+
+    def __getitem__(self, i: int) -> Segment:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("SegmentTable index out of range")
+        return Segment(self.text_at(i), float(self.start_times[i]), float(self.end_times[i]), self.speaker_at(i))
+
+    def __iter__(self) -> Iterator[Segment]:
+        start_times = self.start_times.tolist()
+        end_times = self.end_times.tolist()
+        speakers = [self.speakers[speaker_id] if speaker_id >= 0 else None for speaker_id in self.speaker_ids.tolist()]
+        for text, start_time, end_time, speaker in zip(self.texts(), start_times, end_times, speakers):
+            yield Segment(text, start_time, end_time, speaker)
+
+    def to_segments(self) -> List[Segment]:
+        return list(self)
+
+    def take(self, indexes) -> "SegmentTable":
+        """
+        Returns a new table with the rows at indexes, in that order.
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        offsets = self.text_offsets.tolist()
+        texts = [self.text[offsets[i]:offsets[i + 1]] for i in indexes.tolist()]
+        return SegmentTable.from_texts(
+            texts,
+            self.start_times[indexes],
+            self.end_times[indexes],
+            self.speaker_ids[indexes],
+            self.speakers
+        )
+
+    def sort(self) -> "SegmentTable":
+        """
+        Returns the table sorted by start time. Rows with the same start time
+        keep their order.
+        """
+        order = np.argsort(self.start_times, kind="stable")
+        if np.array_equal(order, np.arange(len(self))):
+            return self
+        return self.take(order)
+
+    @classmethod
+    def concat(cls, tables: List["SegmentTable"]) -> "SegmentTable":
+        """
+        Concatenates tables, merging their speaker tables.
+        """
+        if not tables:
+            return cls.empty()
+        speaker_index = {}
+        speaker_ids = []
+        text_offsets = [np.zeros(1, dtype=np.int64)]
+        text_length = 0
+        for table in tables:
+            # Map this table's speaker IDs onto the merged speaker table,
+            # keeping -1 as no speaker
+            remap = np.array([speaker_index.setdefault(speaker, len(speaker_index)) for speaker in table.speakers] + [-1], dtype=np.int32)
+            speaker_ids.append(remap[table.speaker_ids])
+            text_offsets.append(table.text_offsets[1:] + text_length)
+            text_length += len(table.text)
+        return cls(
+            np.concatenate([table.start_times for table in tables]),
+            np.concatenate([table.end_times for table in tables]),
+            np.concatenate(speaker_ids),
+            list(speaker_index),
+            "".join(table.text for table in tables),
+            np.concatenate(text_offsets)
+        )
+
+    @classmethod
+    def merge(cls, tables: List["SegmentTable"]) -> "SegmentTable":
+        """
+        Merges per-speaker tables into one table sorted by start time.
+        Rows with the same start time keep the order of their tables.
+        """
+        return cls.concat(tables).sort()
+
+    def with_speaker(self, speaker: str) -> "SegmentTable":
+        """
+        Returns the table with every row assigned to speaker.
+        """
+        return SegmentTable(
+            self.start_times,
+            self.end_times,
+            np.zeros(len(self), dtype=np.int32),
+            [speaker],
+            self.text,
+            self.text_offsets
+        )
@@ -0,0 +1,200 @@
+import string
+
+from collections import deque
+from typing import FrozenSet, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from transcriptly.data_types import Segment, SegmentTable
+from transcriptly.interval_index import IntervalIndex
+
+# Deletes punctuation and turns other whitespace into spaces
+NORMALIZE_TABLE = str.maketrans("\t\r\n\x0b\x0c", "     ", string.punctuation + "“”‘’…«»¿¡")
+# Joins texts so that they can be normalized in a single pass
+TEXT_SEPARATOR = "\x00"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercases text and drops punctuation and extra whitespace, so
+    "Thank you." and " thank you!" compare equal.
+    """
+    return " ".join(text.lower().translate(NORMALIZE_TABLE).split())
+
+def normalize_texts(texts: List[str]) -> List[str]:
+    """
+    Normalizes every text like normalize_text. The texts are joined and
+    lowercased and translated as one string, which is several times faster
+    than doing it text by text.
+    """
+    if not texts:
+        return []
+    joined = TEXT_SEPARATOR.join(texts)
+    if joined.count(TEXT_SEPARATOR) != len(texts) - 1:
+        return [normalize_text(text) for text in texts]
+    return [" ".join(text.split()) for text in joined.lower().translate(NORMALIZE_TABLE).split(TEXT_SEPARATOR)]
+
+def jaccard_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def is_similar(a: FrozenSet[str], b: FrozenSet[str], threshold: float) -> bool:
+    """
+    Returns whether the Jaccard similarity of a and b is at least threshold.
+    Sets too different in size to get there are ruled out without
+    intersecting them.
+    """
+    smaller, larger = sorted((len(a), len(b)))
+    if smaller < threshold * larger:
+        return False
+    return jaccard_similarity(a, b) >= threshold
+
+def find_repeats(texts: List[str], window: int = 1, similarity: float = None) -> np.ndarray:
+    """
+    Marks each text that repeats one of the `window` texts before it. Texts
+    are compared after normalize_text, by hash, so each text costs O(1)
+    however large the window. With a similarity threshold, a text is also
+    a repeat when the Jaccard similarity of its set of words to that of one
+    of the texts in the window is at least the threshold, which catches
+    Whisper's repetition loops where every pass through the loop comes out
+    slightly different; that check costs O(window) per text.
+
+    The window holds the texts seen, not only the texts kept, so a loop that
+    drifts a little further from its first pass on every repetition is
+    still caught.
+
+    Input:
+        texts: List[str]
+        window: int, number of previous texts each text is compared with
+        similarity: float, 0 to 1, or None to only remove exact repeats
+
+    Returns: np.ndarray of bool, True for the texts to remove
+    """
+    if window < 1:
+        raise RuntimeError("Duplicate window must be at least 1")
+    if similarity is not None and not 0 < similarity <= 1:
+        raise RuntimeError("Duplicate similarity threshold must be between 0 and 1")
+
+    repeats = np.zeros(len(texts), dtype=bool)
+    normalized_texts = normalize_texts(texts)
+    if window == 1 and similarity is None:
+        # Only the previous text matters, so compare the whole column at once
+        normalized_array = np.array(normalized_texts, dtype=object)
+        repeats[1:] = normalized_array[1:] == normalized_array[:-1]
+        return repeats
+
+    finder = RepeatFinder(window, similarity)
+    for i, normalized in enumerate(normalized_texts):
+        repeats[i] = finder.is_repeat(normalized)
+    return repeats
+
+class RepeatFinder:
+    """
+    The window of recent texts behind find_repeats, for checking texts one
+    at a time as they arrive.
+    """
+    def __init__(self, window: int = 1, similarity: float = None):
+        if window < 1:
+            raise RuntimeError("Duplicate window must be at least 1")
+        if similarity is not None and not 0 < similarity <= 1:
+            raise RuntimeError("Duplicate similarity threshold must be between 0 and 1")
+        self.similarity = similarity
+        # Number of times each normalized text is in the window
+        self.recent_counts = {}
+        self.recent_texts = deque(maxlen=window)
+        self.recent_words = deque(maxlen=window)
+
+    def is_repeat(self, normalized: str) -> bool:
+        """
+        Returns whether a normalized text repeats one in the window, then
+        adds it to the window.
+        """
+        repeat = normalized in self.recent_counts
+        if self.similarity is not None:
+            words = frozenset(normalized.split())
+            if not repeat:
+                repeat = any(is_similar(words, other, self.similarity) for other in self.recent_words)
+            self.recent_words.append(words)
+
+        if len(self.recent_texts) == self.recent_texts.maxlen:
+            oldest = self.recent_texts[0]
+            if self.recent_counts[oldest] == 1:
+                del self.recent_counts[oldest]
+            else:
+                self.recent_counts[oldest] -= 1
+        self.recent_texts.append(normalized)
+        self.recent_counts[normalized] = self.recent_counts.get(normalized, 0) + 1
+        return repeat
+
+def remove_repeated_segments(segments: Union[List[Segment], SegmentTable], window: int = 1, similarity: float = None) -> Tuple[Union[List[Segment], SegmentTable], int]:
+    """
+    Removes the segments whose text repeats a recent segment, see
+    find_repeats. The input is left as it is and a new list (or
+    SegmentTable) is built from the segments that are kept.
+
+    Returns: (kept segments, number of segments removed)
+    """
+    if isinstance(segments, SegmentTable):
+        repeats = find_repeats(segments.texts(), window, similarity)
+        removed = int(repeats.sum())
+        if not removed:
+            return segments, 0
+        return segments.take(np.flatnonzero(~repeats)), removed
+
+    repeats = find_repeats([segment.text for segment in segments], window, similarity)
+    kept = [segment for segment, repeat in zip(segments, repeats.tolist()) if not repeat]
+    return kept, len(segments) - len(kept)
+
+def remove_repeated_segments_stream(segments: Iterable[Segment], window: int = 1, similarity: float = None) -> Iterator[Segment]:
+    """
+    Yields the segments that don't repeat a recent segment as they arrive,
+    keeping the same segments as remove_repeated_segments.
+    """
+    finder = RepeatFinder(window, similarity)
+    for segment in segments:
+        if not finder.is_repeat(normalize_text(segment.text)):
+            yield segment
+
+def find_cross_track_bleed(segments: List[Segment], tracks, loudness=None, similarity: float = None, tolerance: float = 0.5) -> np.ndarray:
+    """
+    Finds segments that are another speaker's words picked up by this
+    speaker's mic. Those show up as the same text in two tracks at the same
+    time, so for every segment the interval index is asked for the segments
+    of other tracks within tolerance seconds of it, and of each pair with
+    matching text (or, with a similarity threshold, alike word sets) the
+    quieter one is marked. Without loudness the later of the two in
+    segments is marked.
+
+    Input:
+        segments: List[Segment], from all tracks
+        tracks: track (e.g. speaker or file) of each segment
+        loudness: level of each segment in its own track, see
+            vad.segment_loudness
+        similarity: float, 0 to 1, or None to only match the same text
+        tolerance: float, seconds two segments can be apart and still match
+
+    Returns: np.ndarray of bool, True for the segments to remove
+    """
+    if similarity is not None and not 0 < similarity <= 1:
+        raise RuntimeError("Bleed similarity threshold must be between 0 and 1")
+    bleed = np.zeros(len(segments), dtype=bool)
+    if not segments:
+        return bleed
+    index = IntervalIndex(segments)
+    normalized_texts = normalize_texts([segment.text for segment in segments])
+    word_sets = [frozenset(text.split()) for text in normalized_texts] if similarity is not None else None
+    order = index.order
+    for i, segment in enumerate(segments):
+        text = normalized_texts[i]
+        if not text:
+            continue
+        for position in index.overlapping_indexes(segment.start_time - tolerance, segment.end_time + tolerance).tolist():
+            j = int(order[position])
+            if j <= i or tracks[j] == tracks[i]:
+                continue
+            if text == normalized_texts[j] or (similarity is not None and is_similar(word_sets[i], word_sets[j], similarity)):
+                quieter = i if loudness is not None and loudness[i] < loudness[j] else j
+                bleed[quieter] = True
+    return bleed
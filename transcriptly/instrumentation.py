@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List
+
+# Attributes summed per stage in the summary, besides the timings
+SUMMED_ATTRIBUTES = ("audio_seconds", "segments", "prompt_tokens", "completion_tokens", "total_tokens")
+
+
+class Tracer:
+    """
+    Records how long each stage of a run takes. Every stage is a span with
+    its wall time, CPU time and any attributes it was given, such as the
+    seconds of audio it processed or the tokens an OpenAI call used. CPU
+    time is for the whole process, so it includes the threads Torch runs
+    inference on.
+
+    A disabled tracer records nothing, so the stage hooks cost next to
+    nothing unless tracing was asked for. Per-stage totals are kept as spans
+    are recorded; a long-running process can turn keep_spans off so only
+    the totals are kept.
+    """
+    enabled: bool = False
+    keep_spans: bool = True
+
+    def __init__(self, enabled: bool = False, keep_spans: bool = True, clock: Callable[[], float] = time.perf_counter, cpu_clock: Callable[[], float] = time.process_time):
+        self.enabled = enabled
+        self.keep_spans = keep_spans
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.spans: List[dict] = []
+        self._totals: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, **attributes) -> Iterator[dict]:
+        """
+        Times the body of the with block as a span of stage name. The span's
+        attributes are yielded, so the block can add what it only learns
+        while running, like the length of the audio it decoded.
+        """
+        span = dict(attributes)
+        if not self.enabled:
+            yield span
+            return
+        started_at = time.time()
+        wall_start, cpu_start = self.clock(), self.cpu_clock()
+        try:
+            yield span
+        finally:
+            span["wall_seconds"] = self.clock() - wall_start
+            span["cpu_seconds"] = self.cpu_clock() - cpu_start
+            self.record({"stage": name, "started_at": started_at, "pid": os.getpid(), **span})
+
+    def record(self, span: dict) -> None:
+        with self._lock:
+            self._add_to_totals(span)
+            if self.keep_spans:
+                self.spans.append(span)
+
+    def _add_to_totals(self, span: dict) -> None:
+        totals = self._totals.setdefault(span["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+        totals["count"] += 1
+        totals["wall_seconds"] += span["wall_seconds"]
+        totals["cpu_seconds"] += span["cpu_seconds"]
+        for attribute in SUMMED_ATTRIBUTES:
+            if span.get(attribute) is not None:
+                totals[attribute] = totals.get(attribute, 0) + span[attribute]
+
+    def extend(self, spans: List[dict]) -> None:
+        """
+        Adds spans recorded by another process, e.g. a pool worker.
+        """
+        for span in spans:
+            self.record(span)
+
+    def drain(self) -> List[dict]:
+        """
+        Removes and returns the spans recorded so far. The totals are kept.
+        """
+        with self._lock:
+            spans, self.spans = self.spans, []
+        return spans
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans = []
+            self._totals = {}
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Totals per stage: number of spans, wall and CPU seconds, the summed
+        attributes, and the real-time factor (seconds of audio processed
+        per second of wall time) for stages that processed audio.
+        """
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self._totals.items()}
+        for totals in stages.values():
+            if totals.get("audio_seconds") and totals["wall_seconds"]:
+                totals["real_time_factor"] = totals["audio_seconds"] / totals["wall_seconds"]
+        return stages
+
+    def write_trace(self, trace_file: str) -> None:
+        """
+        Writes every span and the per-stage summary to a JSON file.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        with open(trace_file, "w") as f:
+            json.dump({"spans": spans, "stages": self.summary()}, f, indent=2)
+        logging.info(f"Wrote trace of {len(spans)} spans to {trace_file}")
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the per-stage summary in the Prometheus text format.
+        """
+        stages = self.summary()
+        metrics = [
+            ("transcriptly_stage_calls_total", "counter", "Number of times each stage ran.", "count"),
+            ("transcriptly_stage_wall_seconds_total", "counter", "Wall time spent in each stage.", "wall_seconds"),
+            ("transcriptly_stage_cpu_seconds_total", "counter", "Process CPU time spent in each stage.", "cpu_seconds"),
+            ("transcriptly_stage_audio_seconds_total", "counter", "Seconds of audio processed by each stage.", "audio_seconds"),
+            ("transcriptly_stage_segments_total", "counter", "Segments handled by each stage.", "segments"),
+            ("transcriptly_stage_prompt_tokens_total", "counter", "OpenAI prompt tokens used by each stage.", "prompt_tokens"),
+            ("transcriptly_stage_completion_tokens_total", "counter", "OpenAI completion tokens used by each stage.", "completion_tokens"),
+            ("transcriptly_stage_real_time_factor", "gauge", "Seconds of audio processed per second of wall time.", "real_time_factor"),
+        ]
+        lines = []
+        for metric_name, metric_type, help_text, key in metrics:
+            samples = [(stage, totals[key]) for stage, totals in sorted(stages.items()) if key in totals]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+            for stage, value in samples:
+                lines.append(f'{metric_name}{{stage="{stage}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+def stage(name: str, **attributes):
+    """
+    Times a stage on the process-wide tracer, see Tracer.stage.
+    """
+    return _tracer.stage(name, **attributes)
+
+def run_traced(fn: Callable, *args):
+    """
+    Runs fn in a pool worker and returns its result together with the spans
+    the worker recorded, so the parent process can add them to its trace.
+    """
+    result = fn(*args)
+    return result, _tracer.drain()
+
+def serve_metrics(port: int, tracer: Tracer = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves the tracer's summary in the Prometheus text format at /metrics
+    from a background thread.
+
+    Returns: ThreadingHTTPServer, shut it down with shutdown()
+    """
+    tracer = tracer or _tracer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
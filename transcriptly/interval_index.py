@@ -0,0 +1,105 @@
+from typing import Iterable, List
+
+import numpy as np
+
+from transcriptly.data_types import Segment
+
+
+def parse_timestamp(timestamp: str) -> float:
+    """
+    Parses "1:02:00", "62:00" or "3720" into seconds.
+    """
+    seconds = 0.0
+    for part in timestamp.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+class IntervalIndex:
+    """
+    Index over segments for time range queries. The segments are kept in
+    start time order next to sorted arrays of their start and end times, so
+    a query is two binary searches and a slice instead of a scan.
+
+    A segment overlapping a range can start at most max_duration (the
+    longest segment) before it, so overlap queries only look at segments
+    starting in that much extra time. Whisper segments are at most 30
+    seconds long, which keeps that extra work constant and the queries
+    O(log n + k) for k results.
+    """
+    segments: List[Segment]
+    starts: np.ndarray
+    ends: np.ndarray
+    order: np.ndarray
+    max_duration: float
+
+    def __init__(self, segments: Iterable[Segment]):
+        segments = list(segments)
+        starts = np.fromiter((segment.start_time for segment in segments), dtype=np.float64, count=len(segments))
+        ends = np.fromiter((segment.end_time for segment in segments), dtype=np.float64, count=len(segments))
+        # Position of each indexed segment in the segments it was built from
+        self.order = np.argsort(starts, kind="stable")
+        self.segments = [segments[i] for i in self.order.tolist()]
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        self.max_duration = float(np.max(self.ends - self.starts, initial=0.0))
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def starting_between_indexes(self, start: float, end: float) -> np.ndarray:
+        lo = np.searchsorted(self.starts, start, side="left")
+        hi = np.searchsorted(self.starts, end, side="left")
+        return np.arange(lo, hi)
+
+    def overlapping_indexes(self, start: float, end: float) -> np.ndarray:
+        """
+        Returns the positions in self.segments of the segments that overlap
+        the time range from start to end, in start time order. A range
+        with start equal to end finds the segments playing at that time.
+        """
+        lo = np.searchsorted(self.starts, start - self.max_duration, side="left")
+        hi = np.searchsorted(self.starts, end, side="right" if start == end else "left")
+        candidates = np.arange(lo, hi)
+        if start == end:
+            return candidates[(self.starts[lo:hi] <= start) & (self.ends[lo:hi] > start)]
+        return candidates[self.ends[lo:hi] > start]
+
+    def starting_between(self, start: float, end: float) -> List[Segment]:
+        """
+        Returns the segments that start at or after start and before end.
+        """
+        return [self.segments[i] for i in self.starting_between_indexes(start, end).tolist()]
+
+    def overlapping(self, start: float, end: float) -> List[Segment]:
+        """
+        Returns the segments that overlap the time range from start to end,
+        i.e. everything said between those times.
+        """
+        return [self.segments[i] for i in self.overlapping_indexes(start, end).tolist()]
+
+    def at(self, time: float) -> List[Segment]:
+        """
+        Returns the segments playing at time.
+        """
+        return self.overlapping(time, time)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from transcriptly.transcript_writer import format_text_line, read_binary_segments, read_jsonl_segments
+
+    parser = argparse.ArgumentParser(description="Print what was said in a time range of a transcript")
+    parser.add_argument("transcript", type=str, help="A .jsonl or binary transcript written by transcribe.py.")
+    parser.add_argument("--from", dest="start", type=str, default="0", help="Start of the range, e.g. 1:02:00.")
+    parser.add_argument("--to", dest="end", type=str, required=True, help="End of the range, e.g. 1:05:00.")
+    args = parser.parse_args()
+
+    if os.path.splitext(args.transcript)[1] == ".jsonl":
+        index = IntervalIndex(read_jsonl_segments(args.transcript))
+    else:
+        index = IntervalIndex(read_binary_segments(args.transcript))
+    for segment in index.overlapping(parse_timestamp(args.start), parse_timestamp(args.end)):
+        print(format_text_line(segment), end="")
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import tempfile
+
+from dataclasses import asdict
+from typing import List
+
+from transcriptly.cache import hash_key
+from transcriptly.data_types import AudioInput, Segment
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+
+def write_json_atomic(path: str, data) -> None:
+    """
+    Writes JSON to a temporary file and renames it into place, so a crash
+    never leaves a half-written file behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class JobManifest:
+    """
+    Checkpoint for a multi-file transcription job. The manifest records
+    every AudioInput as pending, running or done, and the segments of each
+    finished track are saved next to it as soon as the track completes, so
+    a stopped job can be resumed without transcribing those tracks again.
+    """
+    job_dir: str
+    manifest_path: str
+    tracks: dict
+
+    def __init__(self, job_dir: str):
+        self.job_dir = job_dir
+        self.manifest_path = os.path.join(job_dir, "manifest.json")
+        self.tracks = {}
+
+    @classmethod
+    def create(cls, job_dir: str, audio_inputs: List[AudioInput]) -> "JobManifest":
+        """
+        Starts a new job, discarding any previous progress in job_dir.
+        """
+        os.makedirs(job_dir, exist_ok=True)
+        manifest = cls(job_dir)
+        manifest.add_inputs(audio_inputs)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def load(cls, job_dir: str, audio_inputs: List[AudioInput]) -> "JobManifest":
+        """
+        Loads an existing job to resume it. Tracks that were running when the
+        job stopped are pending again, and inputs that are new to the job are
+        added as pending.
+        """
+        manifest = cls(job_dir)
+        if not os.path.isfile(manifest.manifest_path):
+            logging.info(f"No job manifest found in {job_dir}, starting a new job")
+            return cls.create(job_dir, audio_inputs)
+
+        with open(manifest.manifest_path, "r") as f:
+            manifest.tracks = json.load(f)["tracks"]
+        for track in manifest.tracks.values():
+            if track["status"] == DONE and not os.path.isfile(os.path.join(job_dir, track["segments_file"])):
+                track["status"] = PENDING
+            elif track["status"] == RUNNING:
+                track["status"] = PENDING
+        manifest.add_inputs(audio_inputs)
+        manifest.save()
+        return manifest
+
+    @staticmethod
+    def track_id(audio_input: AudioInput) -> str:
+        return hash_key(audio_input.file_path, audio_input.speaker)[:16]
+
+    def add_inputs(self, audio_inputs: List[AudioInput]) -> None:
+        for ainput in audio_inputs:
+            track_id = self.track_id(ainput)
+            if track_id not in self.tracks:
+                self.tracks[track_id] = {
+                    "file_path": ainput.file_path,
+                    "speaker": ainput.speaker,
+                    "status": PENDING,
+                    "segments_file": f"segments-{track_id}.json",
+                }
+
+    def save(self) -> None:
+        write_json_atomic(self.manifest_path, {"tracks": self.tracks})
+
+    def status(self, audio_input: AudioInput) -> str:
+        return self.tracks[self.track_id(audio_input)]["status"]
+
+    def is_done(self, audio_input: AudioInput) -> bool:
+        return self.status(audio_input) == DONE
+
+    def pending(self, audio_inputs: List[AudioInput]) -> List[AudioInput]:
+        """
+        Returns the inputs that still need to be transcribed.
+        """
+        return [ainput for ainput in audio_inputs if not self.is_done(ainput)]
+
+    def mark_running(self, audio_input: AudioInput) -> None:
+        self.tracks[self.track_id(audio_input)]["status"] = RUNNING
+        self.save()
+
+    def mark_pending(self, audio_input: AudioInput) -> None:
+        """
+        Marks a track to be transcribed again, e.g. because its file changed.
+        """
+        self.tracks[self.track_id(audio_input)]["status"] = PENDING
+        self.save()
+
+    def mark_done(self, audio_input: AudioInput, segments: List[Segment]) -> None:
+        track = self.tracks[self.track_id(audio_input)]
+        write_json_atomic(
+            os.path.join(self.job_dir, track["segments_file"]),
+            [asdict(segment) for segment in segments]
+        )
+        track["status"] = DONE
+        self.save()
+
+    def load_segments(self, audio_input: AudioInput) -> List[Segment]:
+        track = self.tracks[self.track_id(audio_input)]
+        if track["status"] != DONE:
+            raise RuntimeError(f"Track {audio_input.file_path} has not finished transcribing")
+        with open(os.path.join(self.job_dir, track["segments_file"]), "r") as f:
+            return [Segment(**segment) for segment in json.load(f)]
@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, Executor, Future
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable
+
+from transcriptly.job_manifest import DONE, PENDING, RUNNING
+
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    job_id: str
+    payload: Any
+    status: str = PENDING
+    result: Any = None
+    error: str = None
+    submitted_at: float = None
+    started_at: float = None
+    finished_at: float = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded queue of background jobs run on an executor. Submitting a job
+    returns straight away with its ID, and a dispatcher thread hands queued
+    jobs to the executor only when one of its workers is free, so jobs wait
+    here rather than in the executor and the queue depth and the number of
+    busy workers are always exact.
+
+    Input:
+        executor: Executor, with `workers` workers that keep their state
+            between jobs, such as Transcribe.create_process_pool
+        fn: Callable, run on the executor with each job's payload
+        workers: int, number of executor workers
+        max_queued: int, jobs waiting beyond this are rejected
+        on_done: Callable, called in this process with (job, result) when a
+            job's fn returns; its return value is stored as the job's result
+        max_finished: int, finished jobs beyond this are forgotten, oldest first
+        create_executor: Callable, returns a new executor to replace one that
+            broke, e.g. a process pool whose worker was killed. Without it a
+            broken executor fails every later job.
+    """
+    def __init__(self, executor: Executor, fn: Callable, workers: int, max_queued: int = 100, on_done: Callable = None, max_finished: int = 1000, create_executor: Callable[[], Executor] = None, clock: Callable[[], float] = time.time):
+        if workers < 1:
+            raise RuntimeError("Job queue needs at least one worker")
+        self.executor = executor
+        self.fn = fn
+        self.workers = workers
+        self.max_queued = max_queued
+        self.on_done = on_done
+        self.max_finished = max_finished
+        self.create_executor = create_executor
+        self.clock = clock
+        self.jobs_submitted = 0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.jobs_rejected = 0
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._queue: queue.Queue = queue.Queue()
+        self._pending = 0
+        self._slots = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._started_at = clock()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="job-queue-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, payload: Any) -> Job:
+        """
+        Queues a job for payload.
+
+        Returns: Job
+        """
+        job = Job(uuid.uuid4().hex, payload, submitted_at=self.clock())
+        with self._lock:
+            if self._pending >= self.max_queued:
+                self.jobs_rejected += 1
+                raise RuntimeError(f"Job queue is full ({self.max_queued} jobs waiting)")
+            self._jobs[job.job_id] = job
+            self._pending += 1
+            self.jobs_submitted += 1
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _dispatch(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._slots.acquire()
+            with self._lock:
+                job.status = RUNNING
+                job.started_at = self.clock()
+                self._pending -= 1
+                self._busy += 1
+            executor = self.executor
+            try:
+                try:
+                    future = executor.submit(self.fn, job.payload)
+                except BrokenExecutor:
+                    # The executor broke since the last job finished
+                    if not self._replace_broken_executor(executor):
+                        raise
+                    executor = self.executor
+                    future = executor.submit(self.fn, job.payload)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(partial(self._finish, job, executor))
+
+    def _replace_broken_executor(self, broken: Executor) -> bool:
+        """
+        Swaps a broken executor for a new one from create_executor. Every job
+        running on a broken executor fails with it, so only the first of them
+        replaces it.
+
+        Returns: bool, whether self.executor can take jobs again
+        """
+        if self.create_executor is None:
+            return False
+        with self._lock:
+            if self.executor is not broken:
+                return True
+            logging.warning("Job queue executor broke, starting a new one")
+            self.executor = self.create_executor()
+        broken.shutdown(wait=False)
+        return True
+
+    def _finish(self, job: Job, executor: Executor, future: Future) -> None:
+        if not future.cancelled() and isinstance(future.exception(), BrokenExecutor):
+            self._replace_broken_executor(executor)
+        try:
+            result = future.result()
+            if self.on_done is not None:
+                result = self.on_done(job, result)
+            status, error = DONE, None
+        except Exception as e:
+            logging.exception(f"Job {job.job_id} failed")
+            result, status, error = None, FAILED, str(e) or type(e).__name__
+        with self._lock:
+            job.result = result
+            job.error = error
+            job.finished_at = self.clock()
+            job.status = status
+            if status == DONE:
+                self.jobs_done += 1
+            else:
+                self.jobs_failed += 1
+            self._busy -= 1
+            self._busy_seconds += job.finished_at - job.started_at
+            self._finished[job.job_id] = None
+            while len(self._finished) > self.max_finished:
+                old_job_id, _ = self._finished.popitem(last=False)
+                self._jobs.pop(old_job_id, None)
+        self._slots.release()
+
+    def stats(self) -> dict:
+        """
+        Returns the queue depth, how many workers are busy, and worker
+        utilisation both right now and as the share of worker time spent on
+        jobs since the queue started.
+        """
+        with self._lock:
+            now = self.clock()
+            # Include the time running jobs have spent so far
+            busy_seconds = self._busy_seconds + sum(
+                now - job.started_at for job in self._jobs.values() if job.status == RUNNING
+            )
+            elapsed = max(now - self._started_at, 1e-9)
+            return {
+                "queue_depth": self._pending,
+                "max_queued": self.max_queued,
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "utilisation": self._busy / self.workers,
+                "average_utilisation": min(busy_seconds / (elapsed * self.workers), 1.0),
+                "jobs_submitted": self.jobs_submitted,
+                "jobs_done": self.jobs_done,
+                "jobs_failed": self.jobs_failed,
+                "jobs_rejected": self.jobs_rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stops the dispatcher after the jobs already queued and shuts down
+        the executor.
+        """
+        self._queue.put(None)
+        if wait:
+            self._dispatcher.join()
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,82 @@
+import logging
+import os
+
+from dataclasses import replace
+from typing import Iterator, List
+
+from transcriptly.data_types import AudioInput, Segment
+from transcriptly.job_manifest import DONE, JobManifest
+from transcriptly.transcribe import Transcribe
+from transcriptly.transcript_writer import OUTPUT_FORMATS, TEXT, read_segments, write_segments
+
+
+def read_tagged_segments(input_file: str, speaker: str = None) -> Iterator[Segment]:
+    """
+    Reads a transcript, giving segments without a speaker the given one.
+    """
+    for segment in read_segments(input_file):
+        yield segment if segment.speaker is not None or speaker is None else replace(segment, speaker=speaker)
+
+def merge_transcripts(input_files: List[str], output_file: str, output_format: str = TEXT, speakers_from_file_names: bool = False) -> int:
+    """
+    Merges per-speaker transcripts into one transcript in start time order,
+    without loading a model.
+
+    Input:
+        input_files: transcripts in any format written by TranscriptWriter
+        output_file: str
+        output_format: str
+        speakers_from_file_names: bool, name the speaker of untagged
+            segments after their file, like Transcribe does for audio files
+
+    Returns: int, the number of segments written
+    """
+    tracks = [
+        read_tagged_segments(path, Transcribe.get_speaker_from_file_path(path) if speakers_from_file_names else None)
+        for path in input_files
+    ]
+    return write_segments(Transcribe.sort_segments(tracks), output_file, output_format)
+
+def merge_job(job_dir: str, output_file: str, output_format: str = TEXT) -> int:
+    """
+    Merges the tracks checkpointed in a multi-file job's manifest into one
+    transcript, e.g. to write a transcript of the tracks that finished
+    before a job stopped.
+
+    Returns: int, the number of segments written
+    """
+    manifest = JobManifest.load(job_dir, [])
+    audio_inputs = [
+        AudioInput(track["file_path"], track["speaker"])
+        for track in manifest.tracks.values() if track["status"] == DONE
+    ]
+    if len(audio_inputs) < len(manifest.tracks):
+        logging.warning(f"{len(manifest.tracks) - len(audio_inputs)} of {len(manifest.tracks)} tracks in {job_dir} are not done and are left out")
+    tracks = [manifest.load_segments(ainput) for ainput in audio_inputs]
+    return write_segments(Transcribe.sort_segments(tracks), output_file, output_format)
+
+
+def main(argv: List[str] = None, prog: str = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Merge per-speaker transcripts, or the finished tracks of a job, into one transcript")
+    parser.add_argument("inputs", type=str, nargs="*", help="Transcripts to merge, in any output format.")
+    parser.add_argument("--job-dir", type=str, help="Merge the finished tracks of this multi-file job instead.")
+    parser.add_argument("--output", type=str, required=True, help="Output file for the merged transcript.")
+    parser.add_argument("--format", type=str, default=TEXT, choices=OUTPUT_FORMATS, help="Output format for the merged transcript.")
+    parser.add_argument("--speakers-from-file-names", action="store_true", help="Name the speaker of untagged segments after their transcript's file name.")
+    args = parser.parse_args(argv)
+
+    if args.job_dir:
+        if not os.path.isfile(os.path.join(args.job_dir, "manifest.json")):
+            raise RuntimeError(f"{args.job_dir} has no job manifest")
+        count = merge_job(args.job_dir, args.output, args.format)
+    elif args.inputs:
+        count = merge_transcripts(args.inputs, args.output, args.format, args.speakers_from_file_names)
+    else:
+        parser.error("Give transcripts to merge or --job-dir")
+    logging.info(f"Wrote {count} segments to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from transcriptly.instrumentation import stage
+
+
+def default_device() -> str:
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+# Ends the pool name of a model with int8 linear layers, e.g. "small-int8"
+INT8_SUFFIX = "-int8"
+
+def load_whisper_model(model_name: str, device: str) -> Any:
+    import whisper
+
+    if model_name.endswith(INT8_SUFFIX):
+        return quantize_dynamic_int8(load_whisper_model(model_name[:-len(INT8_SUFFIX)], device))
+    return whisper.load_model(model_name, device=device)
+
+def quantize_dynamic_int8(model) -> Any:
+    """
+    Converts the linear layers of a Whisper model on the CPU to dynamic int8
+    quantization: their weights are stored as int8 and each input is
+    quantized on the fly, so the matrix multiplies that take most of
+    Whisper's time run on int8 kernels. The model is changed in place.
+
+    Whisper's Linear only differs from nn.Linear by casting its weights to
+    the input's dtype, which does nothing for float32 on the CPU, so its
+    layers are turned into nn.Linear first for quantize_dynamic to find
+    them.
+    """
+    import warnings
+
+    import torch
+    import whisper
+
+    if next(model.parameters()).device.type != "cpu":
+        raise RuntimeError("Int8 quantized models only run on the CPU")
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    with warnings.catch_warnings():
+        # Eager mode quantization is deprecated in favour of torchao, which
+        # isn't a dependency
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def model_size_in_bytes(model) -> int:
+    """
+    Estimates the memory used by a torch model from its parameters and
+    buffers, and the packed weights of its quantized layers.
+    """
+    size = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        size += tensor.numel() * tensor.element_size()
+    for module in model.modules():
+        # Quantized linear layers keep their weights outside of parameters()
+        weight_bias = getattr(module, "_weight_bias", None)
+        if callable(weight_bias):
+            for tensor in weight_bias():
+                if tensor is not None:
+                    size += tensor.numel() * tensor.element_size()
+    return size
+
+
+class ModelPool:
+    """
+    Registry of loaded models keyed by model name and device. Models are
+    loaded once and shared by every caller in the process. When max_bytes is
+    set, the least recently used models are evicted to keep the total size
+    under the cap. The model that was just requested is never evicted, even
+    if it is bigger than the cap on its own.
+    """
+    max_bytes: int = None
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __init__(self, max_bytes: int = None, loader: Callable[[str, str], Any] = None, size_of: Callable[[Any], int] = None):
+        self.max_bytes = max_bytes
+        self.loader = loader or load_whisper_model
+        self.size_of = size_of or model_size_in_bytes
+        self._models: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        # Held while loading so that concurrent callers don't load the same
+        # model twice.
+        self._lock = threading.RLock()
+
+    def get(self, model_name: str, device: str = None) -> Any:
+        """
+        Returns the model for model_name on device, loading it on a miss.
+        """
+        if device is None:
+            device = default_device()
+        key = (model_name, device)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                logging.debug(f"Model pool hit for {model_name} on {device}")
+                return self._models[key][0]
+
+            self.misses += 1
+            logging.info(f"Loading \"{model_name}\" model on {device}...")
+            with stage("model_load", model=model_name, device=device):
+                model = self.loader(model_name, device)
+            self._models[key] = (model, self.size_of(model))
+            self._evict()
+            return model
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        while len(self._models) > 1 and self.total_bytes > self.max_bytes:
+            (model_name, device), _ = self._models.popitem(last=False)
+            self.evictions += 1
+            logging.info(f"Evicted \"{model_name}\" model on {device} from the model pool")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self._models.values())
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._models
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "models": len(self._models),
+            "total_bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_default_pool: ModelPool = None
+_default_pool_lock = threading.Lock()
+
+def get_default_pool() -> ModelPool:
+    """
+    Returns the process-wide model pool. Its memory cap is read from the
+    TRANSCRIPTION_MODEL_POOL_MAX_MB environment variable; no cap when unset.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            max_mb = os.environ.get("TRANSCRIPTION_MODEL_POOL_MAX_MB")
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else None
+            _default_pool = ModelPool(max_bytes=max_bytes)
+        return _default_pool
+
+def get_model(model_name: str, device: str = None) -> Any:
+    """
+    Returns a shared Whisper model from the process-wide model pool.
+    """
+    return get_default_pool().get(model_name, device)
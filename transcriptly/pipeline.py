@@ -0,0 +1,135 @@
+"""
+Transcribes and summarizes in one pass. Segments are written to the
+transcript and handed to the summarizer as each window of audio is
+transcribed, and every slice of the transcript is summarized as soon as it
+fills up, so summarizing runs alongside transcribing instead of after it
+and the whole run takes about as long as the longer of the two.
+"""
+import logging
+import os
+
+from typing import Iterator, List
+
+from transcriptly.instrumentation import get_tracer
+from transcriptly.transcribe import AudioInput, Transcribe
+from transcriptly.transcript_writer import OUTPUT_FORMATS, TEXT, TranscriptWriter, format_text_line
+
+
+def stream_transcript_lines(transcribe: Transcribe, audio_inputs: List[AudioInput], writer: TranscriptWriter = None) -> Iterator[str]:
+    """
+    Transcribes the audio inputs into a single stream of transcript lines
+    in start time order, writing each segment to writer as it arrives. The
+    tracks are merged with Transcribe.sort_segments, which pulls from each
+    track's stream as the merge needs it.
+
+    Input:
+        transcribe: Transcribe
+        audio_inputs: List[AudioInput]
+        writer: TranscriptWriter, or None to not write a transcript
+
+    Returns: Iterator[str], lines as written by format_text_line
+    """
+    if not audio_inputs:
+        raise RuntimeError("No audio files to transcribe")
+    streams = [transcribe.transcribe_stream(audio_input) for audio_input in audio_inputs]
+    segments = streams[0] if len(streams) == 1 else Transcribe.sort_segments(streams)
+    for segment in segments:
+        if writer is not None:
+            writer.write(segment)
+        yield format_text_line(segment)
+
+
+def main(argv: List[str] = None, prog: str = None) -> None:
+    import argparse
+
+    import summarize
+
+    parser = argparse.ArgumentParser(prog=prog, description="Transcribe audio and summarize it with GPT while it is being transcribed")
+    parser.add_argument("--input", type=str, required=True, help="Input audio file, inputs JSON file, or directory. Speaker names are extracted from the file names for a directory.")
+    parser.add_argument("--output", type=str, required=True, help="Output file for the transcription.")
+    parser.add_argument("--summary", type=str, default="./output_summary.txt", help="Output file for the summary.")
+    parser.add_argument("--format", type=str, default=TEXT, choices=OUTPUT_FORMATS, help="Output format for the transcription.")
+    parser.add_argument("--speaker", type=str, help="Speaker name for a single audio file.")
+    parser.add_argument("--remove-duplicates", action="store_true", help="Remove repeated segments from each track.")
+    parser.add_argument("--dedup-window", type=int, default=1, help="Number of previous segments a segment is compared with when removing duplicates.")
+    parser.add_argument("--dedup-similarity", type=float, help="Also remove segments at least this similar (0 to 1) to a recent one, for repetition loops.")
+    parser.add_argument("--window-seconds", type=float, default=Transcribe.stream_window_seconds, help="Seconds of audio transcribed at a time. Shorter windows get segments to the summarizer sooner.")
+    parser.add_argument("--window-overlap", type=float, default=10.0, help="Seconds of overlap between windows.")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write cached transcriptions or summaries.")
+    parser.add_argument("--config", type=str, default=".env", help="Path to .env file with the summarization settings.")
+    parser.add_argument("--trace", type=str, help="Write per-stage timings to this JSON file.")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        get_tracer().enabled = True
+
+    config = summarize.load_config(args.config)
+    summarize.MAX_LINES_PER_TRANSCRIPT = config["MAX_LINES_PER_TRANSCRIPT"]
+    rate_limiter = summarize.RateLimiter(config["REQUESTS_PER_MINUTE"], config["TOKENS_PER_MINUTE"])
+    summary_cache = None if args.no_cache else summarize.SummaryCache(config["SUMMARY_CACHE_DIR"])
+
+    transcribe = Transcribe(
+        service_name=os.environ.get("TRANSCRIPTION_SERVICE", "whisper"),
+        model_name=os.environ.get("TRANSCRIPTION_MODEL", "tiny"),
+        remove_duplicates=args.remove_duplicates,
+        dedup_window=args.dedup_window,
+        dedup_similarity=args.dedup_similarity,
+        window_seconds=args.window_seconds,
+        window_overlap=args.window_overlap,
+        cache_dir=os.environ.get("TRANSCRIPTION_CACHE_DIR", "cache/transcriptions"),
+        cache_max_bytes=int(float(os.environ.get("TRANSCRIPTION_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+        use_cache=not args.no_cache
+    )
+    audio_inputs = Transcribe.audio_inputs_from_path(args.input, args.speaker)
+    if not audio_inputs:
+        raise RuntimeError(f"No audio or video files found in {args.input}")
+    logging.info(f"Transcribing and summarizing {len(audio_inputs)} audio files...")
+
+    with TranscriptWriter(args.output, args.format) as writer:
+        summaries = summarize.create_summaries_from_stream(
+            stream_transcript_lines(transcribe, audio_inputs, writer),
+            config["SLICE_SYSTEM_DIRECTIVE"],
+            config["SLICE_PROMPT"],
+            max_tokens=config["MAX_TOKENS_PER_SLICE"],
+            overlap_tokens=config["SLICE_OVERLAP_TOKENS"],
+            by_speaker_turn=config["SLICE_BY_SPEAKER_TURN"],
+            max_workers=config["SUMMARY_WORKERS"],
+            rate_limiter=rate_limiter,
+            max_retries=config["MAX_RETRIES"],
+            summary_cache=summary_cache
+        )
+    logging.info(f"Transcription written to {args.output}")
+
+    if config["SUMMARY_MAX_TOKENS"]:
+        finished_summary = summarize.reduce_summaries(
+            summaries,
+            config["SUMMARY_SYSTEM_DIRECTIVE"],
+            config["SUMMARY_PROMPT"],
+            config["SUMMARY_MAX_TOKENS"],
+            fan_in=config["SUMMARY_FAN_IN"],
+            max_depth=config["SUMMARY_MAX_DEPTH"],
+            max_workers=config["SUMMARY_WORKERS"],
+            rate_limiter=rate_limiter,
+            max_retries=config["MAX_RETRIES"],
+            summary_cache=summary_cache
+        )
+    else:
+        finished_summary = summarize.summarize_all_summaries(
+            summaries,
+            config["SUMMARY_SYSTEM_DIRECTIVE"],
+            config["SUMMARY_PROMPT"],
+            rate_limiter=rate_limiter,
+            max_retries=config["MAX_RETRIES"],
+            summary_cache=summary_cache
+        )
+
+    with open(args.summary, "w") as f:
+        logging.info(f"Writing summary to {args.summary}")
+        f.write(finished_summary)
+
+    if args.trace:
+        get_tracer().write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import logging
+import random
+import threading
+import time
+
+from typing import Callable, Tuple, Type
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Holds up to capacity tokens and refills
+    continuously at refill_per_second. acquire() blocks until enough tokens
+    are available. Requests bigger than the whole bucket are clamped to its
+    capacity so that they can still go through once it is full.
+    """
+    capacity: float
+    refill_per_second: float
+
+    def __init__(self, capacity: float, refill_per_second: float, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.refill_per_second
+            self.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Limits API calls to a number of requests and a number of tokens per
+    minute. Either limit can be left as None to not enforce it.
+    """
+    def __init__(self, requests_per_minute: int = None, tokens_per_minute: int = None, **kwargs):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60, **kwargs) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60, **kwargs) if tokens_per_minute else None
+
+    @property
+    def limits_tokens(self) -> bool:
+        return self.tokens is not None
+
+    def acquire(self, tokens: int = 0) -> None:
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            self.tokens.acquire(tokens)
+
+
+def backoff_delay(attempt: int, base_delay: float = 1, max_delay: float = 60) -> float:
+    """
+    Exponential backoff with full jitter: a random delay between 0 and
+    base_delay * 2^attempt, capped at max_delay.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+def retry_with_backoff(fn: Callable, max_retries: int = 5, retry_on: Tuple[Type[BaseException], ...] = (Exception,), base_delay: float = 1, max_delay: float = 60, sleep: Callable[[float], None] = time.sleep):
+    """
+    Calls fn, retrying up to max_retries times with exponential backoff when
+    it raises one of retry_on. The last error is raised once the retries are
+    used up.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            attempt += 1
+            logging.info(f"Ran into error ({e}), retry {attempt} of {max_retries} in {delay:.2f} seconds")
+            sleep(delay)
@@ -0,0 +1,542 @@
+import json
+import logging
+import math
+import os
+import re
+import shutil
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from transcriptly.cache import hash_file
+from transcriptly.dedup import TEXT_SEPARATOR
+from transcriptly.job_manifest import write_json_atomic
+from transcriptly.transcript_writer import BINARY_HEADER, read_segment_at, read_segments_with_offsets
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+# Also matches the separators between joined texts, see tokenize_texts
+SEPARATED_TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*|" + TEXT_SEPARATOR)
+# One row per indexed segment. Times are in milliseconds, length is the
+# number of tokens in the segment and offset is where the segment starts in
+# its transcript file.
+SEGMENT_DTYPE = np.dtype([
+    ("session", "<u4"),
+    ("start_ms", "<u4"),
+    ("end_ms", "<u4"),
+    ("speaker", "<u4"),
+    ("length", "<u2"),
+    ("offset", "<u8"),
+])
+NO_SPEAKER = np.iinfo(np.uint32).max
+# Parts are merged into one once there are more than this many
+MAX_PARTS = 8
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase words, keeping contractions like "let's"
+    together.
+    """
+    return TOKEN_PATTERN.findall(text.lower().replace("’", "'"))
+
+
+def tokenize_texts(texts: List[str]) -> List[str]:
+    """
+    Tokenizes every text like tokenize, in a single pass over the joined
+    texts. The tokens of consecutive texts are separated by TEXT_SEPARATOR.
+    """
+    if not texts:
+        return []
+    joined = TEXT_SEPARATOR.join(texts)
+    if joined.count(TEXT_SEPARATOR) != len(texts) - 1:
+        joined = TEXT_SEPARATOR.join(text.replace(TEXT_SEPARATOR, " ") for text in texts)
+    return SEPARATED_TOKEN_PATTERN.findall(joined.lower().replace("’", "'"))
+
+
+@dataclass
+class SearchHit:
+    session: str
+    speaker: Optional[str]
+    start_ms: int
+    end_ms: int
+    score: float
+    offset: int
+
+
+class IndexPart:
+    """
+    One immutable piece of the index, written by a single update. Every file
+    is a .npy array opened memory-mapped, so opening a part costs nothing
+    and a query only reads the pages of the terms it looks up:
+
+        terms.npy: the part's terms as sorted UTF-8 bytes, for binary search
+        offsets.npy: where each term's postings start, plus the end
+        postings.npy: segment rows containing each term, grouped by term
+        frequencies.npy: times the term is in each of those segments
+        segments.npy: one SEGMENT_DTYPE row per segment
+        meta.json: the transcript path of each session and the speakers
+    """
+    def __init__(self, part_dir: str):
+        self.part_dir = part_dir
+        self.name = os.path.basename(part_dir)
+        self.terms = np.load(os.path.join(part_dir, "terms.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(part_dir, "offsets.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(part_dir, "postings.npy"), mmap_mode="r")
+        self.frequencies = np.load(os.path.join(part_dir, "frequencies.npy"), mmap_mode="r")
+        self.segments = np.load(os.path.join(part_dir, "segments.npy"), mmap_mode="r")
+        with open(os.path.join(part_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.sessions: List[str] = meta["sessions"]
+        self.speakers: List[str] = meta["speakers"]
+
+    def lookup(self, term: bytes):
+        """
+        Returns: (segment rows, term frequencies) of the segments containing term
+        """
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.postings[start:end], self.frequencies[start:end]
+
+    @staticmethod
+    def write(part_dir: str, vocabulary: List[bytes], term_ids: np.ndarray, rows: np.ndarray, frequencies: np.ndarray, segments: np.ndarray, sessions: List[str], speakers: List[str]) -> None:
+        """
+        Writes a part from one (term id, segment row, frequency) entry per
+        posting, in any order, where term ids index into vocabulary. The
+        part is written to a temporary directory and renamed into place, so
+        a stopped update never leaves half a part behind.
+        """
+        terms = np.array(vocabulary, dtype=bytes)
+        term_order = np.argsort(terms, kind="stable")
+        terms = terms[term_order]
+        # Rank of each term id in the sorted terms
+        ranks = np.empty(len(term_order), dtype=np.int64)
+        ranks[term_order] = np.arange(len(term_order))
+        term_ids = ranks[term_ids]
+        order = np.lexsort((rows, term_ids))
+        term_ids = term_ids[order]
+        offsets = np.searchsorted(term_ids, np.arange(len(terms) + 1)).astype(np.int64)
+
+        tmp_dir = f"{part_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "terms.npy"), terms)
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp_dir, "postings.npy"), rows[order].astype(np.uint32))
+        np.save(os.path.join(tmp_dir, "frequencies.npy"), frequencies[order].astype(np.uint16))
+        np.save(os.path.join(tmp_dir, "segments.npy"), segments)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"sessions": sessions, "speakers": speakers}, f)
+        os.replace(tmp_dir, part_dir)
+
+
+class TranscriptIndex:
+    """
+    Inverted index over a directory of transcripts, to find who said
+    something, when, and in which session without reading every transcript.
+    Each term maps to the segments it appears in; each segment records its
+    session (transcript file), speaker and start and end time.
+
+    The index is updated incrementally. A manifest records the modification
+    time, size and hash of every transcript it has indexed, and an update
+    only indexes transcripts that are new or whose contents changed, into a
+    new part. The copies of changed or deleted transcripts in older parts
+    are left out of results until the parts are merged, which happens once
+    there are more than MAX_PARTS of them.
+
+    Hits are ranked by BM25 over segments.
+    """
+    index_dir: str
+    manifest_path: str
+    sessions: Dict[str, dict]
+    parts: List[IndexPart]
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.manifest_path = os.path.join(index_dir, "manifest.json")
+        os.makedirs(index_dir, exist_ok=True)
+        self.next_part = 0
+        self.sessions = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            self.next_part = manifest["next_part"]
+            self.sessions = manifest["sessions"]
+            part_names = manifest["parts"]
+        else:
+            part_names = []
+        self.parts = [IndexPart(os.path.join(index_dir, name)) for name in part_names]
+        self._find_live_sessions()
+
+    def _find_live_sessions(self) -> None:
+        # Sessions of each part still in the manifest; the others were
+        # indexed again in a newer part or deleted
+        live = {part.name: np.zeros(len(part.sessions), dtype=bool) for part in self.parts}
+        for session in self.sessions.values():
+            live[session["part"]][session["session"]] = True
+        self._live_sessions = live
+
+    def save(self) -> None:
+        write_json_atomic(self.manifest_path, {
+            "next_part": self.next_part,
+            "parts": [part.name for part in self.parts],
+            "sessions": self.sessions,
+        })
+
+    def _is_unchanged(self, path: str, stat: os.stat_result) -> bool:
+        indexed = self.sessions.get(path)
+        if indexed is None:
+            return False
+        if indexed["mtime_ns"] == stat.st_mtime_ns and indexed["size"] == stat.st_size:
+            return True
+        # Touched but not changed
+        if indexed["size"] == stat.st_size and indexed["hash"] == hash_file(path):
+            indexed["mtime_ns"] = stat.st_mtime_ns
+            return True
+        return False
+
+    def update(self, transcript_paths: Iterable[str]) -> dict:
+        """
+        Indexes the transcripts that are new or changed since they were last
+        indexed, and drops indexed transcripts that no longer exist.
+
+        Input:
+            transcript_paths: transcript files in any format written by
+                TranscriptWriter
+
+        Returns: dict with the number of transcripts indexed, unchanged and removed
+        """
+        changed = []
+        unchanged = 0
+        for path in dict.fromkeys(os.path.abspath(path) for path in transcript_paths):
+            stat = os.stat(path)
+            if self._is_unchanged(path, stat):
+                unchanged += 1
+            else:
+                changed.append((path, stat))
+        removed = [path for path in self.sessions if not os.path.exists(path)]
+        for path in removed:
+            del self.sessions[path]
+
+        skipped = 0
+        if changed:
+            part_name = f"part-{self.next_part:06d}"
+            indexed = self._index_transcripts(part_name, changed)
+            skipped = len(changed) - indexed
+            if indexed:
+                self.next_part += 1
+                self.parts.append(IndexPart(os.path.join(self.index_dir, part_name)))
+        self._find_live_sessions()
+        if len(self.parts) > MAX_PARTS:
+            self.merge()
+        else:
+            self.save()
+            self._remove_dead_parts()
+        logging.info(f"Indexed {len(changed) - skipped} transcripts, {unchanged} unchanged, {len(removed)} removed, {skipped} skipped")
+        return {"indexed": len(changed) - skipped, "unchanged": unchanged, "removed": len(removed), "skipped": skipped}
+
+    def _index_transcripts(self, part_name: str, transcripts: list) -> int:
+        """
+        Writes an index part for the transcripts. A file that can't be read
+        as a transcript, such as a plain text file that happens to be in a
+        transcript folder, is logged and left out of the index.
+
+        Returns: int, number of transcripts indexed
+        """
+        speakers: Dict[str, int] = {}
+        # The separator between segments' tokens is term 0
+        vocabulary: Dict[str, int] = {TEXT_SEPARATOR: 0}
+        all_term_ids, all_rows, all_segments = [], [], []
+        sessions = []
+        row_count = 0
+        for path, stat in transcripts:
+            try:
+                file_segments = list(read_segments_with_offsets(path))
+            except (RuntimeError, ValueError, TypeError) as e:
+                logging.warning(f"Skipping {path}, it isn't a readable transcript: {e}")
+                # An earlier version of the file may have been indexed
+                self.sessions.pop(path, None)
+                continue
+            session_id = len(sessions)
+            file_hash = hash_file(path)
+            offsets, start_times, end_times, speaker_ids, texts = [], [], [], [], []
+            for offset, segment in file_segments:
+                offsets.append(offset)
+                start_times.append(segment.start_time)
+                end_times.append(segment.end_time)
+                speaker_ids.append(NO_SPEAKER if segment.speaker is None else speakers.setdefault(segment.speaker, len(speakers)))
+                texts.append(segment.text)
+
+            term_ids = np.array([vocabulary.setdefault(token, len(vocabulary)) for token in tokenize_texts(texts)], dtype=np.int64)
+            separators = term_ids == 0
+            rows = row_count + np.cumsum(separators)[~separators]
+            term_ids = term_ids[~separators]
+            lengths = np.bincount(rows - row_count, minlength=len(texts))
+
+            segments = np.zeros(len(texts), dtype=SEGMENT_DTYPE)
+            segments["session"] = session_id
+            segments["start_ms"] = np.round(np.array(start_times, dtype=np.float64) * 1000)
+            segments["end_ms"] = np.round(np.array(end_times, dtype=np.float64) * 1000)
+            segments["speaker"] = speaker_ids
+            segments["length"] = np.minimum(lengths, 0xFFFF)
+            segments["offset"] = offsets
+            all_segments.append(segments)
+            all_term_ids.append(term_ids)
+            all_rows.append(rows)
+            row_count += len(texts)
+            segment_count, token_count = len(texts), len(term_ids)
+            sessions.append(path)
+            self.sessions[path] = {
+                "part": part_name,
+                "session": session_id,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": file_hash,
+                "segments": segment_count,
+                "tokens": token_count,
+            }
+
+        if not sessions:
+            return 0
+
+        # A term repeated in a segment is one posting with its count
+        term_ids = np.concatenate(all_term_ids)
+        rows = np.concatenate(all_rows)
+        _, first, counts = np.unique(term_ids * max(row_count, 1) + rows, return_index=True, return_counts=True)
+        IndexPart.write(
+            os.path.join(self.index_dir, part_name),
+            [term.encode("utf-8") for term in list(vocabulary)[1:]],
+            term_ids[first] - 1,
+            rows[first],
+            np.minimum(counts, 0xFFFF),
+            np.concatenate(all_segments),
+            sessions,
+            list(speakers)
+        )
+        return len(sessions)
+
+    def merge(self) -> None:
+        """
+        Merges every part into one, leaving out the sessions that are no
+        longer live. Works from the parts alone, without reading the
+        transcripts again.
+        """
+        part_name = f"part-{self.next_part:06d}"
+        self.next_part += 1
+        speakers: Dict[str, int] = {}
+        sessions: List[str] = []
+        vocabulary = np.unique(np.concatenate([np.asarray(part.terms) for part in self.parts])) if self.parts else np.empty(0, dtype=bytes)
+        all_terms, all_rows, all_frequencies, all_segments = [], [], [], []
+        row_count = 0
+        for part in self.parts:
+            live = self._live_sessions[part.name]
+            segments = np.array(part.segments)
+            live_rows = live[segments["session"]] if len(segments) else np.zeros(0, dtype=bool)
+            # New row number of each of the part's live segments
+            new_rows = np.full(len(segments), -1, dtype=np.int64)
+            new_rows[live_rows] = row_count + np.arange(int(live_rows.sum()))
+            row_count += int(live_rows.sum())
+
+            new_sessions = np.full(len(part.sessions), -1, dtype=np.int64)
+            for session_id in np.flatnonzero(live).tolist():
+                path = part.sessions[session_id]
+                new_sessions[session_id] = len(sessions)
+                sessions.append(path)
+                self.sessions[path]["part"] = part_name
+                self.sessions[path]["session"] = int(new_sessions[session_id])
+            new_speakers = np.array([speakers.setdefault(speaker, len(speakers)) for speaker in part.speakers] + [NO_SPEAKER], dtype=np.int64)
+
+            segments = segments[live_rows]
+            segments["session"] = new_sessions[segments["session"]]
+            speaker_ids = segments["speaker"].astype(np.int64)
+            speaker_ids[speaker_ids == NO_SPEAKER] = len(part.speakers)
+            segments["speaker"] = new_speakers[speaker_ids]
+            all_segments.append(segments)
+
+            term_counts = np.diff(np.asarray(part.offsets))
+            posting_rows = new_rows[np.asarray(part.postings, dtype=np.int64)]
+            keep = posting_rows >= 0
+            part_term_ids = np.searchsorted(vocabulary, np.asarray(part.terms))
+            all_terms.append(np.repeat(part_term_ids, term_counts)[keep])
+            all_rows.append(posting_rows[keep])
+            all_frequencies.append(np.asarray(part.frequencies)[keep])
+
+        IndexPart.write(
+            os.path.join(self.index_dir, part_name),
+            vocabulary.tolist(),
+            np.concatenate(all_terms) if all_terms else np.empty(0, dtype=np.int64),
+            np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.int64),
+            np.concatenate(all_frequencies) if all_frequencies else np.empty(0, dtype=np.uint16),
+            np.concatenate(all_segments) if all_segments else np.empty(0, dtype=SEGMENT_DTYPE),
+            sessions,
+            list(speakers)
+        )
+        old_parts = self.parts
+        self.parts = [IndexPart(os.path.join(self.index_dir, part_name))]
+        self._find_live_sessions()
+        self.save()
+        for part in old_parts:
+            shutil.rmtree(part.part_dir, ignore_errors=True)
+        logging.info(f"Merged {len(old_parts)} index parts into {part_name}")
+
+    def _remove_dead_parts(self) -> None:
+        dead = [part for part in self.parts if not self._live_sessions[part.name].any()]
+        if not dead:
+            return
+        self.parts = [part for part in self.parts if self._live_sessions[part.name].any()]
+        self.save()
+        for part in dead:
+            shutil.rmtree(part.part_dir, ignore_errors=True)
+
+    def search(self, query: str, limit: int = 10, speaker: str = None) -> List[SearchHit]:
+        """
+        Returns the segments best matching the words of query, most relevant
+        first. A segment matches if it contains any of the words; segments
+        containing more of them, or rarer ones, rank higher.
+
+        Input:
+            query: str
+            limit: int, maximum number of hits
+            speaker: str, only return segments by this speaker
+
+        Returns: List[SearchHit]
+        """
+        terms = [term.encode("utf-8") for term in dict.fromkeys(tokenize(query))]
+        segment_count = sum(session["segments"] for session in self.sessions.values())
+        if not terms or not segment_count or limit < 1:
+            return []
+        average_length = max(sum(session["tokens"] for session in self.sessions.values()) / segment_count, 1)
+
+        # Live postings of each term in each part
+        matches = []
+        for term in terms:
+            term_matches = []
+            for part_index, part in enumerate(self.parts):
+                rows, frequencies = part.lookup(term)
+                if not len(rows):
+                    continue
+                if speaker is not None and speaker not in part.speakers:
+                    continue
+                rows = np.asarray(rows, dtype=np.int64)
+                segments = part.segments[rows]
+                live = self._live_sessions[part.name][segments["session"]]
+                if speaker is not None:
+                    live &= segments["speaker"] == part.speakers.index(speaker)
+                term_matches.append((part_index, rows[live], np.asarray(frequencies)[live], segments["length"][live]))
+            matches.append(term_matches)
+
+        keys, scores = [], []
+        for term_matches in matches:
+            document_frequency = sum(len(rows) for _, rows, _, _ in term_matches)
+            if not document_frequency:
+                continue
+            idf = math.log(1 + (segment_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            for part_index, rows, frequencies, lengths in term_matches:
+                frequencies = frequencies.astype(np.float64)
+                norm = K1 * (1 - B + B * lengths / average_length)
+                keys.append((part_index << 32) + rows)
+                scores.append(idf * frequencies * (K1 + 1) / (frequencies + norm))
+        if not keys:
+            return []
+
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        totals = np.zeros(len(keys))
+        np.add.at(totals, inverse, np.concatenate(scores))
+        # Best first, then by session and time for equal scores
+        if len(keys) > limit:
+            best = np.argpartition(-totals, limit - 1)[:limit]
+        else:
+            best = np.arange(len(keys))
+        hits = []
+        for key, score in zip(keys[best].tolist(), totals[best].tolist()):
+            part = self.parts[key >> 32]
+            row = part.segments[key & 0xFFFFFFFF]
+            speaker_id = int(row["speaker"])
+            hits.append(SearchHit(
+                session=part.sessions[int(row["session"])],
+                speaker=part.speakers[speaker_id] if speaker_id != NO_SPEAKER else None,
+                start_ms=int(row["start_ms"]),
+                end_ms=int(row["end_ms"]),
+                score=score,
+                offset=int(row["offset"]),
+            ))
+        hits.sort(key=lambda hit: (-hit.score, hit.session, hit.start_ms))
+        return hits
+
+    @staticmethod
+    def read_text(hit: SearchHit) -> str:
+        """
+        Reads the text of a hit's segment from its transcript.
+        """
+        return read_segment_at(hit.session, hit.offset).text
+
+
+def find_transcripts(paths: Iterable[str], extensions=(".txt", ".jsonl", ".bin")) -> List[str]:
+    """
+    Expands directories into the transcript files under them: files with
+    one of extensions or starting with the binary transcript header.
+    """
+    transcripts = []
+    for path in paths:
+        if not os.path.isdir(path):
+            transcripts.append(path)
+            continue
+        for root, _, file_names in os.walk(path):
+            for file_name in sorted(file_names):
+                file_path = os.path.join(root, file_name)
+                if os.path.splitext(file_name)[1] in extensions:
+                    transcripts.append(file_path)
+                    continue
+                with open(file_path, "rb") as f:
+                    if f.read(len(BINARY_HEADER)) == BINARY_HEADER:
+                        transcripts.append(file_path)
+    return transcripts
+
+
+def format_milliseconds(milliseconds: int) -> str:
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def main(argv: List[str] = None, prog: str = None) -> None:
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog=prog, description="Index transcripts and search them")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index_parser = subparsers.add_parser("index", help="Index new and changed transcripts.")
+    index_parser.add_argument("index_dir", type=str, help="Directory of the index.")
+    index_parser.add_argument("paths", type=str, nargs="+", help="Transcript files or directories of transcripts.")
+    index_parser.add_argument("--merge", action="store_true", help="Merge the index into a single part afterwards.")
+    search_parser = subparsers.add_parser("search", help="Search the index.")
+    search_parser.add_argument("index_dir", type=str, help="Directory of the index.")
+    search_parser.add_argument("query", type=str, help="Words to search for.")
+    search_parser.add_argument("--limit", type=int, default=10, help="Maximum number of hits.")
+    search_parser.add_argument("--speaker", type=str, help="Only return segments by this speaker.")
+    search_parser.add_argument("--json", action="store_true", help="Print the hits as JSON lines.")
+    args = parser.parse_args(argv)
+
+    index = TranscriptIndex(args.index_dir)
+    if args.command == "index":
+        index.update(find_transcripts(args.paths))
+        if args.merge and len(index.parts) > 1:
+            index.merge()
+    else:
+        for hit in index.search(args.query, args.limit, args.speaker):
+            text = TranscriptIndex.read_text(hit)
+            if args.json:
+                print(json.dumps({**hit.__dict__, "text": text}))
+            else:
+                print(f"{hit.score:6.2f}  {os.path.basename(hit.session)}  [{format_milliseconds(hit.start_ms)}] {hit.speaker or ''}:{text}")
+
+
+if __name__ == "__main__":
+    main()
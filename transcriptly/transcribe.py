@@ -1,13 +1,29 @@
+import heapq
 import json
 import mimetypes
 import os
 import logging
+import multiprocessing
 
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache, partial
+from typing import Iterable, Iterator, List, Tuple, Union
 
+import numpy as np
+
+from transcriptly.cache import TranscriptionCache
+from transcriptly.dedup import find_cross_track_bleed, remove_repeated_segments, remove_repeated_segments_stream
+from transcriptly.instrumentation import get_tracer, run_traced, serve_metrics, stage
+from transcriptly.job_manifest import JobManifest
+from transcriptly.transcript_writer import OUTPUT_FORMATS, TEXT, write_segments
+from transcriptly.vad import SAMPLE_RATE, segment_loudness
+from transcriptly.windowing import plan_windows, reconcile_windows
 from transcriptly.transcribe_services.transcribe_service import TranscribeService
-from transcriptly.data_types import AudioInput, Segment
+from transcriptly.data_types import AudioInput, Segment, SegmentTable, TranscriptionResult
+
 
+# Seconds between checks for tracks the pool workers have started
+STARTED_POLL_SECONDS = 1.0
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -18,8 +34,22 @@ logging.basicConfig(
 class Transcribe:
     service_name: str
     model_name: str
-    transcription_service: TranscribeService
+    transcription_service: TranscribeService = None
     remove_duplicates: bool = False
+    dedup_window: int = 1
+    dedup_similarity: float = None
+    remove_bleed: bool = False
+    bleed_similarity: float = None
+    workers: int = 1
+    # Torch threads per process for CPU inference
+    threads: int = None
+    columnar: bool = False
+    vad: bool = False
+    window_seconds: float = None
+    window_overlap: float = 10.0
+    # Window length when streaming without window_seconds set
+    stream_window_seconds: float = 120.0
+    transcription_cache: TranscriptionCache = None
 
     def __init__(self, service_name, **kwargs):
         self.service_name: str = service_name
@@ -32,6 +62,75 @@ class Transcribe:
         if "remove_duplicates" in kwargs and kwargs.get("remove_duplicates") == True:
             self.remove_duplicates = True
 
+        # How far back duplicates are looked for, and how alike two segments
+        # must be to count as duplicates when they aren't the same text
+        if kwargs.get("dedup_window") is not None:
+            self.dedup_window = int(kwargs["dedup_window"])
+            if self.dedup_window < 1:
+                raise RuntimeError("Duplicate window must be at least 1")
+        if kwargs.get("dedup_similarity") is not None:
+            self.dedup_similarity = float(kwargs["dedup_similarity"])
+
+        # Drop the copy of a segment that one speaker's mic picked up from
+        # another's, keeping the louder track's
+        if kwargs.get("remove_bleed") == True:
+            self.remove_bleed = True
+        if kwargs.get("bleed_similarity") is not None:
+            self.bleed_similarity = float(kwargs["bleed_similarity"])
+
+        # Keep segments in SegmentTables instead of lists of Segment objects
+        if kwargs.get("columnar") == True:
+            self.columnar = True
+
+        # Cut long silences out of each track before it is transcribed
+        if kwargs.get("vad") == True:
+            self.vad = True
+
+        # Split long files into overlapping windows that are transcribed in parallel
+        if kwargs.get("window_seconds"):
+            self.window_seconds = float(kwargs["window_seconds"])
+        if kwargs.get("window_overlap") is not None:
+            self.window_overlap = float(kwargs["window_overlap"])
+
+        if kwargs.get("workers") is not None:
+            self.workers = int(kwargs["workers"])
+            if self.workers < 1:
+                raise RuntimeError("Number of workers must be at least 1")
+
+        # Each worker process gets an equal share of the cores unless the
+        # thread count is given, so that workers don't fight over them
+        if kwargs.get("threads") is not None:
+            self.threads = int(kwargs["threads"])
+            if self.threads < 1:
+                raise RuntimeError("Number of threads must be at least 1")
+        else:
+            self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        # Cached transcriptions are only used when a cache directory is given
+        # and use_cache hasn't been turned off.
+        self.cache_dir = kwargs.get("cache_dir")
+        self.cache_max_bytes = kwargs.get("cache_max_bytes")
+        if self.cache_dir and kwargs.get("use_cache", True):
+            self.transcription_cache = TranscriptionCache(self.cache_dir, self.cache_max_bytes)
+
+        # Decoded audio is cached separately, so changing the model or its
+        # settings still skips decoding the files again
+        self.audio_cache_dir = kwargs.get("audio_cache_dir") if kwargs.get("use_cache", True) else None
+        self.audio_cache_max_bytes = kwargs.get("audio_cache_max_bytes")
+
+        # With a process pool every worker loads its own model, so there is no
+        # need to load one in the parent process as well.
+        if self.workers == 1:
+            self.load_transcription_service()
+
+    def load_transcription_service(self) -> TranscribeService:
+        """
+        Loads the transcription service (and its model) if it has not been
+        loaded yet.
+        """
+        if self.transcription_service is not None:
+            return self.transcription_service
+
         # Whisper Service
         if self.service_name == "whisper":
             from .transcribe_services.whisper_service import WhisperTranscribe
@@ -39,74 +138,371 @@ class Transcribe:
             if self.model_name == None:
                 raise RuntimeError("Whisper model name must be specified")
             
-            self.transcription_service = WhisperTranscribe(self.model_name)
+            self.transcription_service = WhisperTranscribe(
+                self.model_name,
+                vad=self.vad,
+                audio_cache_dir=self.audio_cache_dir,
+                audio_cache_max_bytes=self.audio_cache_max_bytes
+            )
+        # Whisper with int8 linear layers, for CPU-only machines
+        elif self.service_name == "whisper-int8":
+            from .transcribe_services.quantized_whisper_service import QuantizedWhisperTranscribe
+
+            if self.model_name == None:
+                raise RuntimeError("Whisper model name must be specified")
 
-    def transcribe_single_audio_file(self, audio_input: AudioInput) -> List[Segment]:
+            self.transcription_service = QuantizedWhisperTranscribe(
+                self.model_name,
+                threads=self.threads,
+                vad=self.vad,
+                audio_cache_dir=self.audio_cache_dir,
+                audio_cache_max_bytes=self.audio_cache_max_bytes
+            )
+        return self.transcription_service
+
+    def worker_kwargs(self) -> dict:
+        """
+        Keyword arguments used to build an equivalent single-process Transcribe
+        inside a pool worker.
+        """
+        return {
+            "model_name": self.model_name,
+            "remove_duplicates": self.remove_duplicates,
+            "dedup_window": self.dedup_window,
+            "dedup_similarity": self.dedup_similarity,
+            "remove_bleed": self.remove_bleed,
+            "bleed_similarity": self.bleed_similarity,
+            "columnar": self.columnar,
+            "vad": self.vad,
+            "window_seconds": self.window_seconds,
+            "window_overlap": self.window_overlap,
+            "workers": 1,
+            "threads": self.threads,
+            "cache_dir": self.cache_dir if self.transcription_cache else None,
+            "cache_max_bytes": self.cache_max_bytes,
+            "audio_cache_dir": self.audio_cache_dir,
+            "audio_cache_max_bytes": self.audio_cache_max_bytes,
+        }
+
+    def transcribe_single_audio_file(self, audio_input: AudioInput, window_seconds: float = None, window_overlap: float = None) -> Union[List[Segment], SegmentTable]:
         """
         Transcribes a single audio file
 
         Input:
             audio_input: AudioInput
+            window_seconds: float, when set the audio is split into windows
+                of this many seconds that are transcribed across the worker
+                pool. Defaults to the window_seconds the class was built with.
+            window_overlap: float, seconds of overlap between windows
 
-        Returns: TranscriptionResult
+        Returns: List[Segment], or a SegmentTable in columnar mode
         """
-        transcription = self.transcription_service.transcribe(audio_input.file_path)
+        if window_seconds is None:
+            window_seconds = self.window_seconds
+        if window_overlap is None:
+            window_overlap = self.window_overlap
+        transcription = self.transcribe_with_cache(audio_input.file_path, window_seconds, window_overlap)
+        if self.columnar:
+            transcription.segments = SegmentTable.from_segments(transcription.segments)
         if self.remove_duplicates:
-            transcription.segments = self.remove_duplicates_from_segments(transcription.segments)
+            with stage("dedup", source=audio_input.file_path, segments=len(transcription.segments)) as span:
+                transcription.segments, span["removed"] = remove_repeated_segments(
+                    transcription.segments, self.dedup_window, self.dedup_similarity
+                )
+            logging.info(f"Removed {span['removed']} repeated segments from {audio_input.file_path}")
         if audio_input.speaker != None:
             transcription.segments = self.add_speaker_to_segments(audio_input.speaker, transcription.segments)
         return transcription.segments
     
-    def transcribe_multiple_audio_files_into_one(self, audio_inputs: List[AudioInput]) -> List[Segment]:
+    def transcribe_stream(self, audio_input: AudioInput) -> Iterator[Segment]:
+        """
+        Transcribes a single audio file like transcribe_single_audio_file,
+        but yields its segments as each window of the audio is done, see
+        TranscribeService.transcribe_stream. Repeated segments are removed
+        and the speaker is added as the segments arrive. A cached
+        transcription is yielded straight away, and a finished stream is
+        cached under the same key as a windowed transcription.
+
+        Input:
+            audio_input: AudioInput
+
+        Returns: Iterator[Segment]
+        """
+        service = self.load_transcription_service()
+        window_seconds = self.window_seconds or self.stream_window_seconds
+        cache_params = None
+        cached = None
+        if self.transcription_cache is not None:
+            cache_params = {**service.cache_params(), "window_seconds": window_seconds, "window_overlap": self.window_overlap}
+            with stage("transcription_cache", source=audio_input.file_path) as span:
+                cached = self.transcription_cache.get_result(audio_input.file_path, cache_params)
+                span["hit"] = cached is not None
+
+        def transcribed_segments():
+            if cached is not None:
+                yield from cached.segments
+                return
+            segments = []
+            for segment in service.transcribe_stream(audio_input.file_path, window_seconds, self.window_overlap):
+                segments.append(segment)
+                yield segment
+            if cache_params is not None:
+                result = TranscriptionResult(audio_input.file_path, segments, "".join(segment.text for segment in segments))
+                self.transcription_cache.put_result(audio_input.file_path, cache_params, result)
+
+        segments = transcribed_segments()
+        if self.remove_duplicates:
+            segments = remove_repeated_segments_stream(segments, self.dedup_window, self.dedup_similarity)
+        for segment in segments:
+            if audio_input.speaker is not None:
+                segment = Segment(segment.text, segment.start_time, segment.end_time, audio_input.speaker)
+            yield segment
+
+    def transcribe_with_cache(self, file_path: str, window_seconds: float = None, window_overlap: float = None) -> TranscriptionResult:
+        """
+        Runs the transcription service on a file, serving the result from the
+        transcription cache when the same audio was already transcribed with
+        the same service parameters.
+        """
+        service = self.load_transcription_service()
+
+        def transcribe():
+            if window_seconds:
+                return self.transcribe_in_windows(file_path, window_seconds, window_overlap)
+            return service.transcribe(file_path)
+
+        if self.transcription_cache is None:
+            return transcribe()
+
+        cache_params = service.cache_params()
+        if window_seconds:
+            cache_params = {**cache_params, "window_seconds": window_seconds, "window_overlap": window_overlap}
+        with stage("transcription_cache", source=file_path) as span:
+            transcription = self.transcription_cache.get_result(file_path, cache_params)
+            span["hit"] = transcription is not None
+        if transcription is None:
+            transcription = transcribe()
+            self.transcription_cache.put_result(file_path, cache_params, transcription)
+        return transcription
+
+    def transcribe_in_windows(self, file_path: str, window_seconds: float, window_overlap: float) -> TranscriptionResult:
+        """
+        Splits the decoded audio into fixed windows that overlap by
+        window_overlap seconds, transcribes the windows across the worker
+        pool, and reconciles the segments in the overlaps into a single
+        timeline.
+        """
+        service = self.load_transcription_service()
+        audio = service.load_audio(file_path)
+        windows = plan_windows(len(audio), int(window_seconds * SAMPLE_RATE), int(window_overlap * SAMPLE_RATE))
+        audio_windows = [audio[start:end] for start, end in windows]
+        logging.info(f"Transcribing {file_path} in {len(windows)} windows of {window_seconds} seconds...")
+
+        if self.workers > 1 and len(audio_windows) > 1:
+            with self.create_process_pool(min(self.workers, len(audio_windows))) as executor:
+                results = []
+                for result, spans in executor.map(partial(run_traced, _transcribe_window_in_worker), audio_windows):
+                    get_tracer().extend(spans)
+                    results.append(result)
+        else:
+            results = [service.transcribe_audio(audio_window) for audio_window in audio_windows]
+
+        with stage("window_reconcile", source=file_path):
+            segments = reconcile_windows(
+                [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in windows],
+                [result.segments for result in results]
+            )
+        return TranscriptionResult(file_path, segments, "".join(segment.text for segment in segments))
+
+    def transcribe_multiple_audio_files_into_one(self, audio_inputs: List[AudioInput], manifest: JobManifest = None) -> Iterator[Segment]:
         """
         Transcribes multiple audio files. The audio files are assumed to be
         from different speakers in the same session and are combined into a
-        single transcript.
+        single transcript. When more than one worker is configured the files
+        are transcribed in a process pool.
+
+        When a job manifest is given, tracks it already has as done are
+        loaded from it instead of being transcribed, and every track is
+        checkpointed to it as soon as it finishes.
 
         Input:
             audio_inputs: List[AudioInput]
+            manifest: JobManifest
 
-        Returns: List[Segment]
+        Returns: Iterator[Segment], merged in start time order
         """
+        remaining_indexes = list(range(len(audio_inputs)))
+        if manifest is not None:
+            remaining_indexes = [i for i, ainput in enumerate(audio_inputs) if not manifest.is_done(ainput)]
+            logging.info(f"{len(audio_inputs) - len(remaining_indexes)} of {len(audio_inputs)} tracks already transcribed")
+        remaining_inputs = [audio_inputs[i] for i in remaining_indexes]
+
+        segment_collection:List[List[Segment]] = [None] * len(audio_inputs)
+        for i, transcription_segments in self.transcribe_audio_files(remaining_inputs, manifest):
+            index = remaining_indexes[i]
+            if manifest is not None:
+                manifest.mark_done(audio_inputs[index], transcription_segments)
+            segment_collection[index] = transcription_segments
+        for index, ainput in enumerate(audio_inputs):
+            if segment_collection[index] is None:
+                segment_collection[index] = manifest.load_segments(ainput)
+                if self.columnar:
+                    segment_collection[index] = SegmentTable.from_segments(segment_collection[index])
+
+        if self.remove_bleed:
+            segment_collection = self.remove_bleed_from_tracks(audio_inputs, segment_collection)
 
-        # TODO: Break this out so that I can multi-thread it and save progress if stopped.
-        segment_collection:List[List[Segment]] = []
-        for ainput in audio_inputs:
-            logging.info(f"Transcribing {ainput.file_path} with Speaker as {ainput.speaker}...")
-            transcription_segments = self.transcribe_single_audio_file(ainput)
-            segment_collection.append(transcription_segments)
-        # TODO: Start here when all transcriptions above are completed.
-        # This could probably be an event trigger instead of sequential.
         sorted_segments = self.sort_segments(segment_collection)
         return sorted_segments
+
+    def remove_bleed_from_tracks(self, audio_inputs: List[AudioInput], segment_collection: List[List[Segment]]) -> List[List[Segment]]:
+        """
+        Removes segments that one speaker's mic picked up from another
+        speaker, see dedup.find_cross_track_bleed. Each segment's loudness is
+        measured in its own track's audio, so of two matching segments the
+        one from the track the speaker was loudest in is kept.
+
+        Returns: List[List[Segment]] (or SegmentTables), one per track
+        """
+        service = self.load_transcription_service()
+        segments, tracks, loudness = [], [], []
+        for track, (ainput, track_segments) in enumerate(zip(audio_inputs, segment_collection)):
+            track_segments = list(track_segments)
+            segments.extend(track_segments)
+            tracks.extend([track] * len(track_segments))
+            loudness.append(segment_loudness(service.load_audio(ainput.file_path), track_segments))
+
+        with stage("bleed", segments=len(segments)) as span:
+            bleed = find_cross_track_bleed(segments, tracks, np.concatenate(loudness), self.bleed_similarity)
+            span["removed"] = int(bleed.sum())
+        logging.info(f"Removed {int(bleed.sum())} segments picked up from other speakers' tracks")
+
+        filtered_collection = []
+        offset = 0
+        for track_segments in segment_collection:
+            keep = np.flatnonzero(~bleed[offset:offset + len(track_segments)])
+            if isinstance(track_segments, SegmentTable):
+                filtered_collection.append(track_segments.take(keep))
+            else:
+                filtered_collection.append([track_segments[i] for i in keep.tolist()])
+            offset += len(track_segments)
+        return filtered_collection
+
+    def transcribe_audio_files(self, audio_inputs: List[AudioInput], manifest: JobManifest = None) -> Iterator[Tuple[int, List[Segment]]]:
+        """
+        Transcribes audio files, in a process pool when more than one worker
+        is configured, and yields each file's segments as soon as it is done.
+
+        Input:
+            audio_inputs: List[AudioInput]
+            manifest: JobManifest, tracks are marked as running when started
+
+        Returns: Iterator of (index into audio_inputs, List[Segment]) in completion order
+        """
+        if self.workers > 1 and len(audio_inputs) > 1:
+            yield from self.transcribe_audio_files_in_pool(audio_inputs, manifest)
+            return
+
+        for i, ainput in enumerate(audio_inputs):
+            if manifest is not None:
+                manifest.mark_running(ainput)
+            logging.info(f"Transcribing {ainput.file_path} with Speaker as {ainput.speaker}...")
+            yield i, self.transcribe_single_audio_file(ainput)
+
+    def transcribe_audio_files_in_pool(self, audio_inputs: List[AudioInput], manifest: JobManifest = None) -> Iterator[Tuple[int, List[Segment]]]:
+        """
+        Transcribes audio files across a pool of worker processes. Each worker
+        loads the transcription model once and reuses it for every file it
+        picks up.
+
+        Input:
+            audio_inputs: List[AudioInput]
+            manifest: JobManifest, tracks are marked as running when a
+                worker picks them up
+
+        Returns: Iterator of (index into audio_inputs, List[Segment]) in completion order
+        """
+        num_workers = min(self.workers, len(audio_inputs))
+        logging.info(f"Transcribing {len(audio_inputs)} files with {num_workers} workers...")
+        # Workers report each track they start on this queue. It's written
+        # to before the track's result, so a track is always seen starting
+        # before it finishes.
+        started = multiprocessing.get_context("spawn").SimpleQueue() if manifest is not None else None
+        with self.create_process_pool(num_workers, started=started) as executor:
+            futures = {
+                executor.submit(run_traced, _transcribe_in_worker, ainput, i): i
+                for i, ainput in enumerate(audio_inputs)
+            }
+            not_done = set(futures)
+            while not_done:
+                done, not_done = wait(not_done, timeout=STARTED_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                while started is not None and not started.empty():
+                    manifest.mark_running(audio_inputs[started.get()])
+                for future in done:
+                    segments, spans = future.result()
+                    # Add the worker's timings to this process's trace
+                    get_tracer().extend(spans)
+                    yield futures[future], segments
     
+    def create_process_pool(self, num_workers: int, warm_up: bool = False, started=None) -> ProcessPoolExecutor:
+        """
+        Creates a pool of worker processes that each hold their own
+        single-process Transcribe. With warm_up, each worker loads its model
+        as it starts instead of on its first file. Workers trace their stages
+        when this process does, and put the index of each file they start
+        transcribing on the started queue, when there is one.
+        """
+        # Spawn rather than fork so that workers don't inherit torch/CUDA state.
+        return ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.service_name, self.worker_kwargs(), warm_up, get_tracer().enabled, started)
+        )
+
     @staticmethod
-    def sort_segments(segment_collection: List[List[Segment]]) -> List[Segment]:
+    def sort_segments(segment_collection: List[Iterable[Segment]]) -> Iterator[Segment]:
         """
-        Sorts a list of segments by start time.
+        Merges per-speaker segment lists into a single stream ordered by start
+        time. Each list must already be in start time order, which is how
+        Whisper returns them, so this is a lazy k-way heap merge in
+        O(n log k) rather than a concatenate-and-sort. Segments with the same
+        start time keep the order of their lists in segment_collection.
+
+        SegmentTables are merged with a vectorized stable sort into a single
+        SegmentTable instead.
         """
-        transcript_segments:List[Segment] = []
-        for segments in segment_collection:
-            transcript_segments.extend(segments)
-        sorted_segments = sorted(transcript_segments, key=lambda k: k.start_time)
-        return sorted_segments
+        if segment_collection and all(isinstance(segments, SegmentTable) for segments in segment_collection):
+            with stage("merge", segments=sum(len(segments) for segments in segment_collection)):
+                return SegmentTable.merge(segment_collection)
+        # The heap merge runs as the stream is consumed, so its time is part
+        # of the write stage
+        return heapq.merge(*segment_collection, key=lambda k: k.start_time)
 
     
-    def write_transcription_to_file(self, transcription_segments: List[Segment], output_file: str) -> None:
+    def write_transcription_to_file(self, transcription_segments: Iterable[Segment], output_file: str, output_format: str = TEXT) -> None:
+        """
+        Streams segments to a transcript file in buffered batches. The output
+        format is text, jsonl or binary, see TranscriptWriter.
+        """
         logging.info(f'Writing transcript to {output_file}')
-        with open(output_file, 'w') as f:
-            for segment in transcription_segments:
-                f.write(f'[{segment.start_time:9.2f}]{segment.speaker:>16}: {segment.text}\n')
+        with stage("write", output_format=output_format) as span:
+            segments_written = write_segments(transcription_segments, output_file, output_format)
+            span["segments"] = segments_written
+        logging.info(f'Wrote {segments_written} segments')
 
     @staticmethod
-    def remove_duplicates_from_segments(segments: List[Segment]) -> List[Segment]:
+    def remove_duplicates_from_segments(segments: List[Segment], window: int = 1, similarity: float = None) -> List[Segment]:
         """
         Removes duplicate segments from a list of segments. This is helpful for
-        Whisper transcriptions, which sometimes return duplicate segments.
+        Whisper transcriptions, which sometimes return duplicate segments or
+        get stuck repeating a phrase. A segment is a duplicate when its text,
+        ignoring case and punctuation, matches one of the `window` segments
+        before it, or is at least `similarity` alike to one of them. See
+        transcriptly.dedup.
         """
-        for i in range(len(segments)-1, 0, -1):
-            if segments[i].text == segments[i-1].text:
-                del segments[i]
+        segments, removed = remove_repeated_segments(segments, window, similarity)
+        logging.debug(f"Removed {removed} repeated segments")
         return segments
 
     @staticmethod
@@ -114,6 +510,8 @@ class Transcribe:
         """
         Adds a speaker to a list of segments.
         """
+        if isinstance(segments, SegmentTable):
+            return segments.with_speaker(speaker)
         for i in range(len(segments)):
             segments[i].speaker = speaker
         return segments
@@ -124,39 +522,133 @@ class Transcribe:
         name = filename.split("-", 1)[-1].rsplit(".", 1)[0].rsplit("_", 1)[0]
         return name
     
-    # TODO: unit test this
+    @staticmethod
+    def audio_inputs_from_path(path: str, speaker: str = None) -> List[AudioInput]:
+        """
+        Returns the audio inputs for a path given on the command line: an
+        inputs JSON file, a directory of one file per speaker, or a single
+        audio file spoken by speaker.
+        """
+        if os.path.isdir(path):
+            return [
+                AudioInput(file_path, Transcribe.get_speaker_from_file_path(file_path))
+                for file_path in Transcribe.filter_audio_video_files(path)
+            ]
+        if not os.path.isfile(path):
+            raise RuntimeError("Input parameter must be a file or directory")
+        if os.path.splitext(path)[1] == ".json":
+            with open(path, "r") as f:
+                return [AudioInput(audio_input["file_path"], audio_input["speaker"]) for audio_input in json.load(f)]
+        return [AudioInput(path, speaker)]
+
     @staticmethod
     def filter_audio_video_files(directory):
-        audio_video_files = []
+        """
+        Returns the paths of the audio and video files in directory. Uses
+        os.scandir, whose entries know whether they are files without a
+        stat call on most platforms.
+        """
+        with os.scandir(directory) as entries:
+            return [entry.path for entry in entries if entry.is_file() and is_audio_video_file(entry.name)]
 
-        for file_name in os.listdir(directory):
-            file_path = os.path.join(directory, file_name)
-            if os.path.isfile(file_path):
-                file_mime_type, _ = mimetypes.guess_type(file_path)
-                if file_mime_type:
-                    if file_mime_type.startswith('audio/') or file_mime_type.startswith('video/'):
-                        audio_video_files.append(file_path)
 
-        return audio_video_files
+@lru_cache(maxsize=None)
+def _is_audio_video_extension(extension: str) -> bool:
+    file_mime_type, _ = mimetypes.guess_type(f"file{extension}")
+    return bool(file_mime_type) and (file_mime_type.startswith('audio/') or file_mime_type.startswith('video/'))
 
+def is_audio_video_file(file_name: str) -> bool:
+    """
+    Returns whether a file name has an audio or video MIME type. The type
+    only depends on the extension, so it's looked up once per extension.
+    """
+    return _is_audio_video_extension(os.path.splitext(file_name)[1].lower())
 
-if __name__ == "__main__":
+
+# Per-process Transcribe instance used by the pool workers
+_worker_transcribe: Transcribe = None
+_worker_started = None
+
+def _init_worker(service_name: str, kwargs: dict, warm_up: bool = False, trace: bool = False, started=None) -> None:
+    global _worker_transcribe, _worker_started
+    get_tracer().enabled = trace
+    _worker_transcribe = Transcribe(service_name, **kwargs)
+    _worker_started = started
+    if warm_up:
+        _worker_transcribe.load_transcription_service().warm_up()
+
+def _transcribe_in_worker(audio_input: AudioInput, index: int = None) -> List[Segment]:
+    if _worker_started is not None and index is not None:
+        _worker_started.put(index)
+    logging.info(f"Transcribing {audio_input.file_path} with Speaker as {audio_input.speaker}...")
+    return _worker_transcribe.transcribe_single_audio_file(audio_input)
+
+def _transcribe_window_in_worker(audio_window) -> TranscriptionResult:
+    return _worker_transcribe.load_transcription_service().transcribe_audio(audio_window)
+
+
+def main(argv: List[str] = None, prog: str = None) -> None:
     import argparse
 
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(prog=prog, description="Transcribe an audio file, or one file per speaker into a single transcript")
     parser.add_argument("--input", type=str, help="Input audio file, inputs JSON file, or directory. Speaker names are extracted from the file names for a directory.")
     parser.add_argument("--output", type=str, help="Output file for the transcription.")
+    parser.add_argument("--format", type=str, default=TEXT, choices=OUTPUT_FORMATS, help="Output format for the transcription.")
     parser.add_argument("--speaker", type=str, help="Speaker name for a single audio file. Speaker names for multiple audio files are extracted from the file names.")
-    args = parser.parse_args()
+    parser.add_argument("--remove-duplicates", action="store_true", help="Remove repeated segments from each track.")
+    parser.add_argument("--dedup-window", type=int, default=1, help="Number of previous segments a segment is compared with when removing duplicates.")
+    parser.add_argument("--dedup-similarity", type=float, help="Also remove segments at least this similar (0 to 1) to a recent one, for repetition loops.")
+    parser.add_argument("--remove-bleed", action="store_true", help="Remove segments a speaker's mic picked up from another speaker in multi-file transcription.")
+    parser.add_argument("--bleed-similarity", type=float, help="Also count segments at least this similar (0 to 1) across tracks as bleed.")
+    parser.add_argument("--columnar", action="store_true", help="Process segments in compact column-oriented tables, for very large transcripts.")
+    parser.add_argument("--vad", action="store_true", help="Cut long silences out of each track before transcribing it.")
+    parser.add_argument("--window-seconds", type=float, help="Split each file into windows of this many seconds and transcribe them in parallel across the workers.")
+    parser.add_argument("--window-overlap", type=float, default=10.0, help="Seconds of overlap between windows.")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write cached transcriptions or decoded audio.")
+    parser.add_argument("--resume", action="store_true", help="Resume a stopped multi-file transcription, only transcribing the tracks that didn't finish.")
+    parser.add_argument("--job-dir", type=str, help="Directory for the multi-file job manifest and checkpointed tracks. Defaults to the output file path with a .job suffix.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("TRANSCRIPTION_WORKERS", 1)), help="Number of worker processes used to transcribe multiple audio files.")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("TRANSCRIPTION_THREADS", 0)) or None, help="Torch threads per worker process for the whisper-int8 service. Defaults to the cores split evenly between the workers.")
+    parser.add_argument("--trace", type=str, help="Write per-stage wall and CPU times and real-time factors to this JSON file.")
+    parser.add_argument("--metrics-port", type=int, help="Serve per-stage metrics in the Prometheus text format on this port while transcribing.")
+    args = parser.parse_args(argv)
     input = args.input
     output = args.output
     speaker = args.speaker
+    job_dir = args.job_dir or f"{output}.job"
+
+    if args.trace or args.metrics_port:
+        get_tracer().enabled = True
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+
+    def open_job_manifest(audio_inputs):
+        if args.resume:
+            logging.info(f'Resuming job from {job_dir}...')
+            return JobManifest.load(job_dir, audio_inputs)
+        return JobManifest.create(job_dir, audio_inputs)
     
     transcription_service_name = os.environ.get("TRANSCRIPTION_SERVICE", "whisper")
     transcription_model_name = os.environ.get("TRANSCRIPTION_MODEL", "tiny")
     transcribe = Transcribe(
         service_name=transcription_service_name, 
-        model_name=transcription_model_name
+        model_name=transcription_model_name,
+        workers=args.workers,
+        threads=args.threads,
+        remove_duplicates=args.remove_duplicates,
+        dedup_window=args.dedup_window,
+        dedup_similarity=args.dedup_similarity,
+        remove_bleed=args.remove_bleed,
+        bleed_similarity=args.bleed_similarity,
+        columnar=args.columnar,
+        vad=args.vad,
+        window_seconds=args.window_seconds,
+        window_overlap=args.window_overlap,
+        cache_dir=os.environ.get("TRANSCRIPTION_CACHE_DIR", "cache/transcriptions"),
+        cache_max_bytes=int(float(os.environ.get("TRANSCRIPTION_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+        audio_cache_dir=os.environ.get("TRANSCRIPTION_AUDIO_CACHE_DIR", "cache/audio"),
+        audio_cache_max_bytes=int(float(os.environ.get("TRANSCRIPTION_AUDIO_CACHE_MAX_MB", 4096)) * 1024 * 1024),
+        use_cache=not args.no_cache
     )
 
     transcription = None
@@ -164,12 +656,8 @@ if __name__ == "__main__":
         # If input is a json file, run multi-file transcription
         if os.path.splitext(input)[1] == ".json":
             logging.info(f'Input is a JSON file. Running multi-file transcription...')
-            with open(input, "r") as f:
-                json_input = json.load(f)
-            audio_inputs = []
-            for audio_input in json_input:
-                audio_inputs.append(AudioInput(audio_input["file_path"], audio_input["speaker"]))
-            transcription = transcribe.transcribe_multiple_audio_files_into_one(audio_inputs)
+            audio_inputs = Transcribe.audio_inputs_from_path(input)
+            transcription = transcribe.transcribe_multiple_audio_files_into_one(audio_inputs, open_job_manifest(audio_inputs))
         # If input is an audio file, run single-file transcription
         else:
             logging.info(f'Input is an audio file. Running single-file transcription...')
@@ -177,14 +665,17 @@ if __name__ == "__main__":
     elif os.path.isdir(input):
         # If input is a directory, run multi-file transcription
         logging.info(f'Input is a directory. Running multi-file transcription...')
-        file_list = transcribe.filter_audio_video_files(input)
-        audio_inputs = []
-        for file_path in file_list:
-            speaker = transcribe.get_speaker_from_file_path(file_path)
-            audio_inputs.append(AudioInput(file_path, speaker))
-        transcription = transcribe.transcribe_multiple_audio_files_into_one(audio_inputs)
+        audio_inputs = Transcribe.audio_inputs_from_path(input)
+        transcription = transcribe.transcribe_multiple_audio_files_into_one(audio_inputs, open_job_manifest(audio_inputs))
     else:
         raise RuntimeError("Input parameter must be a file or directory")
     logging.info(f'Transcription complete.')
 
-    transcribe.write_transcription_to_file(transcription, output)
\ No newline at end of file
+    transcribe.write_transcription_to_file(transcription, output, args.format)
+
+    if args.trace:
+        get_tracer().write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
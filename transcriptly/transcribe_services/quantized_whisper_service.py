@@ -0,0 +1,33 @@
+from ..model_pool import INT8_SUFFIX, get_model
+from .whisper_service import WhisperTranscribe
+
+class QuantizedWhisperTranscribe(WhisperTranscribe):
+    """
+    Whisper on the CPU with its linear layers quantized to int8, see
+    model_pool.quantize_dynamic_int8. The linear layers hold most of the
+    weights and do most of the work, so the small and medium models run
+    noticeably faster and in less memory than in float32, with
+    transcriptions that only differ where the model was unsure.
+    """
+    def __init__(self, model_name, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.device = "cpu"
+        # Torch uses a thread per core by default, which oversubscribes the
+        # CPU when several worker processes transcribe at once
+        self.threads = kwargs.get("threads", None)
+        if self.threads:
+            import torch
+
+            torch.set_num_threads(self.threads)
+
+    @property
+    def whisper_model(self):
+        return get_model(f"{self.model_name}{INT8_SUFFIX}", self.device)
+
+    def cache_params(self) -> dict:
+        return {**super().cache_params(), "service": "whisper-int8"}
+
+    def transcribe_options(self) -> dict:
+        # Half precision isn't available on the CPU anyway, and asking for it
+        # makes Whisper warn on every call
+        return {**super().transcribe_options(), "fp16": False}
@@ -1,4 +1,8 @@
-from ..data_types import TranscriptionResult
+from typing import Iterator
+
+from ..data_types import Segment, TranscriptionResult
+from ..vad import SAMPLE_RATE
+from ..windowing import plan_windows, reconcile_window_stream
 
 
 class TranscribeService:
@@ -8,4 +12,49 @@ class TranscribeService:
     def transcribe(self, file_path) -> TranscriptionResult:
         raise NotImplementedError("transcribe method not implemented")
 
+    def load_audio(self, file_path):
+        """
+        Decodes a file into the audio array the service transcribes.
+        """
+        raise NotImplementedError("load_audio method not implemented")
+
+    def transcribe_audio(self, audio) -> TranscriptionResult:
+        """
+        Transcribes audio that was already decoded with load_audio.
+        """
+        raise NotImplementedError("transcribe_audio method not implemented")
+
+    def transcribe_stream(self, file_path, window_seconds: float = 120.0, window_overlap: float = 10.0) -> Iterator[Segment]:
+        """
+        Yields a file's segments as it is transcribed. The decoded audio is
+        transcribed one window at a time, and each window's segments are
+        reconciled with the previous window's and yielded as soon as it is
+        done, so the first segments arrive after one window instead of
+        after the whole file. Services that can't transcribe decoded audio
+        yield the segments of transcribe() once it's done.
+        """
+        try:
+            audio = self.load_audio(file_path)
+        except NotImplementedError:
+            yield from self.transcribe(file_path).segments
+            return
+        windows = plan_windows(len(audio), int(window_seconds * SAMPLE_RATE), int(window_overlap * SAMPLE_RATE))
+        window_segments = (self.transcribe_audio(audio[start:end]).segments for start, end in windows)
+        window_times = [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in windows]
+        for segments in reconcile_window_stream(window_times, window_segments):
+            yield from segments
+
+    def warm_up(self) -> None:
+        """
+        Loads whatever the service needs before its first transcription.
+        Services without anything to load don't need to override this.
+        """
+
+    def cache_params(self) -> dict:
+        """
+        Everything besides the audio itself that affects the transcription,
+        used to key cached results.
+        """
+        raise NotImplementedError("cache_params method not implemented")
+
 
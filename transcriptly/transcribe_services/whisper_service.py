@@ -1,29 +1,114 @@
-import whisper
+import logging
 
+from ..cache import AudioCache
 from ..data_types import TranscriptionResult, Segment
+from ..instrumentation import stage
+from ..model_pool import get_model
+from ..vad import SAMPLE_RATE, trim_silence
 from .transcribe_service import TranscribeService
 
 class WhisperTranscribe(TranscribeService):
     def __init__(self, model_name, **kwargs):
         self.model_name = model_name
-        self.whisper_model = whisper.load_model(self.model_name)
+        self.device = kwargs.get("device", None)
         self.no_speech_threshold = kwargs.get("no_speech_threshold", 0.275)
         self.logprob_threshold = kwargs.get("logprob_threshold", None)
         self.condition_on_previous_text = kwargs.get("condition_on_previous_text", False)
+        # Voice activity pre-pass that cuts long silences before transcribing
+        self.vad = kwargs.get("vad", False)
+        self.vad_threshold_db = kwargs.get("vad_threshold_db", -35)
+        self.vad_min_silence = kwargs.get("vad_min_silence", 2.0)
+        # Decoded audio is cached so repeat runs skip ffmpeg
+        self.audio_cache = None
+        if kwargs.get("audio_cache_dir"):
+            self.audio_cache = AudioCache(kwargs["audio_cache_dir"], kwargs.get("audio_cache_max_bytes"))
+
+    @property
+    def whisper_model(self):
+        # Looked up on every use so that a model evicted from the pool can be
+        # freed instead of being pinned by this instance.
+        return get_model(self.model_name, self.device)
+
+    def warm_up(self) -> None:
+        self.whisper_model
+
+    def cache_params(self) -> dict:
+        params = {
+            "service": "whisper",
+            "model_name": self.model_name,
+            "no_speech_threshold": self.no_speech_threshold,
+            "logprob_threshold": self.logprob_threshold,
+            "condition_on_previous_text": self.condition_on_previous_text,
+        }
+        if self.vad:
+            params["vad"] = {"threshold_db": self.vad_threshold_db, "min_silence": self.vad_min_silence}
+        return params
+
+    def transcribe_options(self) -> dict:
+        """
+        Options passed to Whisper's transcribe on every call.
+        """
+        return {
+            "no_speech_threshold": self.no_speech_threshold,
+            "logprob_threshold": self.logprob_threshold,
+            "condition_on_previous_text": self.condition_on_previous_text,
+        }
+
+    def load_audio(self, file_path):
+        from whisper.audio import load_audio
+
+        with stage("audio_decode", source=file_path) as span:
+            if self.audio_cache is None:
+                audio = load_audio(file_path)
+            else:
+                audio = self.audio_cache.get_audio(file_path)
+                span["cached"] = audio is not None
+                if audio is None:
+                    audio = load_audio(file_path)
+                    self.audio_cache.put_audio(file_path, audio)
+            span["audio_seconds"] = len(audio) / SAMPLE_RATE
+        return audio
 
     def transcribe(self, file_path, verbose=False) -> TranscriptionResult:
-        whisper_result = self.whisper_model.transcribe(
-            file_path, 
-            verbose=verbose,
-            no_speech_threshold=self.no_speech_threshold, 
-            logprob_threshold=self.logprob_threshold, 
-            condition_on_previous_text=self.condition_on_previous_text
-        )
+        # Decoded here rather than by Whisper, which would decode the same
+        # way, so decoding and inference are timed separately
+        audio = self.load_audio(file_path)
+        result = self.transcribe_audio(audio, verbose, source=file_path)
+        result.audio_file_path = file_path
+        return result
+
+    def transcribe_audio(self, audio, verbose=False, source="audio") -> TranscriptionResult:
+        """
+        Transcribes a file path or 16 kHz float32 samples.
+        """
+        time_map = None
+        if self.vad:
+            if isinstance(audio, str):
+                audio = self.load_audio(audio)
+            with stage("vad", source=source, audio_seconds=len(audio) / SAMPLE_RATE):
+                audio, time_map = trim_silence(
+                    audio,
+                    threshold_db=self.vad_threshold_db,
+                    min_silence=self.vad_min_silence
+                )
+            logging.info(f"Voice activity in {source}: {len(audio) / SAMPLE_RATE:.1f} of {time_map.total_duration:.1f} seconds")
+            if len(audio) == 0:
+                return TranscriptionResult(None, [], "")
+
+        whisper_model = self.whisper_model
+        audio_seconds = None if isinstance(audio, str) else len(audio) / SAMPLE_RATE
+        with stage("inference", source=source, model=self.model_name, audio_seconds=audio_seconds) as span:
+            whisper_result = whisper_model.transcribe(audio, verbose=verbose, **self.transcribe_options())
+            span["segments"] = len(whisper_result["segments"])
         result = TranscriptionResult()
         segments = []
         for segment in whisper_result["segments"]:
-            segments.append(Segment(segment["text"], segment["start"], segment["end"]))
+            start, end = segment["start"], segment["end"]
+            # Put the segments back on the original timeline so that tracks
+            # from different speakers still line up
+            if time_map is not None:
+                start, end = time_map.to_original(start), time_map.to_original(end, is_end=True)
+            segments.append(Segment(segment["text"], start, end))
         result.segments = segments
         result.text = whisper_result["text"]
-        result.audio_file_path = file_path
-        return result
\ No newline at end of file
+        return result
@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import struct
+
+from dataclasses import asdict
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from transcriptly.data_types import Segment
+
+TEXT = "text"
+JSONL = "jsonl"
+BINARY = "binary"
+OUTPUT_FORMATS = (TEXT, JSONL, BINARY)
+
+# Binary transcripts start with this header, followed by one record per
+# segment: start time, end time, speaker length, text length, then the UTF-8
+# speaker and text bytes.
+BINARY_HEADER = b"TSEG\x01"
+BINARY_RECORD = struct.Struct("<ddHI")
+# Speaker length marking a segment without a speaker
+NO_SPEAKER = 0xFFFF
+# "[    12.34]            John:  Hello there."
+TEXT_LINE_PATTERN = re.compile(r"^\[\s*(-?[\d.]+)\](.*?): (.*)$", re.DOTALL)
+# Line breaks in segment text are escaped so that every segment of a text
+# transcript stays on one line
+TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r"})
+TEXT_ESCAPE_PATTERN = re.compile(r"\\([\\nr])")
+TEXT_UNESCAPES = {"\\": "\\", "n": "\n", "r": "\r"}
+
+
+def format_text_line(segment: Segment) -> str:
+    speaker = segment.speaker if segment.speaker is not None else ""
+    return f'[{segment.start_time:9.2f}]{speaker:>16}: {segment.text.translate(TEXT_ESCAPES)}\n'
+
+def parse_text_line(line: str) -> Segment:
+    """
+    Parses a line written by format_text_line. Text transcripts don't keep
+    end times, so the segment ends where it starts.
+    """
+    match = TEXT_LINE_PATTERN.match(line.rstrip("\n"))
+    if match is None:
+        raise RuntimeError(f"Not a transcript line: {line!r}")
+    start_time = float(match.group(1))
+    speaker = match.group(2).strip() or None
+    text = TEXT_ESCAPE_PATTERN.sub(lambda escape: TEXT_UNESCAPES[escape.group(1)], match.group(3))
+    return Segment(text, start_time, start_time, speaker)
+
+def format_jsonl_line(segment: Segment) -> str:
+    return json.dumps(asdict(segment)) + "\n"
+
+def pack_binary_record(segment: Segment) -> bytes:
+    text = segment.text.encode("utf-8")
+    if segment.speaker is None:
+        return BINARY_RECORD.pack(segment.start_time, segment.end_time, NO_SPEAKER, len(text)) + text
+    speaker = segment.speaker.encode("utf-8")
+    return BINARY_RECORD.pack(segment.start_time, segment.end_time, len(speaker), len(text)) + speaker + text
+
+
+class TranscriptWriter:
+    """
+    Writes segments to a transcript file as they arrive. Formatted segments
+    are collected and written batch_size at a time, so any segment iterator
+    can be written without holding the whole transcript in memory and
+    without one write call per segment.
+
+    Formats:
+        text: the fixed-width "[start] speaker: text" lines
+        jsonl: one JSON object per segment
+        binary: length-prefixed records, see read_binary_segments
+    """
+    def __init__(self, output_file: str, output_format: str = TEXT, batch_size: int = 4096):
+        if output_format not in OUTPUT_FORMATS:
+            raise RuntimeError(f"Output format must be one of {', '.join(OUTPUT_FORMATS)}")
+        self.output_file = output_file
+        self.output_format = output_format
+        self.batch_size = batch_size
+        self.segments_written = 0
+        self._batch: List = []
+        if output_format == BINARY:
+            self._file = open(output_file, "wb")
+            self._file.write(BINARY_HEADER)
+            self._format = pack_binary_record
+            self._join = b"".join
+        else:
+            self._file = open(output_file, "w")
+            self._format = format_text_line if output_format == TEXT else format_jsonl_line
+            self._join = "".join
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, segment: Segment) -> None:
+        self._batch.append(self._format(segment))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, segments: Iterable[Segment]) -> None:
+        for segment in segments:
+            self.write(segment)
+
+    def flush(self) -> None:
+        if self._batch:
+            self._file.write(self._join(self._batch))
+            self.segments_written += len(self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def write_segments(segments: Iterable[Segment], output_file: str, output_format: str = TEXT, batch_size: int = 4096) -> int:
+    """
+    Writes segments to output_file in output_format.
+
+    Returns: int, the number of segments written
+    """
+    with TranscriptWriter(output_file, output_format, batch_size) as writer:
+        writer.write_all(segments)
+    return writer.segments_written
+
+def _read_exactly(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise RuntimeError("Binary transcript is truncated")
+    return data
+
+def _read_binary_record(f: BinaryIO) -> Optional[Segment]:
+    record = f.read(BINARY_RECORD.size)
+    if not record:
+        return None
+    if len(record) != BINARY_RECORD.size:
+        raise RuntimeError("Binary transcript is truncated")
+    start_time, end_time, speaker_length, text_length = BINARY_RECORD.unpack(record)
+    speaker = None
+    if speaker_length != NO_SPEAKER:
+        speaker = _read_exactly(f, speaker_length).decode("utf-8")
+    text = _read_exactly(f, text_length).decode("utf-8")
+    return Segment(text, start_time, end_time, speaker)
+
+def read_binary_segments(input_file: str) -> Iterator[Segment]:
+    """
+    Reads segments back from a binary transcript written by TranscriptWriter.
+    """
+    with open(input_file, "rb") as f:
+        if f.read(len(BINARY_HEADER)) != BINARY_HEADER:
+            raise RuntimeError(f"{input_file} is not a binary transcript")
+        while True:
+            segment = _read_binary_record(f)
+            if segment is None:
+                return
+            yield segment
+
+def read_jsonl_segments(input_file: str) -> Iterator[Segment]:
+    """
+    Reads segments back from a JSONL transcript written by TranscriptWriter.
+    """
+    with open(input_file, "r") as f:
+        for line in f:
+            yield Segment(**json.loads(line))
+
+def transcript_format(input_file: str) -> str:
+    """
+    Returns the format of a transcript file: binary if it starts with the
+    binary header, jsonl for a .jsonl file and text otherwise.
+    """
+    with open(input_file, "rb") as f:
+        if f.read(len(BINARY_HEADER)) == BINARY_HEADER:
+            return BINARY
+    if os.path.splitext(input_file)[1] == ".jsonl":
+        return JSONL
+    return TEXT
+
+def read_segments_with_offsets(input_file: str) -> Iterator[Tuple[int, Segment]]:
+    """
+    Reads the segments of a transcript in any format, each with the byte
+    offset it starts at, so it can be read again with read_segment_at
+    without reading the file up to it.
+    """
+    output_format = transcript_format(input_file)
+    with open(input_file, "rb") as f:
+        if output_format == BINARY:
+            f.seek(len(BINARY_HEADER))
+            while True:
+                offset = f.tell()
+                segment = _read_binary_record(f)
+                if segment is None:
+                    return
+                yield offset, segment
+        parse = parse_text_line if output_format == TEXT else (lambda line: Segment(**json.loads(line)))
+        offset = 0
+        for line in f:
+            if line.strip():
+                yield offset, parse(line.decode("utf-8"))
+            offset += len(line)
+
+def read_segment_at(input_file: str, offset: int) -> Segment:
+    """
+    Reads the segment starting at a byte offset from read_segments_with_offsets.
+    """
+    output_format = transcript_format(input_file)
+    with open(input_file, "rb") as f:
+        f.seek(offset)
+        if output_format == BINARY:
+            segment = _read_binary_record(f)
+            if segment is None:
+                raise RuntimeError("Binary transcript is truncated")
+            return segment
+        line = f.readline().decode("utf-8")
+    return parse_text_line(line) if output_format == TEXT else Segment(**json.loads(line))
+
+def read_segments(input_file: str) -> Iterator[Segment]:
+    """
+    Reads the segments of a transcript in any format written by TranscriptWriter.
+    """
+    for _, segment in read_segments_with_offsets(input_file):
+        yield segment
@@ -0,0 +1,125 @@
+import bisect
+
+from typing import List, Tuple
+
+import numpy as np
+
+# Whisper decodes all audio to 16 kHz mono
+SAMPLE_RATE = 16000
+
+
+def frame_energy_db(audio: np.ndarray, frame_length: int) -> np.ndarray:
+    """
+    Returns the RMS energy of each frame of audio in decibels. The last
+    partial frame is zero-padded.
+    """
+    num_frames = -(-len(audio) // frame_length)
+    frames = np.zeros(num_frames * frame_length, dtype=np.float32)
+    frames[:len(audio)] = audio
+    frames = frames.reshape(num_frames, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def detect_speech_spans(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = 30, threshold_db: float = -35, floor_db: float = -60, min_silence: float = 2.0, padding: float = 0.25) -> List[Tuple[int, int]]:
+    """
+    Finds the parts of audio with voice activity by frame energy.
+
+    Input:
+        audio: np.ndarray, float samples
+        sample_rate: int
+        frame_ms: int, length of the energy frames in milliseconds
+        threshold_db: float, frames quieter than this relative to the
+            loudest frame are silent
+        floor_db: float, frames quieter than this are always silent, so a
+            track with nothing on it is cut entirely
+        min_silence: float, only silences at least this many seconds long
+            are cut
+        padding: float, seconds of audio kept on each side of speech
+
+    Returns: List[Tuple[int, int]], (start, end) sample ranges to keep
+    """
+    if len(audio) == 0:
+        return []
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    energy = frame_energy_db(audio, frame_length)
+    active = np.flatnonzero(energy >= max(energy.max() + threshold_db, floor_db))
+    if len(active) == 0:
+        return []
+
+    # Split the active frames wherever there is a long enough silent gap
+    min_gap_frames = int(min_silence * sample_rate / frame_length)
+    breaks = np.flatnonzero(np.diff(active) > min_gap_frames)
+    span_starts = np.concatenate(([active[0]], active[breaks + 1]))
+    span_ends = np.concatenate((active[breaks], [active[-1]])) + 1
+
+    padding_samples = int(padding * sample_rate)
+    spans = []
+    for start, end in zip(span_starts * frame_length - padding_samples, span_ends * frame_length + padding_samples):
+        start, end = max(0, int(start)), min(len(audio), int(end))
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def segment_loudness(audio: np.ndarray, segments, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Returns the RMS level in decibels of the audio under each segment.
+    """
+    loudness = np.full(len(segments), -np.inf)
+    for i, segment in enumerate(segments):
+        samples = audio[max(0, int(segment.start_time * sample_rate)):max(0, int(segment.end_time * sample_rate))]
+        if len(samples):
+            energy = float(np.dot(samples, samples)) / len(samples)
+            loudness[i] = 10 * np.log10(max(energy, 1e-20))
+    return loudness
+
+
+class TimeMap:
+    """
+    Maps times in audio with silences cut out back to times in the original
+    audio.
+    """
+    def __init__(self, spans: List[Tuple[int, int]], sample_rate: int = SAMPLE_RATE, total_duration: float = None):
+        self.sample_rate = sample_rate
+        # Length of the original audio in seconds
+        self.total_duration = total_duration
+        self.original_starts = [start / sample_rate for start, _ in spans]
+        self.trimmed_starts = []
+        self.trimmed_ends = []
+        position = 0
+        for start, end in spans:
+            self.trimmed_starts.append(position / sample_rate)
+            position += end - start
+            self.trimmed_ends.append(position / sample_rate)
+
+    def to_original(self, trimmed_time: float, is_end: bool = False) -> float:
+        """
+        Maps a time in the trimmed audio to the original audio. A time that
+        falls exactly on a cut belongs to the span before it when it is the
+        end of a segment and to the span after it otherwise.
+        """
+        if not self.original_starts:
+            return trimmed_time
+        if is_end:
+            span = bisect.bisect_left(self.trimmed_ends, trimmed_time)
+        else:
+            span = bisect.bisect_right(self.trimmed_starts, trimmed_time) - 1
+        span = min(max(span, 0), len(self.original_starts) - 1)
+        return self.original_starts[span] + trimmed_time - self.trimmed_starts[span]
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, **kwargs) -> Tuple[np.ndarray, TimeMap]:
+    """
+    Cuts long silences out of audio. Keyword arguments are passed to
+    detect_speech_spans.
+
+    Returns: (trimmed audio, TimeMap back to the original timeline)
+    """
+    total_duration = len(audio) / sample_rate
+    spans = detect_speech_spans(audio, sample_rate, **kwargs)
+    if not spans:
+        return audio[:0], TimeMap([], sample_rate, total_duration)
+    trimmed = np.concatenate([audio[start:end] for start, end in spans])
+    return trimmed, TimeMap(spans, sample_rate, total_duration)
@@ -0,0 +1,385 @@
+import datetime
+import json
+import logging
+import os
+import time
+
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+from transcriptly.cache import hash_file, hash_key
+from transcriptly.data_types import AudioInput
+from transcriptly.instrumentation import get_tracer, run_traced
+from transcriptly.job_manifest import JobManifest, write_json_atomic
+from transcriptly.transcribe import Transcribe, _transcribe_in_worker, is_audio_video_file
+from transcriptly.transcript_writer import BINARY, JSONL, TEXT
+
+DONE = "done"
+FAILED = "failed"
+TRANSCRIPT_EXTENSIONS = {TEXT: ".txt", JSONL: ".jsonl", BINARY: ".bin"}
+
+
+class IngestManifest:
+    """
+    Record of every file the watcher has transcribed, keyed by path, with
+    the modification time, size and hash the file had at the time. A file
+    whose modification time and size haven't changed is skipped without
+    being read; one that was only touched is recognised by its hash.
+
+    A file that failed to transcribe is tried again after retry_seconds,
+    the wait doubling with every failure up to max_retry_seconds, or
+    straight away once its contents change.
+    """
+    manifest_path: str
+    files: Dict[str, dict]
+    retry_seconds: float = 300.0
+    max_retry_seconds: float = 6 * 3600.0
+
+    def __init__(self, state_dir: str, retry_seconds: float = None, max_retry_seconds: float = None, clock: Callable[[], float] = time.time):
+        os.makedirs(state_dir, exist_ok=True)
+        if retry_seconds is not None:
+            self.retry_seconds = retry_seconds
+        if max_retry_seconds is not None:
+            self.max_retry_seconds = max_retry_seconds
+        self.clock = clock
+        self.manifest_path = os.path.join(state_dir, "ingest.json")
+        self.files = {}
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.files = json.load(f)["files"]
+
+    def save(self) -> None:
+        write_json_atomic(self.manifest_path, {"files": self.files})
+
+    def is_unchanged(self, path: str, stat: os.stat_result) -> bool:
+        """
+        Whether the file needs no transcribing: it is unchanged since it was
+        transcribed, or since it failed and is still waiting to be retried.
+        """
+        record = self.files.get(path)
+        if record is None:
+            return False
+        if record["mtime_ns"] != stat.st_mtime_ns or record["size"] != stat.st_size:
+            if record["size"] != stat.st_size or record["hash"] != hash_file(path):
+                return False
+            record["mtime_ns"] = stat.st_mtime_ns
+            self.save()
+        if record["status"] == FAILED:
+            return self.clock() < record.get("retry_at", 0)
+        return True
+
+    def record(self, path: str, stat: os.stat_result, file_hash: str, session: str, status: str) -> None:
+        previous = self.files.get(path)
+        record = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": file_hash,
+            "session": session,
+            "status": status,
+        }
+        if status == FAILED:
+            # Failures of the same contents wait longer before each retry
+            failures = 1
+            if previous is not None and previous["status"] == FAILED and previous["hash"] == file_hash:
+                failures += previous.get("failures", 1)
+            record["failures"] = failures
+            record["retry_at"] = self.clock() + min(self.max_retry_seconds, self.retry_seconds * 2 ** (failures - 1))
+        self.files[path] = record
+        self.save()
+
+
+class FolderWatcher:
+    """
+    Transcribes recording sessions as they are dropped into a folder. Each
+    subdirectory of the watch folder is a session, with one track per
+    speaker; tracks dropped straight into the watch folder are grouped into
+    sessions by arrival, a new session starting after session_gap seconds
+    without a new track.
+
+    Every poll scans the folder with os.scandir and only looks further at
+    files that are new or changed since they were transcribed, so polling a
+    folder of thousands of finished recordings costs a directory listing and
+    a stat per file. A session is transcribed once none of its tracks have
+    changed for settle_seconds or since the previous scan, so files still
+    being copied in are left alone. The new tracks of every ready session
+    are sent to a worker pool that is kept between polls, the finished
+    tracks checkpointed in a job manifest per session, and each session's
+    transcript written to output_dir once all of its tracks are done.
+    """
+    watch_dir: str
+    output_dir: str
+    state_dir: str
+    output_format: str = TEXT
+    settle_seconds: float = 30.0
+    session_gap: float = 3600.0
+    retry_seconds: float = 300.0
+
+    def __init__(self, transcribe: Transcribe, watch_dir: str, output_dir: str, state_dir: str, **kwargs):
+        self.transcribe = transcribe
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.state_dir = state_dir
+        if kwargs.get("output_format") is not None:
+            if kwargs["output_format"] not in TRANSCRIPT_EXTENSIONS:
+                raise RuntimeError(f"Output format must be one of {', '.join(TRANSCRIPT_EXTENSIONS)}")
+            self.output_format = kwargs["output_format"]
+        if kwargs.get("settle_seconds") is not None:
+            self.settle_seconds = float(kwargs["settle_seconds"])
+        if kwargs.get("session_gap") is not None:
+            self.session_gap = float(kwargs["session_gap"])
+        if kwargs.get("retry_seconds") is not None:
+            self.retry_seconds = float(kwargs["retry_seconds"])
+        self.clock = kwargs.get("clock", time.time)
+        # Reads self.clock when called, so tests can move the clock
+        self.manifest = IngestManifest(state_dir, self.retry_seconds, clock=lambda: self.clock())
+        self._executor: ProcessPoolExecutor = None
+        # Size and modification time of each file on the previous scan, None
+        # before the first scan
+        self._last_seen: Dict[str, Tuple[int, int]] = None
+        self._previous_scan: Dict[str, Tuple[int, int]] = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def scan(self) -> Dict[str, List[Tuple[str, os.stat_result]]]:
+        """
+        Lists the audio and video files in the watch folder and its
+        subdirectories, one level deep.
+
+        Returns: dict of subdirectory name ("" for the watch folder itself)
+            to a list of (path, stat) pairs
+        """
+        found = {}
+        last_seen = {}
+        directories = [("", self.watch_dir)]
+        while directories:
+            name, directory = directories.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir() and not name:
+                        directories.append((entry.name, entry.path))
+                    elif entry.is_file() and is_audio_video_file(entry.name):
+                        stat = entry.stat()
+                        found.setdefault(name, []).append((entry.path, stat))
+                        last_seen[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        self._previous_scan, self._last_seen = self._last_seen, last_seen
+        return found
+
+    def is_settled(self, path: str, stat: os.stat_result, now: float) -> bool:
+        if not self.settle_seconds:
+            return True
+        if now - stat.st_mtime < self.settle_seconds:
+            return False
+        # The first scan of a process, e.g. a run with --once, has nothing to
+        # compare with, so the file's age alone decides
+        return self._previous_scan is None or self._previous_scan.get(path) == (stat.st_size, stat.st_mtime_ns)
+
+    def find_ready_sessions(self) -> Dict[str, List[Tuple[str, os.stat_result]]]:
+        """
+        Groups the scanned files into sessions and returns the sessions
+        with a new or changed track and no track still settling.
+
+        Returns: dict of session name to all of its tracks as (path, stat) pairs
+        """
+        now = self.clock()
+        sessions = {}
+        for directory, files in self.scan().items():
+            if directory:
+                if all(self.manifest.is_unchanged(path, stat) for path, stat in files):
+                    continue
+                if all(self.is_settled(path, stat, now) for path, stat in files):
+                    sessions[directory] = sorted(files)
+                continue
+            # Loose tracks are grouped by arrival time, the finished ones too,
+            # so that a track that is retried or arrives late is merged with
+            # the rest of its session
+            groups = []
+            for path, stat in sorted(files, key=lambda file: file[1].st_mtime):
+                if groups and stat.st_mtime - groups[-1][-1][1].st_mtime <= self.session_gap:
+                    groups[-1].append((path, stat))
+                else:
+                    groups.append([(path, stat)])
+            for group in groups:
+                if all(self.manifest.is_unchanged(path, stat) for path, stat in group):
+                    continue
+                if all(self.is_settled(path, stat, now) for path, stat in group):
+                    sessions[self.loose_session_name(group)] = sorted(group)
+        return sessions
+
+    def loose_session_name(self, group: List[Tuple[str, os.stat_result]]) -> str:
+        """
+        Names a group of loose tracks after its first arrival, or keeps the
+        name its tracks were transcribed under before.
+        """
+        for path, _ in group:
+            record = self.manifest.files.get(path)
+            if record is not None:
+                return record["session"]
+        first_arrival = datetime.datetime.fromtimestamp(group[0][1].st_mtime)
+        return f"session-{first_arrival:%Y%m%d-%H%M%S}"
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self.transcribe.create_process_pool(self.transcribe.workers, warm_up=True)
+        return self._executor
+
+    def drop_broken_executor(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Drops a pool that broke, e.g. because a worker was killed, so that
+        get_executor starts a new one. Every track running on the pool
+        fails with it, so only the first of them drops it.
+        """
+        if self._executor is broken:
+            logging.warning("Worker pool broke, a new one will be started")
+            self._executor = None
+            broken.shutdown(wait=False)
+
+    def poll(self) -> List[str]:
+        """
+        Transcribes the sessions that are ready.
+
+        Returns: List[str], paths of the transcripts written
+        """
+        sessions = self.find_ready_sessions()
+        if not sessions:
+            return []
+        logging.info(f"Found {len(sessions)} sessions with new tracks")
+
+        # Work out which tracks of each session need transcribing
+        jobs: Dict[str, JobManifest] = {}
+        session_inputs: Dict[str, List[AudioInput]] = {}
+        pending = []
+        for session, files in sessions.items():
+            audio_inputs = [AudioInput(path, Transcribe.get_speaker_from_file_path(path)) for path, _ in files]
+            job = JobManifest.load(os.path.join(self.state_dir, "sessions", hash_key(self.watch_dir, session)[:16]), audio_inputs)
+            for ainput, (path, stat) in zip(audio_inputs, files):
+                if not self.manifest.is_unchanged(path, stat):
+                    job.mark_pending(ainput)
+                    pending.append((session, ainput, stat))
+            jobs[session] = job
+            session_inputs[session] = audio_inputs
+
+        failed_sessions = set()
+        for (session, ainput, stat), segments, error in self.transcribe_tracks(pending):
+            file_hash = hash_file(ainput.file_path)
+            if error is not None:
+                logging.error(f"Failed to transcribe {ainput.file_path}: {error}")
+                failed_sessions.add(session)
+                self.manifest.record(ainput.file_path, stat, file_hash, session, FAILED)
+                continue
+            jobs[session].mark_done(ainput, segments)
+            self.manifest.record(ainput.file_path, stat, file_hash, session, DONE)
+
+        written = []
+        for session, audio_inputs in session_inputs.items():
+            if session in failed_sessions:
+                continue
+            output_file = os.path.join(self.output_dir, f"{session}{TRANSCRIPT_EXTENSIONS[self.output_format]}")
+            # Every track is done, so this only merges the checkpointed tracks
+            transcription = self.transcribe.transcribe_multiple_audio_files_into_one(audio_inputs, jobs[session])
+            self.transcribe.write_transcription_to_file(transcription, output_file, self.output_format)
+            logging.info(f"Wrote {output_file}")
+            written.append(output_file)
+        return written
+
+    def transcribe_tracks(self, pending: list):
+        """
+        Transcribes tracks in the worker pool, or in this process with a
+        single worker, and yields (track, segments, error) as each finishes.
+        """
+        if self.transcribe.workers == 1:
+            for track in pending:
+                try:
+                    yield track, self.transcribe.transcribe_single_audio_file(track[1]), None
+                except Exception as e:
+                    yield track, None, e
+            return
+
+        executor = self.get_executor()
+        try:
+            futures = {executor.submit(run_traced, _transcribe_in_worker, track[1]): track for track in pending}
+        except BrokenExecutor:
+            # The pool broke after the previous poll
+            self.drop_broken_executor(executor)
+            executor = self.get_executor()
+            futures = {executor.submit(run_traced, _transcribe_in_worker, track[1]): track for track in pending}
+        for future in as_completed(futures):
+            try:
+                segments, spans = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenExecutor):
+                    self.drop_broken_executor(executor)
+                yield futures[future], None, e
+                continue
+            get_tracer().extend(spans)
+            yield futures[future], segments, None
+
+    def run(self, interval: float = 60.0) -> None:
+        """
+        Polls the watch folder every interval seconds until interrupted. A
+        poll that fails, e.g. because a file was deleted while it was being
+        looked at, is logged and the next poll starts over.
+        """
+        logging.info(f"Watching {self.watch_dir} every {interval:g} seconds...")
+        try:
+            while True:
+                try:
+                    self.poll()
+                except Exception:
+                    logging.exception(f"Polling {self.watch_dir} failed")
+                time.sleep(interval)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def main(argv: List[str] = None, prog: str = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Transcribe recording sessions as they are dropped into a folder")
+    parser.add_argument("watch_dir", type=str, help="Folder to watch. Each subdirectory is a session with one file per speaker.")
+    parser.add_argument("--output-dir", type=str, default="transcriptions", help="Folder the session transcripts are written to.")
+    parser.add_argument("--state-dir", type=str, help="Folder for the ingest manifest and checkpointed tracks. Defaults to .ingest in the watch folder.")
+    parser.add_argument("--format", type=str, default=TEXT, choices=list(TRANSCRIPT_EXTENSIONS), help="Output format for the transcripts.")
+    parser.add_argument("--interval", type=float, default=60.0, help="Seconds between scans of the watch folder.")
+    parser.add_argument("--settle-seconds", type=float, default=30.0, help="Seconds a session's files must be unchanged before it is transcribed.")
+    parser.add_argument("--session-gap", type=float, default=3600.0, help="Seconds between loose files that start a new session.")
+    parser.add_argument("--retry-seconds", type=float, default=300.0, help="Seconds before a track that failed is tried again, doubling with every failure.")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("TRANSCRIPTION_WORKERS", 1)), help="Number of worker processes.")
+    parser.add_argument("--remove-duplicates", action="store_true", help="Remove repeated segments from each track.")
+    parser.add_argument("--once", action="store_true", help="Scan once and exit instead of watching.")
+    args = parser.parse_args(argv)
+
+    transcribe = Transcribe(
+        service_name=os.environ.get("TRANSCRIPTION_SERVICE", "whisper"),
+        model_name=os.environ.get("TRANSCRIPTION_MODEL", "tiny"),
+        workers=args.workers,
+        remove_duplicates=args.remove_duplicates,
+        cache_dir=os.environ.get("TRANSCRIPTION_CACHE_DIR", "cache/transcriptions"),
+        cache_max_bytes=int(float(os.environ.get("TRANSCRIPTION_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+        audio_cache_dir=os.environ.get("TRANSCRIPTION_AUDIO_CACHE_DIR", "cache/audio"),
+        audio_cache_max_bytes=int(float(os.environ.get("TRANSCRIPTION_AUDIO_CACHE_MAX_MB", 4096)) * 1024 * 1024)
+    )
+    watcher = FolderWatcher(
+        transcribe,
+        args.watch_dir,
+        args.output_dir,
+        args.state_dir or os.path.join(args.watch_dir, ".ingest"),
+        output_format=args.format,
+        settle_seconds=args.settle_seconds,
+        session_gap=args.session_gap,
+        retry_seconds=args.retry_seconds
+    )
+    if args.once:
+        watcher.poll()
+        watcher.close()
+    else:
+        watcher.run(args.interval)
+
+
+if __name__ == "__main__":
+    main()
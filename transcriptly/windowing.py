@@ -0,0 +1,69 @@
+from typing import Iterable, Iterator, List, Tuple
+
+from transcriptly.data_types import Segment
+
+
+def plan_windows(num_samples: int, window_samples: int, overlap_samples: int) -> List[Tuple[int, int]]:
+    """
+    Splits num_samples of audio into fixed windows that overlap their
+    neighbours by overlap_samples. The last window may be shorter.
+
+    Returns: List[Tuple[int, int]], (start, end) sample ranges
+    """
+    if overlap_samples >= window_samples:
+        raise RuntimeError("Window overlap must be shorter than the window")
+    if num_samples <= 0:
+        return []
+    step = window_samples - overlap_samples
+    return [
+        (start, min(start + window_samples, num_samples))
+        for start in range(0, max(num_samples - overlap_samples, 1), step)
+    ]
+
+def reconcile_windows(windows: List[Tuple[float, float]], window_segments: List[List[Segment]]) -> List[Segment]:
+    """
+    Joins the segments of overlapping windows into one timeline. Segment
+    times are offset by their window's start. Each overlap zone is split at
+    its midpoint: a segment is kept from the window it starts in, so every
+    segment is taken from exactly one window and always from the window
+    where it is furthest from an edge. A segment whose text repeats the one
+    just before it across a cut is the same speech transcribed by both
+    windows and is dropped.
+
+    Input:
+        windows: List[Tuple[float, float]], (start, end) of each window in seconds
+        window_segments: List[List[Segment]], segments of each window with
+            times relative to the window start
+
+    Returns: List[Segment], on the timeline of the whole audio
+    """
+    return [segment for kept in reconcile_window_stream(windows, window_segments) for segment in kept]
+
+def reconcile_window_stream(windows: List[Tuple[float, float]], window_segments: Iterable[List[Segment]]) -> Iterator[List[Segment]]:
+    """
+    Reconciles windows like reconcile_windows as their segments arrive, in
+    window order. Yields the segments kept from each window as soon as that
+    window's segments are in, since the cuts only depend on the planned
+    windows.
+    """
+    last_kept: Segment = None
+    for i, segments in enumerate(window_segments):
+        window_start, window_end = windows[i]
+        lower = (window_start + windows[i - 1][1]) / 2 if i > 0 else float("-inf")
+        upper = (windows[i + 1][0] + window_end) / 2 if i < len(windows) - 1 else float("inf")
+        overlap = windows[i - 1][1] - window_start if i > 0 else 0
+        kept: List[Segment] = []
+        for segment in segments:
+            start_time = segment.start_time + window_start
+            if not lower <= start_time < upper:
+                continue
+            if (
+                not kept and last_kept is not None
+                and last_kept.text.strip() == segment.text.strip()
+                and start_time - last_kept.start_time < overlap
+            ):
+                continue
+            kept.append(Segment(segment.text, start_time, segment.end_time + window_start, segment.speaker))
+        if kept:
+            last_kept = kept[-1]
+        yield kept